@@ -0,0 +1,124 @@
+# !/usr/bin/env python3
+import sys
+import threading
+import wave
+from array import array
+
+from scheduler import FRAME_RATE
+
+SAMPLE_RATE = 44100
+BEEP_FREQUENCY = 440
+BEEP_VOLUME = 0.25
+SAMPLE_WIDTH = 2
+# Samples kept for the device at most, older ones are dropped
+MAX_LATENCY_FRAMES = 4
+
+
+def square_wave(sample_rate=SAMPLE_RATE, frequency=BEEP_FREQUENCY,
+                volume=BEEP_VOLUME):
+    """Returns a second of 16-bit little-endian mono square wave, which is
+    a whole number of periods for an integer frequency."""
+    amplitude = int(0x7FFF * volume)
+    samples = array('h', (amplitude if i * frequency * 2 // sample_rate % 2
+                          else -amplitude for i in range(sample_rate)))
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    return samples.tobytes()
+
+
+class Beeper:
+    """Turns the sound timer into PCM samples, a frame of them per frame.
+
+    The square wave is precomputed and its phase goes on through silent
+    frames, so beeps are sample accurate to the frames they sound for.
+    Samples are written to a sink: DeviceSink, WavSink or NullSink.
+    """
+
+    def __init__(self, sink, sample_rate=SAMPLE_RATE,
+                 frequency=BEEP_FREQUENCY, frame_rate=FRAME_RATE):
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.frame_rate = frame_rate
+        self.wave = square_wave(sample_rate, frequency) * 2
+        self.position = 0
+        self.frames = 0
+
+    def frame(self, beeping):
+        start = self.frames * self.sample_rate // self.frame_rate
+        end = (self.frames + 1) * self.sample_rate // self.frame_rate
+        samples = end - start
+        self.frames += 1
+        if beeping:
+            offset = self.position * SAMPLE_WIDTH
+            data = self.wave[offset:offset + samples * SAMPLE_WIDTH]
+        else:
+            data = bytes(samples * SAMPLE_WIDTH)
+        self.position = (self.position + samples) % self.sample_rate
+        self.sink.write(data)
+
+    def close(self):
+        self.sink.close()
+
+
+class NullSink:
+    """Drops samples, counting those that were not silent."""
+
+    def __init__(self):
+        self.samples = 0
+        self.sounding_samples = 0
+
+    def write(self, data):
+        self.samples += len(data) // SAMPLE_WIDTH
+        if any(data):
+            self.sounding_samples += len(data) // SAMPLE_WIDTH
+
+    def close(self):
+        pass
+
+
+class WavSink:
+    def __init__(self, path, sample_rate=SAMPLE_RATE):
+        self.file = wave.open(path, 'wb')
+        self.file.setnchannels(1)
+        self.file.setsampwidth(SAMPLE_WIDTH)
+        self.file.setframerate(sample_rate)
+
+    def write(self, data):
+        self.file.writeframes(data)
+
+    def close(self):
+        self.file.close()
+
+
+class DeviceSink:
+    """Plays samples through sounddevice, which pulls them from a buffer
+    in its own callback thread. Needs the sounddevice package."""
+
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_rate=FRAME_RATE):
+        import sounddevice
+        self.buffer = bytearray()
+        self.lock = threading.Lock()
+        self.max_buffered = SAMPLE_WIDTH * (
+            MAX_LATENCY_FRAMES * sample_rate // frame_rate)
+        self.stream = sounddevice.RawOutputStream(
+            samplerate=sample_rate, channels=1, dtype='int16',
+            callback=self._callback)
+        self.stream.start()
+
+    def _callback(self, output, frames, time, status):
+        size = frames * SAMPLE_WIDTH
+        with self.lock:
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+        # Play silence when the emulator is late
+        output[:] = data + bytes(size - len(data))
+
+    def write(self, data):
+        with self.lock:
+            self.buffer += data
+            if len(self.buffer) > self.max_buffered:
+                del self.buffer[:len(self.buffer) - self.max_buffered]
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
@@ -0,0 +1,73 @@
+# !/usr/bin/env python3
+import glob
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from core import CHIP8Core, CHIP8, EmulatorError, INSTRUCTIONS_PER_FRAME
+
+
+def find_roms(patterns):
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) \
+            else [pattern]
+        paths.extend(path for path in matches
+                     if os.path.isfile(path) and path not in paths)
+    return paths
+
+
+def describe_state(core):
+    return {'v': list(core.v_reg),
+            'i': core.i_reg,
+            'pc': core.program_counter,
+            'sp': core.stack_pointer,
+            'stack': list(core.stack),
+            'delay_timer': core.delay_timer_value,
+            'sound_timer': core.sound_timer_value,
+            'framebuffer_sha1':
+                hashlib.sha1(core.framebuffer_bytes()).hexdigest()}
+
+
+def run_rom(path, instructions=None, frames=None,
+            instructions_per_frame=INSTRUCTIONS_PER_FRAME,
+            use_block_cache=False, skip_idle_loops=False, variant=CHIP8):
+    """Runs a ROM headlessly for the given number of instructions
+    or frames and returns a JSON-serializable report of its final state."""
+    with open(path, 'rb') as f:
+        program = f.read()
+    core = CHIP8Core(instructions_per_frame, use_block_cache,
+                     skip_idle_loops=skip_idle_loops, variant=variant)
+    core.load_program(program)
+
+    error = None
+    start = time.perf_counter()
+    try:
+        if frames is not None:
+            core.run_frames(frames)
+        else:
+            core.run(instructions)
+    except (EmulatorError, IndexError) as e:
+        # IndexError means a stack or memory overflow caused by the ROM
+        error = '{}: {}'.format(type(e).__name__, e)
+    wall_time = time.perf_counter() - start
+
+    return {'rom': path,
+            'instructions': core.instruction_count,
+            'frames': core.frame_count,
+            'wall_time': wall_time,
+            'error': error,
+            'state': describe_state(core)}
+
+
+def run_batch(paths, instructions=None, frames=None,
+              instructions_per_frame=INSTRUCTIONS_PER_FRAME,
+              use_block_cache=False, workers=None, skip_idle_loops=False,
+              variant=CHIP8):
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(run_rom, path, instructions, frames,
+                                   instructions_per_frame, use_block_cache,
+                                   skip_idle_loops, variant)
+                   for path in paths]
+        return [future.result() for future in futures]
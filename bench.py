@@ -0,0 +1,99 @@
+# !/usr/bin/env python3
+import sys
+import time
+
+from core import CHIP8Core, INSTRUCTIONS_PER_FRAME
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Slowdown of instructions per second allowed when comparing to a baseline
+DEFAULT_TOLERANCE = 0.2
+DEFAULT_INSTRUCTIONS = 200000
+DEFAULT_REPEATS = 3
+
+
+def assemble(*opcodes):
+    return b''.join(opcode.to_bytes(2, 'big') for opcode in opcodes)
+
+
+# Endless programs exercising one class of opcodes each.
+# Every loop jumps back to the address after its setup.
+WORKLOADS = {
+    # 8xyN register arithmetic
+    'alu': assemble(0x6105, 0x6203,
+                    0x8124, 0x8125, 0x8126, 0x812E, 0x8121, 0x8122,
+                    0x8123, 0x8127, 0x8120, 0x1204),
+    # Dxyn draws of a font sprite moving over the screen
+    'draw': assemble(0xA000, 0x6000, 0x6100,
+                     0xD015, 0x7003, 0x7101, 0x1206),
+    # Fx55/Fx65 bulk stores and loads of all registers
+    'memory': assemble(0xA300,
+                       0xFF55, 0xFF65, 0x1202),
+    # Subroutine call and return
+    'call': assemble(0x2204, 0x1200,
+                     0x00EE),
+    # The smallest possible loop
+    'tight_loop': assemble(0x7001, 0x1200),
+    # A game-like loop waiting for the delay timer before every draw
+    'game_loop': assemble(0x6003, 0xF015,
+                          0xF007, 0x3000, 0x1204,
+                          0xA000, 0xD125, 0x7201, 0x1200),
+}
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, other systems report kilobytes
+    return peak_rss // 1024 if sys.platform == 'darwin' else peak_rss
+
+
+def run_workload(program, instructions=DEFAULT_INSTRUCTIONS,
+                 repeats=DEFAULT_REPEATS, use_block_cache=False,
+                 instructions_per_frame=INSTRUCTIONS_PER_FRAME):
+    """Returns the best time of running the program for the given number
+    of instructions on a fresh core, repeated the given number of times."""
+    best_time = None
+    for _ in range(repeats):
+        core = CHIP8Core(instructions_per_frame, use_block_cache)
+        core.load_program(program)
+        start = time.perf_counter()
+        core.run(instructions)
+        elapsed = time.perf_counter() - start
+        if best_time is None or elapsed < best_time:
+            best_time = elapsed
+    return best_time
+
+
+def run_benchmarks(names=None, instructions=DEFAULT_INSTRUCTIONS,
+                   repeats=DEFAULT_REPEATS, use_block_cache=False,
+                   instructions_per_frame=INSTRUCTIONS_PER_FRAME):
+    results = {}
+    for name in names or WORKLOADS:
+        elapsed = run_workload(WORKLOADS[name], instructions, repeats,
+                               use_block_cache, instructions_per_frame)
+        results[name] = {'instructions': instructions,
+                         'seconds': elapsed,
+                         'ips': instructions / elapsed,
+                         'ns_per_op': elapsed * 1e9 / instructions,
+                         'peak_rss_kb': peak_rss_kb()}
+    return {'engine': 'block_cache' if use_block_cache else 'interpret',
+            'results': results}
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Returns descriptions of workloads whose instructions per second
+    dropped by more than tolerance compared to the baseline."""
+    regressions = []
+    for name, result in report['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            continue
+        if result['ips'] < reference['ips'] * (1 - tolerance):
+            regressions.append('{}: {:.0f} ips, baseline {:.0f} ips'.format(
+                name, result['ips'], reference['ips']))
+    return regressions
@@ -0,0 +1,198 @@
+# !/usr/bin/env python3
+from core import BIG_FONT_START, EmulatorError
+
+MAX_BLOCK_LENGTH = 64
+
+# Straight-line programs translated into Python statements.
+# {0}, {1}, {2} are the decoded operands of the opcode.
+INLINE_PROGRAMS = {
+    'set': 'v[{0}] = {1}',
+    'increment': 'v[{0}] = (v[{0}] + {1}) & 0xFF',
+    'set_reg': 'v[{0}] = v[{1}]',
+    'set_reg_or': 'v[{0}] = v[{0}] | v[{1}]',
+    'set_reg_and': 'v[{0}] = v[{0}] & v[{1}]',
+    'set_reg_xor': 'v[{0}] = v[{0}] ^ v[{1}]',
+    'sum_regs': 'result = v[{0}] + v[{1}]\n'
+                'v[0xF] = int(result & 0x100 > 0)\n'
+                'v[{0}] = result & 0xFF',
+    'sub_regs': 'result = v[{0}] - v[{1}]\n'
+                'v[0xF] = int(result >= 0)\n'
+                'v[{0}] = result & 0xFF',
+    'rshift_reg': 'v[0xF] = v[{0}] & 1\n'
+                  'v[{0}] = v[{0}] >> 1',
+    'subn_regs': 'result = v[{1}] - v[{0}]\n'
+                 'v[0xF] = int(result >= 0)\n'
+                 'v[{0}] = result & 0xFF',
+    'lshift_reg': 'v[0xF] = int((v[{0}] & 0b10000000) != 0)\n'
+                  'v[{0}] = (v[{0}] << 1) & 0xFF',
+    'set_i': 'emu.i_reg = {0}',
+    'add_vx_to_i': 'result = emu.i_reg + v[{0}]\n'
+                   'emu.i_reg = result & 0xFFFF\n'
+                   'v[0xF] = int((result & 0x10000) > 0)',
+    'set_i_to_digit_sprite': 'emu.i_reg = v[{0}] * 5',
+    'set_i_to_big_digit_sprite':
+        'emu.i_reg = ' + hex(BIG_FONT_START) + ' + (v[{0}] & 0xF) * 10',
+}
+
+# Programs that end a block: they return the address of the next block.
+# {pc} is the address of the opcode, {next} and {skip} are the addresses
+# two and four bytes after it. Before a stack error the {before} opcodes
+# of the block ahead of it are counted, as the interpreter counts them.
+BRANCH_PROGRAMS = {
+    'jump': 'return {0}',
+    'call': 'if emu.stack_pointer == len(emu.stack):\n'
+            '    emu.instruction_count += {before}\n'
+            '    emu.program_counter = {pc}\n'
+            "    raise emu._stack_error('overflow')\n"
+            'emu.stack[emu.stack_pointer] = {pc}\n'
+            'emu.stack_pointer += 1\n'
+            'return {0}',
+    'return_back': 'if emu.stack_pointer == 0:\n'
+                   '    emu.instruction_count += {before}\n'
+                   '    emu.program_counter = {pc}\n'
+                   "    raise emu._stack_error('underflow')\n"
+                   'emu.stack_pointer -= 1\n'
+                   'return (emu.stack[emu.stack_pointer] + 2) & {mask}',
+    'jump_to_v0_sum': 'return ({0} + v[0]) & {mask}',
+    'skip_if_eq': 'return {skip} if v[{0}] == {1} else {next}',
+    'skip_if_not_eq': 'return {skip} if v[{0}] != {1} else {next}',
+    'skip_if_regs_eq': 'return {skip} if v[{0}] == v[{1}] else {next}',
+    'skip_if_regs_not_eq': 'return {skip} if v[{0}] != v[{1}] else {next}',
+}
+
+# Programs called through the emulator that neither touch the program
+# counter nor write to the memory, so a block can go on after them.
+# Every other program is called as the last one of its block.
+CALLED_PROGRAMS = {'clear_screen', 'draw_sprite', 'set_rand_and',
+                   'draw_extended_sprite', 'scroll_down', 'scroll_up',
+                   'scroll_right', 'scroll_left', 'set_lores', 'set_hires',
+                   'write_v_to_flags', 'read_v_from_flags',
+                   'read_v_range_from_i', 'select_planes',
+                   'load_audio_pattern', 'set_pitch'}
+
+# Programs that read or write timers and keys always make a block of their
+# own. Blocks may run past a frame boundary, but these programs are only
+# started between frames, so they see timers exactly as the interpreter does.
+FRAME_PROGRAMS = {'set_delay_timer_value_to_v', 'set_delay_timer',
+                  'set_sound_timer', 'skip_if_pressed',
+                  'skip_if_not_pressed', 'wait_and_set_pressed_key'}
+
+
+class BlockCache:
+    """Translates straight-line runs of CHIP-8 code into Python functions.
+
+    A block starts at any jump target and ends with the first jump, call,
+    skip, return or memory write. Its function takes the emulator and
+    returns the address of the next block. Blocks are cached by start
+    address and evicted as soon as the memory they were read from changes.
+    The emulator uses execute as its engine instead of interpret.
+    """
+
+    def __init__(self, emulator):
+        self.emulator = emulator
+        self.blocks = {}
+        self.blocks_by_address = {}
+        emulator.memory_write_hooks.append(self.invalidate)
+
+    def execute(self, count, limit):
+        """Executes at least count and at most limit instructions
+        and returns how many were executed."""
+        emulator = self.emulator
+        blocks = self.blocks
+        executed = 0
+        try:
+            while executed < count:
+                block = blocks.get(emulator.program_counter)
+                if block is None:
+                    block = self.translate(emulator.program_counter)
+                if block is None or executed + block[1] > limit:
+                    executed += emulator.interpret(1)
+                else:
+                    emulator.program_counter = block[0](emulator)
+                    executed += block[1]
+        except EmulatorError:
+            emulator.instruction_count += executed
+            raise
+        return executed
+
+    def translate(self, start):
+        memory = self.emulator.memory
+        opcode_table = self.emulator.opcode_table
+        lines = ['def block(emu):',
+                 '    v = emu.v_reg',
+                 '    memory = emu.memory']
+        address = start
+        length = 0
+        ended = False
+        while not ended and length < MAX_BLOCK_LENGTH and \
+                address + 1 < len(memory):
+            program = opcode_table[(memory[address] << 8) |
+                                   memory[address + 1]]
+            if program is None:
+                break
+            handler, operands = program
+            if handler.__name__ in FRAME_PROGRAMS and length > 0:
+                break
+            source, ended = self._translate_program(
+                address, handler.__name__, operands,
+                self.emulator.address_mask, length)
+            lines.extend('    ' + line for line in source.split('\n'))
+            address += 2
+            length += 1
+        if length == 0:
+            return None
+        if not ended:
+            lines.append('    return {}'.format(
+                address & self.emulator.address_mask))
+
+        namespace = {}
+        exec(compile('\n'.join(lines), '<block {}>'.format(hex(start)),
+                     'exec'), namespace)
+        block = (namespace['block'], length)
+        self.blocks[start] = block
+        for covered in range(start, address):
+            self.blocks_by_address.setdefault(covered, set()).add(start)
+        return block
+
+    @staticmethod
+    def _translate_program(address, name, operands, address_mask=0xFFF,
+                           before=0):
+        if name in INLINE_PROGRAMS:
+            return INLINE_PROGRAMS[name].format(*operands), False
+        if name in BRANCH_PROGRAMS:
+            return BRANCH_PROGRAMS[name].format(
+                *operands, pc=address, next=(address + 2) & address_mask,
+                skip=(address + 4) & address_mask, mask=address_mask,
+                before=before), True
+        if name == 'read_v_from_i':
+            return '\n'.join(['index = emu.i_reg'] + [
+                'v[{0}] = memory[(index + {0}) & {1}]'.format(
+                    i, address_mask)
+                for i in range(operands[0] + 1)]), False
+
+        call = 'emu.{}({})'.format(name, ', '.join(map(str, operands)))
+        if name in CALLED_PROGRAMS:
+            return call, False
+        return '\n'.join(['emu.program_counter = {}'.format(address),
+                          call,
+                          'return (emu.program_counter + 2) & {}'.format(
+                              address_mask)]), True
+
+    def invalidate(self, address, length):
+        for offset in range(length):
+            starts = self.blocks_by_address.pop(
+                (address + offset) & self.emulator.address_mask, None)
+            if starts:
+                for start in starts:
+                    self._evict(start)
+
+    def _evict(self, start):
+        block = self.blocks.pop(start, None)
+        if block is None:
+            return
+        for covered in range(start, start + 2 * block[1]):
+            starts = self.blocks_by_address.get(covered)
+            if starts is not None:
+                starts.discard(start)
+                if not starts:
+                    del self.blocks_by_address[covered]
@@ -0,0 +1,387 @@
+# !/usr/bin/env python3
+"""Headless CHIP-8 tools, run as python -m chip8 <command>."""
+import json
+import time
+import sys
+from argparse import ArgumentParser
+
+import batch
+import bench
+import debugger
+import disasm
+import profiler
+import replay
+import tracer
+from core import CHIP8Core, CHIP8, VARIANTS, EmulatorError, \
+    INSTRUCTIONS_PER_FRAME
+
+
+def run_batch_command(parsed_args):
+    paths = batch.find_roms(parsed_args.roms)
+    if not paths:
+        print("No ROM files found.", file=sys.stderr)
+        return 1
+    results = batch.run_batch(paths,
+                              parsed_args.instructions,
+                              parsed_args.frames,
+                              parsed_args.instructions_per_frame,
+                              parsed_args.translate_blocks,
+                              parsed_args.workers,
+                              parsed_args.skip_idle,
+                              parsed_args.variant)
+    write_json(results, parsed_args.output)
+    return 0
+
+
+def bench_command(parsed_args):
+    unknown = [name for name in parsed_args.workloads
+               if name not in bench.WORKLOADS]
+    if unknown:
+        print("Unknown workloads: " + ", ".join(unknown), file=sys.stderr)
+        return 1
+    report = bench.run_benchmarks(parsed_args.workloads,
+                                  parsed_args.instructions,
+                                  parsed_args.repeats,
+                                  parsed_args.translate_blocks,
+                                  parsed_args.instructions_per_frame)
+    for name, result in report['results'].items():
+        print("{:<12} {:>12.0f} ips {:>10.1f} ns/op".format(
+            name, result['ips'], result['ns_per_op']))
+    peak_rss = bench.peak_rss_kb()
+    if peak_rss is not None:
+        print("Peak RSS: {} KiB".format(peak_rss))
+    if parsed_args.save is not None:
+        write_json(report, parsed_args.save)
+    if parsed_args.compare is not None:
+        with open(parsed_args.compare) as f:
+            baseline = json.load(f)
+        regressions = bench.compare(report, baseline, parsed_args.tolerance)
+        for regression in regressions:
+            print("Regression: " + regression, file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+def profile_command(parsed_args):
+    with open(parsed_args.rom, 'rb') as f:
+        program = f.read()
+    core = CHIP8Core(parsed_args.instructions_per_frame,
+                     variant=parsed_args.variant)
+    core.load_program(program)
+    rom_profiler = profiler.Profiler(core)
+    rom_profiler.enable()
+    try:
+        if parsed_args.frames is not None:
+            core.run_frames(parsed_args.frames)
+        else:
+            core.run(parsed_args.instructions)
+    except EmulatorError as e:
+        print(str(e), file=sys.stderr)
+    rom_profiler.disable()
+
+    report = rom_profiler.report(parsed_args.top)
+    families = sorted(report['families'].items(),
+                      key=lambda item: item[1]['seconds'], reverse=True)
+    for family, stats in families:
+        print("{:<6} {:<28} {:>10} {:>10.4f} s".format(
+            family, stats['handler'], stats['count'], stats['seconds']))
+    if parsed_args.output is not None:
+        write_json(report, parsed_args.output)
+    if parsed_args.collapsed is not None:
+        with open(parsed_args.collapsed, 'w') as f:
+            f.writelines(line + '\n'
+                         for line in rom_profiler.collapsed_stacks())
+    return 0
+
+
+def replay_command(parsed_args):
+    recording = replay.Recording.load(parsed_args.recording)
+    error = None
+    start = time.perf_counter()
+    try:
+        core = replay.replay(recording, parsed_args.instructions,
+                             parsed_args.translate_blocks)
+    except EmulatorError as e:
+        core = None
+        error = str(e)
+    wall_time = time.perf_counter() - start
+    if core is None:
+        print(error, file=sys.stderr)
+        return 1
+    write_json({'recording': parsed_args.recording,
+                'events': len(recording.events),
+                'instructions': core.instruction_count,
+                'frames': core.frame_count,
+                'wall_time': wall_time,
+                'state': batch.describe_state(core)}, parsed_args.output)
+    return 0
+
+
+def disasm_command(parsed_args):
+    with open(parsed_args.rom, 'rb') as f:
+        program = f.read()
+    disassembly = disasm.Disassembly(program,
+                                     variant=parsed_args.variant)
+    if parsed_args.json:
+        write_json(disassembly.report(), parsed_args.output)
+    elif parsed_args.output is None:
+        for line in disassembly.listing():
+            print(line)
+    else:
+        with open(parsed_args.output, 'w') as f:
+            f.writelines(line + '\n' for line in disassembly.listing())
+    return 0
+
+
+def debug_command(parsed_args):
+    with open(parsed_args.rom, 'rb') as f:
+        program = f.read()
+    core = CHIP8Core(parsed_args.instructions_per_frame,
+                     parsed_args.translate_blocks, parsed_args.seed,
+                     variant=parsed_args.variant)
+    core.load_program(program)
+    debugger.DebuggerShell(debugger.Debugger(core)).cmdloop()
+    return 0
+
+
+def trace_command(parsed_args):
+    with open(parsed_args.rom, 'rb') as f:
+        program = f.read()
+    core = CHIP8Core(parsed_args.instructions_per_frame,
+                     seed=parsed_args.seed, variant=parsed_args.variant)
+    core.load_program(program)
+    error = None
+    with tracer.TraceRecorder(core, parsed_args.output):
+        try:
+            if parsed_args.frames is not None:
+                core.run_frames(parsed_args.frames)
+            else:
+                core.run(parsed_args.instructions)
+        except EmulatorError as e:
+            error = str(e)
+    if error is not None:
+        print(error, file=sys.stderr)
+    print("Traced {} instructions.".format(core.instruction_count))
+    return 0
+
+
+def trace_diff_command(parsed_args):
+    difference = tracer.first_difference(parsed_args.trace_a,
+                                         parsed_args.trace_b)
+    if difference is None:
+        print("Traces are the same.")
+        return 0
+    index, record_a, record_b = difference
+    print("Traces differ at instruction {}:".format(index))
+    for path, record in ((parsed_args.trace_a, record_a),
+                         (parsed_args.trace_b, record_b)):
+        print("{}: {}".format(path, "ended" if record is None
+                              else tracer.format_record(record)))
+    return 1
+
+
+def write_json(data, path):
+    if path is None:
+        json.dump(data, sys.stdout, indent=2)
+        print()
+    else:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+
+def positive_int(value):
+    number = int(value)
+    if number <= 0:
+        raise ValueError(value)
+    return number
+
+
+def parse_args(args=None):
+    parser = ArgumentParser(prog="python -m chip8",
+                            description="Headless CHIP-8 tools")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    run_batch_parser = commands.add_parser(
+        "run-batch", help="Run many ROMs in parallel without a display "
+                          "and report their final state as JSON")
+    run_batch_parser.set_defaults(handler=run_batch_command)
+    run_batch_parser.add_argument("--variant", choices=VARIANTS,
+                                  default=CHIP8,
+                                  help="Machine to emulate: CHIP-8, "
+                                       "SUPER-CHIP or XO-CHIP")
+    run_batch_parser.add_argument("roms", nargs="+",
+                                  help="ROM files or glob patterns")
+    length = run_batch_parser.add_mutually_exclusive_group(required=True)
+    length.add_argument("-n", "--instructions", type=positive_int,
+                        help="Number of opcodes to execute per ROM")
+    length.add_argument("-F", "--frames", type=positive_int,
+                        help="Number of frames to run per ROM")
+    run_batch_parser.add_argument("-f", "--instructions-per-frame",
+                                  type=positive_int,
+                                  default=INSTRUCTIONS_PER_FRAME,
+                                  help="Opcodes executed per timers tick")
+    run_batch_parser.add_argument("-t", "--translate-blocks",
+                                  action="store_true",
+                                  help="Execute ROMs through the basic "
+                                       "block translation cache")
+    run_batch_parser.add_argument("--skip-idle", action="store_true",
+                                  help="Fast-forward loops waiting for a "
+                                       "timer tick or a key")
+    run_batch_parser.add_argument("-w", "--workers", type=positive_int,
+                                  default=None,
+                                  help="Number of worker processes "
+                                       "(one per CPU by default)")
+    run_batch_parser.add_argument("-o", "--output", type=str, default=None,
+                                  help="Path of the JSON report "
+                                       "(printed by default)")
+
+    bench_parser = commands.add_parser(
+        "bench", help="Measure instruction throughput of the emulator core")
+    bench_parser.set_defaults(handler=bench_command)
+    bench_parser.add_argument("workloads", nargs="*",
+                              help="Workloads to run, all by default: "
+                                   + ", ".join(bench.WORKLOADS))
+    bench_parser.add_argument("-n", "--instructions", type=positive_int,
+                              default=bench.DEFAULT_INSTRUCTIONS,
+                              help="Number of opcodes per workload run")
+    bench_parser.add_argument("-r", "--repeats", type=positive_int,
+                              default=bench.DEFAULT_REPEATS,
+                              help="Number of runs to take the best of")
+    bench_parser.add_argument("-f", "--instructions-per-frame",
+                              type=positive_int,
+                              default=INSTRUCTIONS_PER_FRAME,
+                              help="Opcodes executed per timers tick")
+    bench_parser.add_argument("-t", "--translate-blocks",
+                              action="store_true",
+                              help="Benchmark the basic block "
+                                   "translation cache")
+    bench_parser.add_argument("--save", type=str, default=None,
+                              help="Save the results as a JSON baseline")
+    bench_parser.add_argument("--compare", type=str, default=None,
+                              help="Fail if slower than a JSON baseline")
+    bench_parser.add_argument("--tolerance", type=float,
+                              default=bench.DEFAULT_TOLERANCE,
+                              help="Allowed slowdown fraction when "
+                                   "comparing")
+
+    profile_parser = commands.add_parser(
+        "profile", help="Count and time the opcodes executed by a ROM")
+    profile_parser.set_defaults(handler=profile_command)
+    profile_parser.add_argument("--variant", choices=VARIANTS,
+                                default=CHIP8,
+                                help="Machine to emulate: CHIP-8, "
+                                     "SUPER-CHIP or XO-CHIP")
+    profile_parser.add_argument("rom", help="Path to the ROM")
+    length = profile_parser.add_mutually_exclusive_group(required=True)
+    length.add_argument("-n", "--instructions", type=positive_int,
+                        help="Number of opcodes to execute")
+    length.add_argument("-F", "--frames", type=positive_int,
+                        help="Number of frames to run")
+    profile_parser.add_argument("-f", "--instructions-per-frame",
+                                type=positive_int,
+                                default=INSTRUCTIONS_PER_FRAME,
+                                help="Opcodes executed per timers tick")
+    profile_parser.add_argument("--top", type=positive_int, default=32,
+                                help="Number of hot addresses to report")
+    profile_parser.add_argument("-o", "--output", type=str, default=None,
+                                help="Path of the JSON report")
+    profile_parser.add_argument("--collapsed", type=str, default=None,
+                                help="Path of the collapsed stacks file "
+                                     "for flamegraph tools")
+
+    replay_parser = commands.add_parser(
+        "replay", help="Replay a recording of keys made with main.py "
+                       "--record as fast as possible")
+    replay_parser.set_defaults(handler=replay_command)
+    replay_parser.add_argument("recording", help="Path to the recording")
+    replay_parser.add_argument("-n", "--instructions", type=positive_int,
+                               default=None,
+                               help="Number of opcodes to execute "
+                                    "(up to the last key event by default)")
+    replay_parser.add_argument("-t", "--translate-blocks",
+                               action="store_true",
+                               help="Replay through the basic block "
+                                    "translation cache")
+    replay_parser.add_argument("-o", "--output", type=str, default=None,
+                               help="Path of the JSON report of the final "
+                                    "state (printed by default)")
+
+    disasm_parser = commands.add_parser(
+        "disasm", help="Disassemble a ROM into basic blocks, subroutines "
+                       "and data")
+    disasm_parser.set_defaults(handler=disasm_command)
+    disasm_parser.add_argument("--variant", choices=VARIANTS,
+                               default=CHIP8,
+                               help="Machine to emulate: CHIP-8, "
+                                    "SUPER-CHIP or XO-CHIP")
+    disasm_parser.add_argument("rom", help="Path to the ROM")
+    disasm_parser.add_argument("--json", action="store_true",
+                               help="Report blocks, subroutines and data "
+                                    "as JSON instead of a listing")
+    disasm_parser.add_argument("-o", "--output", type=str, default=None,
+                               help="Path of the listing or JSON report "
+                                    "(printed by default)")
+
+    debug_parser = commands.add_parser(
+        "debug", help="Debug a ROM with breakpoints, watchpoints and "
+                      "stepping")
+    debug_parser.set_defaults(handler=debug_command)
+    debug_parser.add_argument("--variant", choices=VARIANTS,
+                              default=CHIP8,
+                              help="Machine to emulate: CHIP-8, "
+                                   "SUPER-CHIP or XO-CHIP")
+    debug_parser.add_argument("rom", help="Path to the ROM")
+    debug_parser.add_argument("-f", "--instructions-per-frame",
+                              type=positive_int,
+                              default=INSTRUCTIONS_PER_FRAME,
+                              help="Opcodes executed per timers tick")
+    debug_parser.add_argument("-t", "--translate-blocks",
+                              action="store_true",
+                              help="Run through the basic block translation "
+                                   "cache while not stepping")
+    debug_parser.add_argument("--seed", type=int, default=None,
+                              help="Seed of the random numbers of Cxkk "
+                                   "opcodes")
+
+    trace_parser = commands.add_parser(
+        "trace", help="Record every instruction a ROM executes with the "
+                      "registers after it to a compressed trace file")
+    trace_parser.set_defaults(handler=trace_command)
+    trace_parser.add_argument("--variant", choices=VARIANTS,
+                              default=CHIP8,
+                              help="Machine to emulate: CHIP-8, "
+                                   "SUPER-CHIP or XO-CHIP")
+    trace_parser.add_argument("rom", help="Path to the ROM")
+    length = trace_parser.add_mutually_exclusive_group(required=True)
+    length.add_argument("-n", "--instructions", type=positive_int,
+                        help="Number of opcodes to execute")
+    length.add_argument("-F", "--frames", type=positive_int,
+                        help="Number of frames to run")
+    trace_parser.add_argument("-f", "--instructions-per-frame",
+                              type=positive_int,
+                              default=INSTRUCTIONS_PER_FRAME,
+                              help="Opcodes executed per timers tick")
+    trace_parser.add_argument("--seed", type=int, default=None,
+                              help="Seed of the random numbers of Cxkk "
+                                   "opcodes")
+    trace_parser.add_argument("-o", "--output", type=str, required=True,
+                              help="Path of the trace file")
+
+    trace_diff_parser = commands.add_parser(
+        "trace-diff", help="Find the first instruction two traces "
+                           "differ at")
+    trace_diff_parser.set_defaults(handler=trace_diff_command)
+    trace_diff_parser.add_argument("trace_a", help="Path to a trace")
+    trace_diff_parser.add_argument("trace_b", help="Path to another trace")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    parsed_args = parse_args(args)
+    return parsed_args.handler(parsed_args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,944 @@
+# !/usr/bin/env python3
+import random
+import struct
+
+import font
+
+SCREEN_WIDTH = 64
+SCREEN_HEIGHT = 32
+# Resolution of the high resolution mode of SUPER-CHIP and XO-CHIP
+HIRES_WIDTH = 128
+HIRES_HEIGHT = 64
+
+PROGRAM_START = 0x200
+MEMORY_SIZE = 4096
+V_MAX = 0xFF
+I_MAX = 0xFFFF
+ROW_MASK = (1 << SCREEN_WIDTH) - 1
+
+# Machines emulated: CHIP-8, SUPER-CHIP 1.1 and XO-CHIP
+CHIP8 = 'chip8'
+SUPERCHIP = 'schip'
+XOCHIP = 'xochip'
+VARIANTS = (CHIP8, SUPERCHIP, XOCHIP)
+
+XO_MEMORY_SIZE = 0x10000
+BIG_FONT_START = 0x50
+# Bitplanes of XO-CHIP, the other variants only have the first one
+PLANES = 2
+DEFAULT_PITCH = 64
+
+INSTRUCTIONS_PER_FRAME = 10
+
+STATE_MAGIC = b'C8ST'
+STATE_VERSION = 1
+# Magic, version, memory, V registers, stack, I, PC, SP, delay and sound
+# timers, waiting for key flag, pressed key + 1 (0 for none), instruction
+# and frame counts, frame cycle and the framebuffer rows
+STATE_FORMAT = struct.Struct('>4sB{}s16s16HHHBBB?BQQI{}Q'.format(
+    MEMORY_SIZE, SCREEN_HEIGHT))
+# Follows the state of SUPER-CHIP and XO-CHIP, whose framebuffer rows are
+# zeros in it: high resolution flag, selected planes, RPL flags, audio
+# pattern, pitch and the rows of the planes, a high resolution row of
+# bytes each. The memory past MEMORY_SIZE comes last.
+EXTENDED_STATE_FORMAT = struct.Struct('>?B16B16sB{}s'.format(
+    PLANES * HIRES_HEIGHT * HIRES_WIDTH // 8))
+
+
+def hex_and_dec(value):
+    return hex(value) + ' (' + str(value) + ')'
+
+
+# noinspection SpellCheckingInspection
+class CHIP8Core:
+    """In-process CHIP-8 machine without any GUI, process or shared state.
+
+    Delay and sound timers count down once per frame, every
+    instructions_per_frame executed instructions, so a run only depends on
+    the program and the keys pressed through press_key/release_key.
+    With skip_idle_loops loops waiting for a timer tick or a key are
+    fast-forwarded with the same results, see idle.IdleLoopSkipper.
+
+    variant is CHIP8, SUPERCHIP or XOCHIP. The latter two add a 128x64
+    mode, scrolling, 16x16 sprites and a big font, XO-CHIP also a second
+    bitplane and 64K of memory. Their opcodes dispatch through the table
+    of variant_opcode_table, so CHIP-8 programs run as fast as ever.
+    """
+
+    def __init__(self, instructions_per_frame=INSTRUCTIONS_PER_FRAME,
+                 use_block_cache=False, seed=None, skip_idle_loops=False,
+                 variant=CHIP8):
+        if variant not in VARIANTS:
+            raise ValueError('Unknown variant: ' + str(variant))
+        self.variant = variant
+        self.memory = bytearray(
+            XO_MEMORY_SIZE if variant == XOCHIP else MEMORY_SIZE)
+        self.address_mask = len(self.memory) - 1
+        self.memory_write_hooks = []
+
+        for i in range(16):
+            self.memory[5 * i:5 * (i + 1)] = font.FONT[i]
+        if variant != CHIP8:
+            for i in range(16):
+                start = BIG_FONT_START + 10 * i
+                self.memory[start:start + 10] = font.BIG_FONT[i]
+
+        self.v_reg = [0] * 16
+        self.i_reg = 0
+        self.program_counter = PROGRAM_START
+        self.stack_pointer = 0
+        self.stack = [0] * 16
+
+        self.delay_timer_value = 0
+        self.sound_timer_value = 0
+
+        self.instructions_per_frame = instructions_per_frame
+        self.instruction_count = 0
+        self.frame_count = 0
+        self.frame_cycle = 0
+
+        # A row of pixels per int, the leftmost pixel in the highest bit
+        self.screen_width = SCREEN_WIDTH
+        self.screen_height = SCREEN_HEIGHT
+        self.row_mask = ROW_MASK
+        self.framebuffer = [0] * SCREEN_HEIGHT
+        # The framebuffer is the first plane. Drawing, clearing and
+        # scrolling change the planes selected by the bits of plane_mask.
+        self.planes = [self.framebuffer]
+        if variant == XOCHIP:
+            self.planes.extend([0] * SCREEN_HEIGHT
+                               for _ in range(PLANES - 1))
+        self.plane_mask = 1
+        # RPL user flags of Fx75 and Fx85
+        self.flags = [0] * 16
+        # Set by F002 and Fx3A, the beeper still plays a square wave
+        self.audio_pattern = bytes(16)
+        self.pitch = DEFAULT_PITCH
+
+        self.keys = [False] * 16
+        self.pressed_key = None
+        self.waiting_for_key = False
+        # Notified of every key press and release, see replay.InputRecorder
+        self.input_recorder = None
+
+        self.seed = seed
+        self.random = random.Random(seed)
+
+        if variant != CHIP8:
+            self.opcode_table = variant_opcode_table(type(self), variant)
+
+        self.engine = self.interpret
+        self.block_cache = None
+        if use_block_cache:
+            import block_cache
+            self.block_cache = block_cache.BlockCache(self)
+            self.engine = self.block_cache.execute
+        self.idle_loop_skipper = None
+        if skip_idle_loops:
+            import idle
+            self.idle_loop_skipper = idle.IdleLoopSkipper(self, self.engine)
+            self.engine = self.idle_loop_skipper.execute
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.opcode_table = bind_opcode_table(cls)
+
+    def load_program(self, program_bytes):
+        self.memory[
+        PROGRAM_START:PROGRAM_START + len(program_bytes)] = program_bytes
+        self._on_memory_write(PROGRAM_START, len(program_bytes))
+
+    def _on_memory_write(self, address, length):
+        for hook in self.memory_write_hooks:
+            hook(address, length)
+
+    def save_state(self):
+        """Returns the whole machine state as a compact binary blob."""
+        delay_timer_value, sound_timer_value = self._timer_values()
+        extended = self.variant != CHIP8
+        state = STATE_FORMAT.pack(
+            STATE_MAGIC, STATE_VERSION, bytes(self.memory[:MEMORY_SIZE]),
+            bytes(self.v_reg), *self.stack, self.i_reg,
+            self.program_counter, self.stack_pointer,
+            delay_timer_value, sound_timer_value, self.waiting_for_key,
+            0 if self.pressed_key is None else self.pressed_key + 1,
+            self.instruction_count, self.frame_count, self.frame_cycle,
+            *([0] * SCREEN_HEIGHT if extended else self.framebuffer))
+        if not extended:
+            return state
+        rows = b''.join(row.to_bytes(HIRES_WIDTH // 8, 'big')
+                        for plane in self.planes for row in plane)
+        return state + EXTENDED_STATE_FORMAT.pack(
+            self.screen_width == HIRES_WIDTH, self.plane_mask, *self.flags,
+            self.audio_pattern, self.pitch, rows) + \
+            bytes(self.memory[MEMORY_SIZE:])
+
+    def load_state(self, state):
+        """Restores a state returned by save_state."""
+        size = STATE_FORMAT.size
+        if self.variant != CHIP8:
+            size += EXTENDED_STATE_FORMAT.size + \
+                len(self.memory) - MEMORY_SIZE
+        if len(state) != size or state[:len(STATE_MAGIC)] != STATE_MAGIC:
+            raise ValueError('Not a CHIP-8 state')
+        values = STATE_FORMAT.unpack_from(state)
+        if values[1] != STATE_VERSION:
+            raise ValueError('Unsupported state version: ' + str(values[1]))
+
+        memory = values[2]
+        if self.variant != CHIP8:
+            memory += state[STATE_FORMAT.size +
+                            EXTENDED_STATE_FORMAT.size:]
+        if self.memory != memory:
+            self.memory[:] = memory
+            self._on_memory_write(0, len(memory))
+        self.v_reg[:] = values[3]
+        self.stack[:] = values[4:20]
+        (self.i_reg, self.program_counter, self.stack_pointer,
+         delay_timer_value, sound_timer_value, self.waiting_for_key,
+         pressed_key, self.instruction_count, self.frame_count,
+         self.frame_cycle) = values[20:30]
+        self._set_timer_values(delay_timer_value, sound_timer_value)
+        self.pressed_key = pressed_key - 1 if pressed_key else None
+        if self.variant == CHIP8:
+            self.framebuffer[:] = values[30:]
+            return
+
+        extended_values = EXTENDED_STATE_FORMAT.unpack_from(
+            state, STATE_FORMAT.size)
+        self._set_resolution(extended_values[0])
+        self.plane_mask = extended_values[1]
+        self.flags[:] = extended_values[2:18]
+        self.audio_pattern, self.pitch, rows = extended_values[18:]
+        row_bytes = HIRES_WIDTH // 8
+        offset = 0
+        for plane in self.planes:
+            plane[:] = [int.from_bytes(rows[offset + row_bytes * y:
+                                            offset + row_bytes * (y + 1)],
+                                       'big')
+                        for y in range(self.screen_height)]
+            offset += row_bytes * self.screen_height
+
+    def _timer_values(self):
+        return self.delay_timer_value, self.sound_timer_value
+
+    def _set_timer_values(self, delay_timer_value, sound_timer_value):
+        self.delay_timer_value = delay_timer_value
+        self.sound_timer_value = sound_timer_value
+
+    def press_key(self, key):
+        self.keys[key] = True
+        self.pressed_key = key
+        if self.input_recorder is not None:
+            self.input_recorder.record(self.instruction_count, key, True)
+
+    def release_key(self, key):
+        self.keys[key] = False
+        if self.input_recorder is not None:
+            self.input_recorder.record(self.instruction_count, key, False)
+
+    def get_pixel(self, x, y):
+        return bool((self.framebuffer[y] >> (self.screen_width - 1 - x)) & 1)
+
+    def set_pixel(self, x, y, value):
+        bit = 1 << (self.screen_width - 1 - x)
+        if value:
+            self.framebuffer[y] |= bit
+        else:
+            self.framebuffer[y] &= ~bit
+
+    def framebuffer_bytes(self):
+        """Rows packed 8 pixels per byte, leftmost pixel in the highest bit.
+        """
+        return b''.join(row.to_bytes(self.screen_width // 8, 'big')
+                        for row in self.framebuffer)
+
+    def execute(self):
+        self.program_counter = PROGRAM_START
+        while True:
+            self.run(self.instructions_per_frame)
+
+    def step(self):
+        self.run(1)
+
+    def run_frames(self, frames):
+        self.run(frames * self.instructions_per_frame)
+
+    def run(self, instructions):
+        target = self.instruction_count + instructions
+        while self.instruction_count < target:
+            remaining = target - self.instruction_count
+            counted = self.instruction_count
+            try:
+                executed = self.engine(
+                    min(remaining,
+                        self.instructions_per_frame - self.frame_cycle),
+                    remaining)
+            except EmulatorError:
+                # Engines count the instructions executed before an error
+                self._count_frames(self.instruction_count - counted)
+                raise
+            self.instruction_count += executed
+            self._count_frames(executed)
+
+    def _count_frames(self, executed):
+        self.frame_cycle += executed
+        while self.frame_cycle >= self.instructions_per_frame:
+            self.frame_cycle -= self.instructions_per_frame
+            self.frame_count += 1
+            self.tick_timers()
+
+    def interpret(self, count, limit=None):
+        memory = self.memory
+        opcode_table = self.opcode_table
+        address_mask = self.address_mask
+        executed = 0
+        try:
+            for executed in range(count):
+                program_code = (memory[self.program_counter] << 8) | \
+                               memory[self.program_counter + 1]
+                program = opcode_table[program_code]
+                if program is None:
+                    raise self._program_not_found_error(program_code)
+                program[0](self, *program[1])
+                self.program_counter = \
+                    (self.program_counter + 2) & address_mask
+        except EmulatorError:
+            # Opcodes before the failed one have been executed
+            self.instruction_count += executed
+            raise
+        return count
+
+    def on_idle(self):
+        """Called when idle loop iterations have been skipped, the program
+        waits for a timer tick or a key event."""
+
+    def tick_timers(self):
+        if self.delay_timer_value > 0:
+            self.delay_timer_value -= 1
+        if self.sound_timer_value > 0:
+            self.sound_timer_value -= 1
+
+    def _program_not_found_error(self, program_code):
+        readable_code = hex(program_code)[2:].zfill(4).upper()
+        error_message = ("Error at memory position {0} "
+                         "({1} bytes from program start): "
+                         "Not found program matching " +
+                         readable_code).format(
+            hex_and_dec(self.program_counter),
+            hex_and_dec(self.program_counter - PROGRAM_START))
+        return OpCodeNotFoundError(error_message)
+
+    def _stack_error(self, problem):
+        return StackError('Error at memory position {0}: Stack {1}'.format(
+            hex_and_dec(self.program_counter), problem))
+
+    def execute_program(self, program_code):
+        program = self.opcode_table[program_code]
+        if program is None:
+            raise OpCodeNotFoundError(
+                'Not found program matching ' + hex(program_code)[2:].upper())
+        program[0](self, *program[1])
+        self.program_counter = (self.program_counter + 2) & self.address_mask
+
+    # 00E0
+    def clear_screen(self):
+        for plane in self.selected_planes():
+            plane[:] = [0] * self.screen_height
+
+    def selected_planes(self):
+        return [plane for i, plane in enumerate(self.planes)
+                if self.plane_mask >> i & 1]
+
+    # 00EE
+    def return_back(self):
+        if self.stack_pointer == 0:
+            raise self._stack_error('underflow')
+        self.stack_pointer -= 1
+        self.program_counter = self.stack[self.stack_pointer]
+
+    programs_0 = {0x00E0: clear_screen, 0x00EE: return_back}
+
+    def decode_program_0(program_code):
+        if program_code in CHIP8Core.programs_0:
+            return CHIP8Core.programs_0[program_code], ()
+        return None
+
+    # 1nnn
+    def jump(self, location):
+        self.program_counter = location - 2
+
+    def decode_program_1(program_code):
+        return CHIP8Core.jump, (program_code & 0xFFF,)
+
+    # 2nnn
+    def call(self, location):
+        if self.stack_pointer == len(self.stack):
+            raise self._stack_error('overflow')
+        self.stack[self.stack_pointer] = self.program_counter
+        self.stack_pointer += 1
+        self.program_counter = location - 2
+
+    def decode_program_2(program_code):
+        return CHIP8Core.call, (program_code & 0xFFF,)
+
+    # 3xkk
+    def skip_if_eq(self, reg_num, comparing_value):
+        if self.v_reg[reg_num] == comparing_value:
+            self.program_counter += 2
+
+    def decode_program_3(program_code):
+        return CHIP8Core.skip_if_eq, ((program_code & 0xF00) >> 8,
+                                      program_code & 0xFF)
+
+    # 4xkk
+    def skip_if_not_eq(self, reg_num, comparing_value):
+        if self.v_reg[reg_num] != comparing_value:
+            self.program_counter += 2
+
+    def decode_program_4(program_code):
+        return CHIP8Core.skip_if_not_eq, ((program_code & 0xF00) >> 8,
+                                          program_code & 0xFF)
+
+    # 5xy0
+    def skip_if_regs_eq(self, reg_num_1, reg_num_2):
+        if self.v_reg[reg_num_1] == self.v_reg[reg_num_2]:
+            self.program_counter += 2
+
+    def decode_program_5(program_code):
+        if program_code & 0xF != 0:
+            return None
+        return CHIP8Core.skip_if_regs_eq, ((program_code & 0xF00) >> 8,
+                                           (program_code & 0x0F0) >> 4)
+
+    # 6xkk
+    def set(self, reg_num, value):
+        self.v_reg[reg_num] = value
+
+    def decode_program_6(program_code):
+        return CHIP8Core.set, ((program_code & 0xF00) >> 8,
+                               program_code & 0xFF)
+
+    # 7xkk
+    def increment(self, reg_num, value):
+        self.v_reg[reg_num] = (self.v_reg[reg_num] + value) & V_MAX
+
+    def decode_program_7(program_code):
+        return CHIP8Core.increment, ((program_code & 0xF00) >> 8,
+                                     program_code & 0xFF)
+
+    # 8xy0
+    def set_reg(self, reg_num_1, reg_num_2):
+        self.v_reg[reg_num_1] = self.v_reg[reg_num_2]
+
+    # 8xy1
+    def set_reg_or(self, reg_num_1, reg_num_2):
+        self.v_reg[reg_num_1] = self.v_reg[reg_num_1] | self.v_reg[reg_num_2]
+
+    # 8xy2
+    def set_reg_and(self, reg_num_1, reg_num_2):
+        self.v_reg[reg_num_1] = self.v_reg[reg_num_1] & self.v_reg[reg_num_2]
+
+    # 8xy3
+    def set_reg_xor(self, reg_num_1, reg_num_2):
+        self.v_reg[reg_num_1] = self.v_reg[reg_num_1] ^ self.v_reg[reg_num_2]
+
+    # 8xy4
+    def sum_regs(self, reg_num_1, reg_num_2):
+        result = self.v_reg[reg_num_1] + self.v_reg[reg_num_2]
+        self.v_reg[0xF] = int(result & (V_MAX + 1) > 0)
+        self.v_reg[reg_num_1] = result & V_MAX
+
+    # 8xy5
+    def sub_regs(self, reg_num_1, reg_num_2):
+        result = self.v_reg[reg_num_1] - self.v_reg[reg_num_2]
+        self.v_reg[0xF] = int(result >= 0)
+        if result < 0:
+            result += V_MAX + 1
+        self.v_reg[reg_num_1] = result
+
+    # 8xy6
+    def rshift_reg(self, reg_num_1, reg_num_2):
+        self.v_reg[0xF] = self.v_reg[reg_num_1] & 1
+        self.v_reg[reg_num_1] = self.v_reg[reg_num_1] >> 1
+
+    # 8xy7
+    def subn_regs(self, reg_num_1, reg_num_2):
+        result = self.v_reg[reg_num_2] - self.v_reg[reg_num_1]
+        self.v_reg[0xF] = int(result >= 0)
+        if result < 0:
+            result += V_MAX + 1
+        self.v_reg[reg_num_1] = result
+
+    # 8xyE
+    def lshift_reg(self, reg_num_1, reg_num_2):
+        self.v_reg[0xF] = int((self.v_reg[reg_num_1] & 0b10000000) != 0)
+        self.v_reg[reg_num_1] = (self.v_reg[reg_num_1] << 1) & V_MAX
+
+    programs_8 = {0: set_reg, 1: set_reg_or, 2: set_reg_and, 3: set_reg_xor,
+                  4: sum_regs, 5: sub_regs, 6: rshift_reg, 7: subn_regs,
+                  0xE: lshift_reg}
+
+    def decode_program_8(program_code):
+        last_digit = program_code & 0xF
+        if last_digit in CHIP8Core.programs_8:
+            reg_num_1 = (program_code & 0xF00) >> 8
+            reg_num_2 = (program_code & 0x0F0) >> 4
+            return CHIP8Core.programs_8[last_digit], (reg_num_1, reg_num_2)
+        return None
+
+    # 9xy0
+    def skip_if_regs_not_eq(self, reg_num_1, reg_num_2):
+        if self.v_reg[reg_num_1] != self.v_reg[reg_num_2]:
+            self.program_counter += 2
+
+    def decode_program_9(program_code):
+        if program_code & 0xF != 0:
+            return None
+        return CHIP8Core.skip_if_regs_not_eq, (
+            (program_code & 0xF00) >> 8, (program_code & 0x0F0) >> 4)
+
+    # Annn
+    def set_i(self, value):
+        self.i_reg = value
+
+    def decode_program_a(program_code):
+        return CHIP8Core.set_i, (program_code & 0xFFF,)
+
+    # Bnnn
+    def jump_to_v0_sum(self, value):
+        self.program_counter = value + self.v_reg[0] - 2
+
+    def decode_program_b(program_code):
+        return CHIP8Core.jump_to_v0_sum, (program_code & 0xFFF,)
+
+    # Cxkk
+    def set_rand_and(self, reg_num, value):
+        self.v_reg[reg_num] = self.random.randint(0, 255) & value
+
+    def decode_program_c(program_code):
+        return CHIP8Core.set_rand_and, ((program_code & 0xF00) >> 8,
+                                        program_code & 0x0FF)
+
+    # Dxyn
+    def draw_sprite(self, vx, vy, sprite_height):
+        x = self.v_reg[vx] % SCREEN_WIDTH
+        y = self.v_reg[vy]
+        framebuffer = self.framebuffer
+        memory = self.memory
+        collision = 0
+        for i in range(sprite_height):
+            # Rotate the sprite line right, so it wraps around the screen
+            line = memory[(self.i_reg + i) & 0xFFF] << (SCREEN_WIDTH - 8)
+            line = ((line >> x) | (line << (SCREEN_WIDTH - x))) & ROW_MASK
+            row = (y + i) % SCREEN_HEIGHT
+            collision |= framebuffer[row] & line
+            framebuffer[row] ^= line
+        self.v_reg[0xf] = int(collision != 0)
+
+    def decode_program_d(program_code):
+        return CHIP8Core.draw_sprite, ((program_code & 0xF00) >> 8,
+                                       (program_code & 0x0F0) >> 4,
+                                       program_code & 0x00F)
+
+    # Ex9E
+    def skip_if_pressed(self, reg_num):
+        key = self.v_reg[reg_num]
+        if self.keys[key]:
+            self.program_counter += 2
+
+    # ExA1
+    def skip_if_not_pressed(self, reg_num):
+        key = self.v_reg[reg_num]
+        if not self.keys[key]:
+            self.program_counter += 2
+
+    programs_e = {0x9E: skip_if_pressed, 0xA1: skip_if_not_pressed}
+
+    def decode_program_e(program_code):
+        last_two_digits = program_code & 0xFF
+        if last_two_digits in CHIP8Core.programs_e:
+            return CHIP8Core.programs_e[last_two_digits], (
+                (program_code & 0xF00) >> 8,)
+        return None
+
+    # Fx07
+    def set_delay_timer_value_to_v(self, reg_num):
+        self.v_reg[reg_num] = self.delay_timer_value & V_MAX
+
+    # Fx0A
+    def wait_and_set_pressed_key(self, reg_num):
+        if not self.waiting_for_key:
+            self.waiting_for_key = True
+            self.pressed_key = None
+        if self.pressed_key is None:
+            # Execute this opcode again until a key is pressed
+            self.program_counter -= 2
+            return
+        self.waiting_for_key = False
+        self.v_reg[reg_num] = self.pressed_key & V_MAX
+
+    # Fx15
+    def set_delay_timer(self, reg_num):
+        self.delay_timer_value = self.v_reg[reg_num]
+
+    # Fx18
+    def set_sound_timer(self, reg_num):
+        if self.v_reg[reg_num] != 1:
+            self.sound_timer_value = self.v_reg[reg_num]
+
+    # Fx1E
+    def add_vx_to_i(self, reg_num):
+        new_i = self.i_reg + self.v_reg[reg_num]
+        self.i_reg = new_i & I_MAX
+        self.v_reg[0xf] = int((new_i & (I_MAX + 1)) > 0)
+
+    # Fx29
+    def set_i_to_digit_sprite(self, reg_num):
+        self.i_reg = self.v_reg[reg_num] * 5
+
+    # Fx33
+    def store_in_i_as_bcd(self, reg_num):
+        value = self.v_reg[reg_num]
+        hundreds = value % 1000 // 100
+        tens = value % 100 // 10
+        ones = value % 10
+        self.memory[self.i_reg] = hundreds
+        self.memory[self.i_reg + 1] = tens
+        self.memory[self.i_reg + 2] = ones
+        self._on_memory_write(self.i_reg, 3)
+
+    # Fx55
+    def write_v_to_i(self, reg_end_num):
+        for i in range(reg_end_num + 1):
+            self.memory[(self.i_reg + i) & self.address_mask] = \
+                self.v_reg[i]
+        self._on_memory_write(self.i_reg, reg_end_num + 1)
+
+    # Fx65
+    def read_v_from_i(self, reg_end_num):
+        for i in range(reg_end_num + 1):
+            self.v_reg[i] = self.memory[(self.i_reg + i) & self.address_mask]
+
+    programs_f = {0x07: set_delay_timer_value_to_v,
+                  0x0A: wait_and_set_pressed_key,
+                  0x15: set_delay_timer,
+                  0x18: set_sound_timer,
+                  0x1E: add_vx_to_i,
+                  0x29: set_i_to_digit_sprite,
+                  0x33: store_in_i_as_bcd,
+                  0x55: write_v_to_i,
+                  0x65: read_v_from_i}
+
+    def decode_program_f(program_code):
+        last_two_digits = program_code & 0xFF
+        if last_two_digits in CHIP8Core.programs_f:
+            return CHIP8Core.programs_f[last_two_digits], (
+                (program_code & 0xF00) >> 8,)
+        return None
+
+    programs_by_first_digit = [decode_program_0,
+                               decode_program_1,
+                               decode_program_2,
+                               decode_program_3,
+                               decode_program_4,
+                               decode_program_5,
+                               decode_program_6,
+                               decode_program_7,
+                               decode_program_8,
+                               decode_program_9,
+                               decode_program_a,
+                               decode_program_b,
+                               decode_program_c,
+                               decode_program_d,
+                               decode_program_e,
+                               decode_program_f]
+
+    # SUPER-CHIP and XO-CHIP programs, dispatched through the tables of
+    # variant_opcode_table. Rows are scrolled by moving the row ints
+    # within the planes and shifting them, never pixel by pixel.
+
+    # 00Cn
+    def scroll_down(self, rows):
+        height = self.screen_height
+        for plane in self.selected_planes():
+            plane[:] = [0] * rows + plane[:height - rows]
+
+    # 00Dn
+    def scroll_up(self, rows):
+        for plane in self.selected_planes():
+            plane[:] = plane[rows:] + [0] * rows
+
+    # 00FB
+    def scroll_right(self):
+        for plane in self.selected_planes():
+            plane[:] = [row >> 4 for row in plane]
+
+    # 00FC
+    def scroll_left(self):
+        row_mask = self.row_mask
+        for plane in self.selected_planes():
+            plane[:] = [(row << 4) & row_mask for row in plane]
+
+    # 00FD
+    def exit_interpreter(self):
+        # Halt on this opcode
+        self.program_counter -= 2
+        self.on_idle()
+
+    # 00FE
+    def set_lores(self):
+        self._set_resolution(False)
+
+    # 00FF
+    def set_hires(self):
+        self._set_resolution(True)
+
+    def _set_resolution(self, hires):
+        """Switches between 64x32 and 128x64 pixels, clearing the planes.
+        """
+        if hires:
+            self.screen_width, self.screen_height = HIRES_WIDTH, HIRES_HEIGHT
+        else:
+            self.screen_width, self.screen_height = SCREEN_WIDTH, \
+                SCREEN_HEIGHT
+        self.row_mask = (1 << self.screen_width) - 1
+        for plane in self.planes:
+            plane[:] = [0] * self.screen_height
+
+    # Dxyn, Dxy0 draws 16x16 pixels from 32 bytes
+    def draw_extended_sprite(self, vx, vy, sprite_height):
+        width = self.screen_width
+        height = self.screen_height
+        x = self.v_reg[vx] % width
+        y = self.v_reg[vy] % height
+        memory = self.memory
+        address_mask = self.address_mask
+        row_mask = self.row_mask
+        wide = sprite_height == 0
+        if wide:
+            sprite_height = 16
+        shift = width - (16 if wide else 8)
+        address = self.i_reg
+        collision = 0
+        # Planes drawn together take their sprites one after another
+        for plane in self.selected_planes():
+            for i in range(sprite_height):
+                if wide:
+                    line = (memory[address & address_mask] << 8) | \
+                        memory[(address + 1) & address_mask]
+                    address += 2
+                else:
+                    line = memory[address & address_mask]
+                    address += 1
+                # Rotate the sprite line right, so it wraps around the screen
+                line <<= shift
+                line = ((line >> x) | (line << (width - x))) & row_mask
+                row = (y + i) % height
+                collision |= plane[row] & line
+                plane[row] ^= line
+        self.v_reg[0xf] = int(collision != 0)
+
+    # Fx30
+    def set_i_to_big_digit_sprite(self, reg_num):
+        self.i_reg = BIG_FONT_START + (self.v_reg[reg_num] & 0xF) * 10
+
+    # Fx75
+    def write_v_to_flags(self, reg_end_num):
+        self.flags[:reg_end_num + 1] = self.v_reg[:reg_end_num + 1]
+
+    # Fx85
+    def read_v_from_flags(self, reg_end_num):
+        self.v_reg[:reg_end_num + 1] = self.flags[:reg_end_num + 1]
+
+    # 5xy2
+    def write_v_range_to_i(self, reg_num_1, reg_num_2):
+        step = 1 if reg_num_1 <= reg_num_2 else -1
+        registers = range(reg_num_1, reg_num_2 + step, step)
+        for i, reg_num in enumerate(registers):
+            self.memory[(self.i_reg + i) & self.address_mask] = \
+                self.v_reg[reg_num]
+        self._on_memory_write(self.i_reg, len(registers))
+
+    # 5xy3
+    def read_v_range_from_i(self, reg_num_1, reg_num_2):
+        step = 1 if reg_num_1 <= reg_num_2 else -1
+        for i, reg_num in enumerate(range(reg_num_1, reg_num_2 + step, step)):
+            self.v_reg[reg_num] = \
+                self.memory[(self.i_reg + i) & self.address_mask]
+
+    # F000 nnnn
+    def set_i_long(self):
+        address = (self.program_counter + 2) & self.address_mask
+        self.i_reg = (self.memory[address] << 8) | \
+            self.memory[(address + 1) & self.address_mask]
+        self.program_counter = address
+
+    # Fn01
+    def select_planes(self, planes):
+        self.plane_mask = planes
+
+    # F002
+    def load_audio_pattern(self):
+        start = self.i_reg
+        self.audio_pattern = bytes(
+            self.memory[(start + i) & self.address_mask] for i in range(16))
+
+    # Fx3A
+    def set_pitch(self, reg_num):
+        self.pitch = self.v_reg[reg_num]
+
+    # 3xkk, 4xkk, 5xy0, 9xy0, Ex9E and ExA1 of XO-CHIP skip both words
+    # of F000 nnnn
+    def long_skip_if_eq(self, reg_num, comparing_value):
+        self._long_skip(self.skip_if_eq, reg_num, comparing_value)
+
+    def long_skip_if_not_eq(self, reg_num, comparing_value):
+        self._long_skip(self.skip_if_not_eq, reg_num, comparing_value)
+
+    def long_skip_if_regs_eq(self, reg_num_1, reg_num_2):
+        self._long_skip(self.skip_if_regs_eq, reg_num_1, reg_num_2)
+
+    def long_skip_if_regs_not_eq(self, reg_num_1, reg_num_2):
+        self._long_skip(self.skip_if_regs_not_eq, reg_num_1, reg_num_2)
+
+    def long_skip_if_pressed(self, reg_num):
+        self._long_skip(self.skip_if_pressed, reg_num)
+
+    def long_skip_if_not_pressed(self, reg_num):
+        self._long_skip(self.skip_if_not_pressed, reg_num)
+
+    def _long_skip(self, skip, *operands):
+        address = self.program_counter
+        skip(*operands)
+        if self.program_counter != address and \
+                self.memory[(address + 2) & self.address_mask] == 0xF0 and \
+                self.memory[(address + 3) & self.address_mask] == 0x00:
+            self.program_counter += 2
+
+    programs_0_superchip = {0x00FB: scroll_right, 0x00FC: scroll_left,
+                            0x00FD: exit_interpreter, 0x00FE: set_lores,
+                            0x00FF: set_hires}
+    programs_f_superchip = {0x30: set_i_to_big_digit_sprite,
+                            0x75: write_v_to_flags,
+                            0x85: read_v_from_flags}
+    programs_5_xochip = {2: write_v_range_to_i, 3: read_v_range_from_i}
+    # XO-CHIP skips by the first digit of their opcode
+    long_skips = {0x3: long_skip_if_eq, 0x4: long_skip_if_not_eq,
+                  0x5: long_skip_if_regs_eq, 0x9: long_skip_if_regs_not_eq}
+
+    # Filled below the class: (handler, operands) or None for every opcode
+    opcode_table = ()
+
+
+def decode_program(program_code):
+    first_hex = (program_code >> 12) & 0xf
+    return CHIP8Core.programs_by_first_digit[first_hex](program_code)
+
+
+def decode_superchip_program(program_code):
+    """Returns the SUPER-CHIP program of an opcode, None where it is the
+    CHIP-8 one."""
+    first_hex = program_code >> 12
+    if first_hex == 0:
+        if program_code & 0xFFF0 == 0x00C0:
+            return CHIP8Core.scroll_down, (program_code & 0xF,)
+        if program_code in CHIP8Core.programs_0_superchip:
+            return CHIP8Core.programs_0_superchip[program_code], ()
+    elif first_hex == 0xD:
+        return CHIP8Core.draw_extended_sprite, ((program_code & 0xF00) >> 8,
+                                                (program_code & 0x0F0) >> 4,
+                                                program_code & 0x00F)
+    elif first_hex == 0xF and \
+            program_code & 0xFF in CHIP8Core.programs_f_superchip:
+        return CHIP8Core.programs_f_superchip[program_code & 0xFF], (
+            (program_code & 0xF00) >> 8,)
+    return None
+
+
+def decode_xochip_program(program_code):
+    """Returns the XO-CHIP program of an opcode, None where it is the
+    SUPER-CHIP one."""
+    first_hex = program_code >> 12
+    reg_num_1 = (program_code & 0xF00) >> 8
+    reg_num_2 = (program_code & 0x0F0) >> 4
+    if program_code & 0xFFF0 == 0x00D0:
+        return CHIP8Core.scroll_up, (program_code & 0xF,)
+    if first_hex == 0x5 and program_code & 0xF in CHIP8Core.programs_5_xochip:
+        return CHIP8Core.programs_5_xochip[program_code & 0xF], (reg_num_1,
+                                                                 reg_num_2)
+    if program_code == 0xF000:
+        return CHIP8Core.set_i_long, ()
+    if program_code == 0xF002:
+        return CHIP8Core.load_audio_pattern, ()
+    if first_hex == 0xF and program_code & 0xFF == 0x01:
+        return CHIP8Core.select_planes, (reg_num_1,)
+    if first_hex == 0xF and program_code & 0xFF == 0x3A:
+        return CHIP8Core.set_pitch, (reg_num_1,)
+    program = CHIP8Core.opcode_table[program_code]
+    if program is not None and first_hex in CHIP8Core.long_skips:
+        return CHIP8Core.long_skips[first_hex], program[1]
+    if program is not None and first_hex == 0xE:
+        return (CHIP8Core.long_skip_if_pressed
+                if program[0] is CHIP8Core.skip_if_pressed
+                else CHIP8Core.long_skip_if_not_pressed), program[1]
+    return None
+
+
+def build_variant_opcode_table(variant):
+    decoders = [decode_superchip_program]
+    if variant == XOCHIP:
+        decoders.append(decode_xochip_program)
+    table = list(CHIP8Core.opcode_table)
+    for program_code in range(0x10000):
+        for decode in decoders:
+            program = decode(program_code)
+            if program is not None:
+                table[program_code] = program
+    return tuple(table)
+
+
+def variant_opcode_table(cls, variant):
+    """Returns the opcode table of a variant with handlers resolved on cls,
+    built on first use."""
+    tables = cls.__dict__.get('variant_opcode_tables')
+    if tables is None:
+        tables = {CHIP8: cls.opcode_table}
+        cls.variant_opcode_tables = tables
+    if variant not in tables:
+        if cls is CHIP8Core:
+            tables[variant] = build_variant_opcode_table(variant)
+        else:
+            tables[variant] = bind_opcode_table(
+                cls, variant_opcode_table(CHIP8Core, variant))
+    return tables[variant]
+
+
+def bind_opcode_table(cls, opcode_table=None):
+    """Resolves handlers of CHIP8Core.opcode_table, or of the given table,
+    on a subclass, so that overridden programs are dispatched to."""
+    if opcode_table is None:
+        opcode_table = CHIP8Core.opcode_table
+    handlers = {handler: getattr(cls, handler.__name__)
+                for handler in set(program[0] for program
+                                   in opcode_table if program)}
+    if all(handler is bound for handler, bound in handlers.items()):
+        return opcode_table
+    return tuple(program and (handlers[program[0]], program[1])
+                 for program in opcode_table)
+
+
+CHIP8Core.opcode_table = tuple(decode_program(program_code)
+                               for program_code in range(0x10000))
+
+
+class EmulatorError(Exception):
+    pass
+
+
+class OpCodeNotFoundError(EmulatorError):
+    pass
+
+
+class StackError(EmulatorError):
+    """Raised by 2nnn on a full stack and by 00EE on an empty one."""
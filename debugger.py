@@ -0,0 +1,349 @@
+# !/usr/bin/env python3
+import cmd
+
+from core import EmulatorError
+from disasm import mnemonic
+
+# Names conditions of breakpoints are evaluated with
+CONDITION_NAMES = ['V{:X}'.format(i) for i in range(16)] + \
+                  ['I', 'PC', 'SP', 'DT', 'ST']
+
+
+class DebuggerBreak(EmulatorError):
+    """Raised out of CHIP8Core.run when the debugger stops the program."""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def condition_values(emulator):
+    delay_timer_value, sound_timer_value = emulator._timer_values()
+    values = {'V{:X}'.format(i): value
+              for i, value in enumerate(emulator.v_reg)}
+    values.update(I=emulator.i_reg, PC=emulator.program_counter,
+                  SP=emulator.stack_pointer, DT=delay_timer_value,
+                  ST=sound_timer_value)
+    return values
+
+
+def compile_condition(expression):
+    """Returns a function of an emulator evaluating a Python expression of
+    the registers, e.g. V3 == 5 and I > 0x300."""
+    code = compile(expression, '<condition>', 'eval')
+    unknown = set(code.co_names) - set(CONDITION_NAMES)
+    if unknown:
+        raise ValueError('Unknown names: ' + ', '.join(sorted(unknown)))
+
+    def condition(emulator):
+        return bool(eval(code, {'__builtins__': {}},
+                         condition_values(emulator)))
+    condition.expression = expression
+    return condition
+
+
+def format_state(emulator, context=3):
+    """Returns lines describing registers, the stack and the code around
+    the program counter of an emulator."""
+    delay_timer_value, sound_timer_value = emulator._timer_values()
+    lines = [' '.join('V{:X}={:02X}'.format(i, value)
+                      for i, value in enumerate(emulator.v_reg[:8])),
+             ' '.join('V{:X}={:02X}'.format(i + 8, value)
+                      for i, value in enumerate(emulator.v_reg[8:])),
+             'I={:03X} PC={:03X} SP={:X} DT={:02X} ST={:02X} '
+             'instructions={} frames={}'.format(
+                 emulator.i_reg, emulator.program_counter,
+                 emulator.stack_pointer, delay_timer_value,
+                 sound_timer_value, emulator.instruction_count,
+                 emulator.frame_count),
+             'stack: ' + ' '.join(
+                 '{:03X}'.format(address) for address
+                 in emulator.stack[:emulator.stack_pointer])]
+    start = max(0, emulator.program_counter - 2 * context)
+    lines.extend(format_code(emulator, start, 2 * context + 1))
+    return lines
+
+
+def format_code(emulator, address, count):
+    lines = []
+    for address in range(address, address + 2 * count, 2):
+        if address + 1 >= len(emulator.memory):
+            break
+        program_code = (emulator.memory[address] << 8) | \
+            emulator.memory[address + 1]
+        lines.append('{} {:03X}  {:04X}  {}'.format(
+            '>' if address == emulator.program_counter else ' ',
+            address, program_code,
+            mnemonic(program_code, emulator.variant) or '??'))
+    return lines
+
+
+class Debugger:
+    """Breakpoints, memory watchpoints and stepping for an emulator.
+
+    Checks live in a separate interpreter swapped in as the engine of the
+    emulator only while there are breakpoints or watchpoints, or while
+    stepping, so otherwise the emulator runs as fast as ever. Stops are
+    raised out of run as DebuggerBreak after the instructions before them
+    have been counted; the program counter is then at the instruction
+    that would run next.
+    """
+
+    def __init__(self, emulator):
+        self.emulator = emulator
+        self.engine = None
+        # Address to the condition of the breakpoint there, None if there
+        # is none
+        self.breakpoints = {}
+        # (start, end) ranges of memory stopped on when written
+        self.watchpoints = []
+        # While stepping, checked after every instruction to stop once true
+        self.stop_condition = None
+        self.watch_hit = None
+        # Address and instruction count of the last breakpoint stopped at,
+        # so that running on from there goes past it
+        self.stopped_at = None
+
+    @property
+    def attached(self):
+        return self.engine is not None
+
+    def add_breakpoint(self, address, condition=None):
+        self.breakpoints[address] = condition
+        self._attach()
+
+    def remove_breakpoint(self, address):
+        del self.breakpoints[address]
+        self._update()
+
+    def add_watchpoint(self, start, end=None):
+        self.watchpoints.append((start, start + 1 if end is None else end))
+        self._attach()
+
+    def remove_watchpoint(self, start):
+        self.watchpoints = [watchpoint for watchpoint in self.watchpoints
+                            if watchpoint[0] != start]
+        self._update()
+
+    def step(self, count=1):
+        """Executes count instructions, stopping at breakpoints as well."""
+        return self.run(count)
+
+    def step_over(self):
+        """Steps over a call, running the subroutine up to its return."""
+        emulator = self.emulator
+        address = emulator.program_counter
+        if emulator.memory[address] >> 4 != 0x2:
+            return self.step()
+        stack_pointer = emulator.stack_pointer
+        return_address = address + 2
+        return self.run(condition=lambda: (
+            emulator.program_counter == return_address and
+            emulator.stack_pointer == stack_pointer))
+
+    def run_to_return(self):
+        """Runs up to the return from the current subroutine."""
+        emulator = self.emulator
+        stack_pointer = emulator.stack_pointer
+        return self.run(condition=lambda: (
+            emulator.stack_pointer < stack_pointer))
+
+    def run(self, instructions=None, condition=None):
+        """Runs the given number of instructions, or until stopped if
+        None. Stops once condition returns true after an instruction.
+        Returns the reason of the stop, None if none."""
+        emulator = self.emulator
+        self.stop_condition = condition
+        self._update()
+        try:
+            if instructions is not None:
+                emulator.run(instructions)
+                return None
+            while True:
+                emulator.run(emulator.instructions_per_frame)
+        except DebuggerBreak as e:
+            return e.reason
+        finally:
+            self.stop_condition = None
+            self._update()
+
+    def _attach(self):
+        if not self.attached:
+            self.engine = self.emulator.engine
+            self.emulator.engine = self.interpret
+            self.emulator.memory_write_hooks.append(self._on_memory_write)
+
+    def _update(self):
+        if self.breakpoints or self.watchpoints or \
+                self.stop_condition is not None:
+            self._attach()
+        elif self.attached:
+            self.emulator.engine = self.engine
+            self.engine = None
+            self.emulator.memory_write_hooks.remove(self._on_memory_write)
+
+    def _on_memory_write(self, address, length):
+        for start, end in self.watchpoints:
+            if address < end and start < address + length:
+                self.watch_hit = (address, length)
+                return
+
+    def interpret(self, count, limit=None):
+        emulator = self.emulator
+        memory = emulator.memory
+        opcode_table = emulator.opcode_table
+        breakpoints = self.breakpoints
+        stop_condition = self.stop_condition
+        executed = 0
+        try:
+            while executed < count:
+                address = emulator.program_counter
+                if address in breakpoints:
+                    stop = (address, emulator.instruction_count + executed)
+                    condition = breakpoints[address]
+                    if stop != self.stopped_at and \
+                            (condition is None or condition(emulator)):
+                        self.stopped_at = stop
+                        raise DebuggerBreak(
+                            'Breakpoint at {:03X}'.format(address))
+                self.watch_hit = None
+                program_code = (memory[address] << 8) | memory[address + 1]
+                program = opcode_table[program_code]
+                if program is None:
+                    raise emulator._program_not_found_error(program_code)
+                program[0](emulator, *program[1])
+                emulator.program_counter = \
+                    (emulator.program_counter + 2) & emulator.address_mask
+                executed += 1
+                if self.watch_hit is not None:
+                    raise DebuggerBreak(
+                        'Watchpoint: {:03X} written by {:03X}'.format(
+                            self.watch_hit[0], address))
+                if stop_condition is not None and stop_condition():
+                    raise DebuggerBreak(
+                        'Stepped to {:03X}'.format(emulator.program_counter))
+        except EmulatorError:
+            emulator.instruction_count += executed
+            raise
+        return executed
+
+
+def parse_number(text):
+    return int(text, 16 if not text.lower().startswith('0x') else 0)
+
+
+class DebuggerShell(cmd.Cmd):
+    """Command line of a Debugger. Numbers are hexadecimal."""
+
+    intro = 'CHIP-8 debugger, type help or ? to list commands.'
+    prompt = '(chip8) '
+
+    def __init__(self, debugger, stdin=None, stdout=None):
+        super().__init__(stdin=stdin, stdout=stdout)
+        if stdin is not None:
+            self.use_rawinput = False
+        self.debugger = debugger
+
+    def print(self, *lines):
+        for line in lines:
+            self.stdout.write(line + '\n')
+
+    def onecmd(self, line):
+        try:
+            return super().onecmd(line)
+        except (ValueError, SyntaxError, IndexError, KeyError) as e:
+            self.print('Error: {}'.format(e))
+        except EmulatorError as e:
+            self.print(str(e))
+        except KeyboardInterrupt:
+            self.print('Interrupted')
+
+    def stopped(self, reason):
+        if reason is not None:
+            self.print(reason)
+        self.print(*format_code(self.debugger.emulator,
+                                self.debugger.emulator.program_counter, 1))
+
+    def do_break(self, arg):
+        """break ADDRESS [if CONDITION] - stop before the instruction at
+        the address, if the condition of V0-VF, I, PC, SP, DT and ST holds,
+        e.g. break 208 if V3 == 5 and I > 0x300"""
+        address, _, expression = arg.partition(' if ')
+        condition = compile_condition(expression) if expression else None
+        self.debugger.add_breakpoint(parse_number(address.strip()),
+                                     condition)
+
+    def do_delete(self, arg):
+        """delete ADDRESS - remove the breakpoint at the address"""
+        self.debugger.remove_breakpoint(parse_number(arg))
+
+    def do_watch(self, arg):
+        """watch START [END] - stop after memory from start up to end,
+        exclusive, is written by Fx33 or Fx55"""
+        numbers = [parse_number(part) for part in arg.split()]
+        self.debugger.add_watchpoint(*numbers[:2])
+
+    def do_unwatch(self, arg):
+        """unwatch START - remove the watchpoints starting at the address"""
+        self.debugger.remove_watchpoint(parse_number(arg))
+
+    def do_info(self, arg):
+        """info - list breakpoints and watchpoints"""
+        for address, condition in sorted(self.debugger.breakpoints.items()):
+            self.print('break {:03X}'.format(address) + (
+                '' if condition is None else ' if ' + condition.expression))
+        for start, end in self.debugger.watchpoints:
+            self.print('watch {:03X} {:03X}'.format(start, end))
+
+    def do_step(self, arg):
+        """step [COUNT] - execute count instructions, one by default"""
+        self.stopped(self.debugger.step(parse_number(arg) if arg else 1))
+
+    def do_next(self, arg):
+        """next - step over a call"""
+        self.stopped(self.debugger.step_over())
+
+    def do_finish(self, arg):
+        """finish - run up to the return from the current subroutine"""
+        self.stopped(self.debugger.run_to_return())
+
+    def do_continue(self, arg):
+        """continue [COUNT] - run count instructions, until stopped by
+        default"""
+        self.stopped(self.debugger.run(parse_number(arg) if arg else None))
+
+    def do_regs(self, arg):
+        """regs - show registers, the stack and the code around PC"""
+        self.print(*format_state(self.debugger.emulator))
+
+    def do_mem(self, arg):
+        """mem ADDRESS [LENGTH] - show memory, 16 bytes by default"""
+        numbers = [parse_number(part) for part in arg.split()]
+        start = numbers[0]
+        end = min(start + (numbers[1] if len(numbers) > 1 else 0x10),
+                  len(self.debugger.emulator.memory))
+        memory = self.debugger.emulator.memory
+        for address in range(start, end, 0x10):
+            self.print('{:03X}  {}'.format(address, ' '.join(
+                '{:02X}'.format(value)
+                for value in memory[address:min(address + 0x10, end)])))
+
+    def do_list(self, arg):
+        """list [ADDRESS [COUNT]] - disassemble, around PC by default"""
+        numbers = [parse_number(part) for part in arg.split()]
+        emulator = self.debugger.emulator
+        address = numbers[0] if numbers else \
+            max(0, emulator.program_counter - 4)
+        count = numbers[1] if len(numbers) > 1 else 8
+        self.print(*format_code(emulator, address, count))
+
+    def do_quit(self, arg):
+        """quit - leave the debugger"""
+        return True
+
+    do_EOF = do_quit
+    do_b = do_break
+    do_s = do_step
+    do_n = do_next
+    do_c = do_continue
+    do_q = do_quit
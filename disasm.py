@@ -0,0 +1,350 @@
+# !/usr/bin/env python3
+from core import CHIP8Core, CHIP8, XOCHIP, MEMORY_SIZE, XO_MEMORY_SIZE, \
+    PROGRAM_START, variant_opcode_table
+
+# Mnemonics of the programs of the opcode tables by handler name,
+# formatted with the decoded operands
+MNEMONICS = {
+    'clear_screen': 'CLS',
+    'return_back': 'RET',
+    'jump': 'JP 0x{0:03X}',
+    'call': 'CALL 0x{0:03X}',
+    'skip_if_eq': 'SE V{0:X}, 0x{1:02X}',
+    'skip_if_not_eq': 'SNE V{0:X}, 0x{1:02X}',
+    'skip_if_regs_eq': 'SE V{0:X}, V{1:X}',
+    'set': 'LD V{0:X}, 0x{1:02X}',
+    'increment': 'ADD V{0:X}, 0x{1:02X}',
+    'set_reg': 'LD V{0:X}, V{1:X}',
+    'set_reg_or': 'OR V{0:X}, V{1:X}',
+    'set_reg_and': 'AND V{0:X}, V{1:X}',
+    'set_reg_xor': 'XOR V{0:X}, V{1:X}',
+    'sum_regs': 'ADD V{0:X}, V{1:X}',
+    'sub_regs': 'SUB V{0:X}, V{1:X}',
+    'rshift_reg': 'SHR V{0:X}',
+    'subn_regs': 'SUBN V{0:X}, V{1:X}',
+    'lshift_reg': 'SHL V{0:X}',
+    'skip_if_regs_not_eq': 'SNE V{0:X}, V{1:X}',
+    'set_i': 'LD I, 0x{0:03X}',
+    'jump_to_v0_sum': 'JP V0, 0x{0:03X}',
+    'set_rand_and': 'RND V{0:X}, 0x{1:02X}',
+    'draw_sprite': 'DRW V{0:X}, V{1:X}, {2}',
+    'skip_if_pressed': 'SKP V{0:X}',
+    'skip_if_not_pressed': 'SKNP V{0:X}',
+    'set_delay_timer_value_to_v': 'LD V{0:X}, DT',
+    'wait_and_set_pressed_key': 'LD V{0:X}, K',
+    'set_delay_timer': 'LD DT, V{0:X}',
+    'set_sound_timer': 'LD ST, V{0:X}',
+    'add_vx_to_i': 'ADD I, V{0:X}',
+    'set_i_to_digit_sprite': 'LD F, V{0:X}',
+    'store_in_i_as_bcd': 'LD B, V{0:X}',
+    'write_v_to_i': 'LD [I], V{0:X}',
+    'read_v_from_i': 'LD V{0:X}, [I]',
+    'scroll_down': 'SCD {0}',
+    'scroll_up': 'SCU {0}',
+    'scroll_right': 'SCR',
+    'scroll_left': 'SCL',
+    'exit_interpreter': 'EXIT',
+    'set_lores': 'LOW',
+    'set_hires': 'HIGH',
+    'draw_extended_sprite': 'DRW V{0:X}, V{1:X}, {2}',
+    'set_i_to_big_digit_sprite': 'LD HF, V{0:X}',
+    'write_v_to_flags': 'LD R, V{0:X}',
+    'read_v_from_flags': 'LD V{0:X}, R',
+    'write_v_range_to_i': 'SAVE V{0:X} - V{1:X}',
+    'read_v_range_from_i': 'LOAD V{0:X} - V{1:X}',
+    'set_i_long': 'LD I, LONG',
+    'select_planes': 'PLANE {0}',
+    'load_audio_pattern': 'AUDIO',
+    'set_pitch': 'PITCH V{0:X}',
+    'long_skip_if_eq': 'SE V{0:X}, 0x{1:02X}',
+    'long_skip_if_not_eq': 'SNE V{0:X}, 0x{1:02X}',
+    'long_skip_if_regs_eq': 'SE V{0:X}, V{1:X}',
+    'long_skip_if_regs_not_eq': 'SNE V{0:X}, V{1:X}',
+    'long_skip_if_pressed': 'SKP V{0:X}',
+    'long_skip_if_not_pressed': 'SKNP V{0:X}',
+}
+
+SKIP_PROGRAMS = {'skip_if_eq', 'skip_if_not_eq', 'skip_if_regs_eq',
+                 'skip_if_regs_not_eq', 'skip_if_pressed',
+                 'skip_if_not_pressed', 'long_skip_if_eq',
+                 'long_skip_if_not_eq', 'long_skip_if_regs_eq',
+                 'long_skip_if_regs_not_eq', 'long_skip_if_pressed',
+                 'long_skip_if_not_pressed'}
+# Programs control never goes on from
+END_PROGRAMS = {'return_back', 'exit_interpreter'}
+
+# Programs reading or writing bytes at I, with the number of them given
+# their operands
+DATA_PROGRAMS = {'draw_sprite': lambda x, y, n: n,
+                 'draw_extended_sprite': lambda x, y, n: n or 32,
+                 'store_in_i_as_bcd': lambda x: 3,
+                 'write_v_to_i': lambda x: x + 1,
+                 'read_v_from_i': lambda x: x + 1,
+                 'write_v_range_to_i': lambda x, y: abs(x - y) + 1,
+                 'read_v_range_from_i': lambda x, y: abs(x - y) + 1,
+                 'load_audio_pattern': lambda: 16}
+SPRITE_PROGRAMS = {'draw_sprite', 'draw_extended_sprite'}
+# Programs changing I to a value not known without running the program
+I_CHANGING_PROGRAMS = {'add_vx_to_i', 'set_i_to_digit_sprite',
+                       'set_i_to_big_digit_sprite'}
+
+# Kinds of control flow edges
+FALL_THROUGH = 'fall-through'
+JUMP = 'jump'
+SKIP = 'skip'
+CALL = 'call'
+INDIRECT = 'indirect'
+
+_mnemonics = {}
+
+
+def mnemonic(program_code, variant=CHIP8):
+    """Returns the mnemonic of an opcode, None for an unknown one."""
+    text = _mnemonics.get((variant, program_code), False)
+    if text is False:
+        program = variant_opcode_table(CHIP8Core, variant)[program_code]
+        text = None if program is None else \
+            MNEMONICS[program[0].__name__].format(*program[1])
+        _mnemonics[variant, program_code] = text
+    return text
+
+
+class BasicBlock:
+    def __init__(self, start):
+        self.start = start
+        # Address after the last opcode
+        self.end = start
+        # (address, kind) pairs of the blocks control may go to next
+        self.successors = []
+
+    def __repr__(self):
+        return 'BasicBlock(0x{:03X}, 0x{:03X})'.format(self.start, self.end)
+
+
+class Disassembly:
+    """Control flow of a ROM found by following it from its start.
+
+    Opcodes are decoded through the opcode table of the variant, where the F000
+    nnnn of XO-CHIP takes four bytes and skips step over all of them. Every
+    jump, call, skip and return ends a basic block, and every target of one
+    starts a block. Bnnn jumps to an address only known at run time, nnn is
+    followed as its most likely target, e.g. the start of a jump table.
+    Subroutines are the program start and the targets of calls, each with the
+    blocks reached from it without calls and the subroutines it calls. Bytes
+    read by Dxyn, Fx33, Fx55 and Fx65 at an I set by Annn in the same block are
+    data; bytes never reached as code are unreached.
+    """
+
+    def __init__(self, program, start=PROGRAM_START, variant=CHIP8):
+        self.program = bytes(program)
+        self.start = start
+        self.variant = variant
+        self.opcode_table = variant_opcode_table(CHIP8Core, variant)
+        self.address_mask = (XO_MEMORY_SIZE if variant == XOCHIP
+                             else MEMORY_SIZE) - 1
+        self.end = min(start + len(self.program), MEMORY_SIZE)
+        # Address to opcode of every reached opcode
+        self.opcodes = {}
+        # Reached addresses without a valid opcode or outside the ROM
+        self.invalid = set()
+        self.blocks = {}
+        # Subroutine start to the starts of its blocks and the subroutines
+        # it calls
+        self.subroutines = {}
+        # Address to the kind of data there, 'sprite' or 'data'
+        self.data = {}
+        self._disassemble()
+
+    def opcode_at(self, address):
+        if not self.start <= address < self.end - 1:
+            return None
+        offset = address - self.start
+        return (self.program[offset] << 8) | self.program[offset + 1]
+
+    def _length(self, name):
+        return 4 if name == 'set_i_long' else 2
+
+    def _skip_target(self, address):
+        """Returns where a skip at the address goes when it skips."""
+        if self.variant == XOCHIP and self.opcode_at(address + 2) == 0xF000:
+            return address + 6
+        return address + 4
+
+    def _disassemble(self):
+        leaders = {self.start}
+        pending = [self.start]
+        subroutines = [self.start]
+        opcodes = self.opcodes
+        # Every reached opcode, then the leaders found along the way
+        # split the straight runs into blocks
+        while pending:
+            address = pending.pop()
+            while address not in opcodes and address not in self.invalid:
+                program_code = self.opcode_at(address)
+                program = None if program_code is None else \
+                    self.opcode_table[program_code]
+                if program is None:
+                    self.invalid.add(address)
+                    break
+                opcodes[address] = program_code
+                name, operands = program[0].__name__, program[1]
+                targets = ()
+                if name in ('jump', 'jump_to_v0_sum'):
+                    targets = (operands[0],)
+                elif name == 'call':
+                    targets = (operands[0], address + 2)
+                    subroutines.append(operands[0])
+                elif name in SKIP_PROGRAMS:
+                    targets = (address + 2, self._skip_target(address))
+                elif name not in END_PROGRAMS:
+                    address += self._length(name)
+                    continue
+                leaders.update(targets)
+                pending.extend(targets)
+                break
+
+        for leader in sorted(leaders):
+            if leader in opcodes:
+                self._build_block(leader, leaders)
+        for subroutine in subroutines:
+            if subroutine in self.blocks:
+                self._build_subroutine(subroutine)
+
+    def _build_block(self, start, leaders):
+        block = BasicBlock(start)
+        self.blocks[start] = block
+        i_reg = None
+        address = start
+        while True:
+            program_code = self.opcodes[address]
+            handler, operands = self.opcode_table[program_code]
+            name = handler.__name__
+            skip_target = self._skip_target(address)
+            address += self._length(name)
+            if name == 'set_i':
+                i_reg = operands[0]
+            elif name == 'set_i_long':
+                i_reg = self.opcode_at(address - 2)
+            elif name in I_CHANGING_PROGRAMS:
+                i_reg = None
+            elif name in DATA_PROGRAMS and i_reg is not None:
+                kind = 'sprite' if name in SPRITE_PROGRAMS else 'data'
+                for data_address in range(
+                        i_reg, i_reg + DATA_PROGRAMS[name](*operands)):
+                    self.data.setdefault(data_address & self.address_mask,
+                                         kind)
+
+            if name == 'jump':
+                block.successors.append((operands[0], JUMP))
+            elif name == 'jump_to_v0_sum':
+                block.successors.append((operands[0], INDIRECT))
+            elif name == 'call':
+                block.successors.append((operands[0], CALL))
+                block.successors.append((address, FALL_THROUGH))
+            elif name in SKIP_PROGRAMS:
+                block.successors.append((address, FALL_THROUGH))
+                block.successors.append((skip_target, SKIP))
+            elif name not in END_PROGRAMS:
+                if address in leaders or address not in self.opcodes:
+                    if address in self.opcodes:
+                        block.successors.append((address, FALL_THROUGH))
+                    break
+                continue
+            break
+        block.end = address
+
+    def _build_subroutine(self, start):
+        blocks = set()
+        calls = set()
+        pending = [start]
+        while pending:
+            block = self.blocks.get(pending.pop())
+            if block is None or block.start in blocks:
+                continue
+            blocks.add(block.start)
+            for target, kind in block.successors:
+                if kind == CALL:
+                    calls.add(target)
+                else:
+                    pending.append(target)
+        self.subroutines[start] = (sorted(blocks), sorted(calls))
+
+    def listing(self):
+        """Returns lines of the ROM as assembly, with block and subroutine
+        labels, data bytes drawn as pixels and unreached bytes as DB."""
+        lines = []
+        address = self.start
+        while address < self.end:
+            if address in self.subroutines:
+                if lines:
+                    lines.append('')
+                lines.append('sub_{:03X}:'.format(address))
+            block = self.blocks.get(address)
+            if block is not None:
+                lines.append('  ; block 0x{:03X}-0x{:03X} -> {}'.format(
+                    block.start, block.end - 2, ', '.join(
+                        '0x{:03X} ({})'.format(target, kind)
+                        for target, kind in block.successors) or 'none'))
+            if address in self.opcodes:
+                program_code = self.opcodes[address]
+                value = self.opcode_at(address + 2)
+                if program_code == 0xF000 and self.variant == XOCHIP and \
+                        value is not None:
+                    lines.append('0x{:03X}  F000  LD I, 0x{:04X}'.format(
+                        address, value))
+                    address += 4
+                    continue
+                lines.append('0x{:03X}  {:04X}  {}'.format(
+                    address, program_code,
+                    mnemonic(program_code, self.variant)))
+                address += 2
+                continue
+            value = self.program[address - self.start]
+            kind = self.data.get(address)
+            comment = ''
+            if kind == 'sprite':
+                comment = '  ; ' + '{:08b}'.format(value) \
+                    .replace('0', '.').replace('1', '#')
+            elif address in self.invalid:
+                comment = '  ; invalid opcode'
+            elif kind is None:
+                comment = '  ; unreached'
+            lines.append('0x{:03X}  {:02X}    DB 0x{:02X}{}'.format(
+                address, value, value, comment))
+            address += 1
+        return lines
+
+    def report(self):
+        """Returns the disassembly as a JSON-serializable dict."""
+        return {
+            'start': self.start,
+            'end': self.end,
+            'instructions': [
+                {'address': address, 'opcode': program_code,
+                 'mnemonic': mnemonic(program_code, self.variant)}
+                for address, program_code in sorted(self.opcodes.items())],
+            'invalid': sorted(self.invalid),
+            'blocks': [
+                {'start': block.start, 'end': block.end,
+                 'successors': [{'address': target, 'kind': kind}
+                                for target, kind in block.successors]}
+                for _, block in sorted(self.blocks.items())],
+            'subroutines': [
+                {'start': start, 'blocks': blocks, 'calls': calls}
+                for start, (blocks, calls)
+                in sorted(self.subroutines.items())],
+            'data': self._regions(),
+        }
+
+    def _regions(self):
+        """Returns runs of data of one kind as start, end and kind dicts."""
+        regions = []
+        for address in sorted(self.data):
+            kind = self.data[address]
+            if regions and regions[-1]['end'] == address and \
+                    regions[-1]['kind'] == kind:
+                regions[-1]['end'] += 1
+            else:
+                regions.append({'start': address, 'end': address + 1,
+                                'kind': kind})
+        return regions
@@ -1,18 +1,17 @@
 # !/usr/bin/env python3
-import random
-from multiprocessing import Value, Process
-
+import signal
+import sys
+import threading
 import time
+from multiprocessing import Value, Process
 
-import font
+import audio
+import replay
+import rewind
+import scheduler
 import timer
-
-SCREEN_WIDTH = 64
-SCREEN_HEIGHT = 32
-
-PROGRAM_START = 0x200
-V_MAX = 0xFF
-I_MAX = 0xFFFF
+from core import CHIP8Core, SCREEN_WIDTH, SCREEN_HEIGHT, PROGRAM_START, \
+    V_MAX, CHIP8, VARIANTS, EmulatorError, OpCodeNotFoundError
 
 
 class EmulatorProcess(Process):
@@ -20,461 +19,384 @@ class EmulatorProcess(Process):
         self.emulator.on_terminate()
         super().terminate()
 
-    def __init__(self, pixels_state, key_press_event, key_press_value,
-                 key_down_values, close_event,
-                 use_delay=True, use_sound=True, program=None, *args,
-                 **kwargs):
+    def __init__(self, pixels_state, keypad, close_event,
+                 use_delay=True, use_sound=True, program=None,
+                 use_block_cache=False, instructions_per_frame=None,
+                 target_ips=None, frame_policy=scheduler.CATCH_UP,
+                 rewind_event=None, rewind_seconds=None, seed=None,
+                 record_path=None, beep_path=None, skip_idle_loops=False,
+                 trace_path=None, variant=CHIP8, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.emulator = CHIP8Emulator(pixels_state,
-                                      key_press_event,
-                                      key_press_value,
-                                      key_down_values,
+                                      keypad,
                                       close_event,
                                       use_delay,
-                                      use_sound)
+                                      use_sound,
+                                      use_block_cache,
+                                      instructions_per_frame,
+                                      target_ips,
+                                      frame_policy,
+                                      rewind_event,
+                                      rewind_seconds,
+                                      seed,
+                                      beep_path,
+                                      skip_idle_loops,
+                                      start_timers=False,
+                                      variant=variant)
         self.use_sound = use_sound
         self.program = program
+        self.record_path = record_path
+        self.trace_path = trace_path
 
     def join(self, timeout=None):
-        self.emulator.delay_timer.stopped.set()
-        self.emulator.delay_timer.join(timeout)
-
-        if self.use_sound and \
-                self.emulator.sound_timer is not None and\
-                self.emulator.sound_timer.is_alive():
-            self.emulator.sound_timer.stopped.set()
-            self.emulator.sound_timer.join(timeout)
+        if self.emulator.delay_timer is not None:
+            self.emulator.delay_timer.stopped.set()
+            self.emulator.delay_timer.join(timeout)
 
         super().join(timeout)
 
     def run(self):
+        # Timer processes started here have to be stopped here as well
+        signal.signal(signal.SIGTERM, self._on_sigterm)
         self.emulator.load_program(self.program)
+        if self.record_path is not None:
+            self.emulator.input_recorder = replay.InputRecorder(
+                self.record_path, self.program, self.emulator.seed,
+                self.emulator.instructions_per_frame)
+        if self.trace_path is not None:
+            import tracer
+            self.emulator.trace_recorder = tracer.TraceRecorder(
+                self.emulator, self.trace_path)
+            self.emulator.trace_recorder.enable()
+        self.emulator.start_timer_processes()
         try:
             self.emulator.execute()
         except EmulatorError as e:
+            import debugger
             print(str(e))
-
-
-def hex_and_dec(value):
-    return hex(value) + ' (' + str(value) + ')'
+            for line in debugger.format_state(self.emulator):
+                print(line)
+        finally:
+            if self.emulator.trace_recorder is not None:
+                self.emulator.trace_recorder.close()
+
+    def _on_sigterm(self, signum, frame):
+        # The trace recorder may be running below, it is closed by run
+        # once SystemExit has unwound it
+        self.emulator.on_terminate()
+        sys.exit(0)
 
 
 # noinspection SpellCheckingInspection
-class CHIP8Emulator:
-    def __init__(self, pixels_state, key_press_event, key_press_value,
-                 key_down_values, close_event, use_delay=True, use_sound=True):
-        self.memory = bytearray(4096)
+class CHIP8Emulator(CHIP8Core):
+    """CHIP8Core bound to the state shared with CHIP8QScreen: changed
+    rows of every plane are published to pixels_state, a SharedFramebuffer,
+    and keys are read from keypad, a SharedKeypad."""
+
+    def __init__(self, pixels_state, keypad, close_event, use_delay=True,
+                 use_sound=True,
+                 use_block_cache=False, instructions_per_frame=None,
+                 target_ips=None, frame_policy=scheduler.CATCH_UP,
+                 rewind_event=None, rewind_seconds=None, seed=None,
+                 beep_path=None, skip_idle_loops=False, start_timers=True,
+                 variant=CHIP8):
+        # A frame of the scheduler is a frame of CHIP8Core as well
+        frame_length = instructions_per_frame
+        if target_ips is not None:
+            frame_length = scheduler.frame_instructions(target_ips)
+            if instructions_per_frame not in (None, frame_length):
+                raise ValueError('{} instructions per second are {} per '
+                                 'frame, not {}'.format(
+                                     target_ips, frame_length,
+                                     instructions_per_frame))
+        if frame_length is None:
+            super().__init__(use_block_cache=use_block_cache, seed=seed,
+                             skip_idle_loops=skip_idle_loops,
+                             variant=variant)
+        else:
+            super().__init__(frame_length, use_block_cache, seed,
+                             skip_idle_loops, variant)
 
         self.use_delay = use_delay
         self.use_sound = use_sound
         self.close_event = close_event
-
-        for i in range(16):
-            self.memory[5 * i:5 * (i + 1)] = font.FONT[i]
-
-        self.v_reg = [0] * 16
-        self.i_reg = 0
-        self.program_counter = 0
-        self.stack_pointer = 0
-        self.stack = [0] * 16
-
-        self.delay_timer_value = Value('i', 0)
-        self.delay_timer = timer.TimerProcess(1 / 60, self.delay_timer_value)
-        self.delay_timer.start()
-
-        self.sound_timer_value = Value('i', 0)
+        self.target_ips = target_ips
+        self.frame_policy = frame_policy
+
+        # Real time timers are counted down 60 times a second by a timer
+        # process and a thread, otherwise by CHIP8Core every frame. They
+        # start now unless start_timers is false, then the process that
+        # runs the emulator calls start_timer_processes.
+        self.real_time_timers = instructions_per_frame is None
+        self.delay_timer = None
         self.sound_timer = None
-        if use_sound:
-            try:
-                import sound_timer
-                self.sound_timer = sound_timer\
-                    .BeepTimerProcess(1 / 60, self.sound_timer_value)
-            except Exception as e:
-                print("Unexpected error during beeps init: \n\t"+str(e))
-                print("Beeps has been disabled.")
-                self.use_sound = False
-            else:
-                self.sound_timer.start()
+        self.sound_timer_lock = threading.Lock()
+        self.sound_timer_stopped = threading.Event()
+        # Beeps go to the sound device, or to a WAV file at beep_path
+        self.beep_path = beep_path
+        self.beeper = None
+        self.beeper_loader = None
+        if self.real_time_timers:
+            self.delay_timer_value = Value('i', 0)
+            if start_timers:
+                self.start_timer_processes()
 
         self.pixels_state = pixels_state
-        self.key_press_event = key_press_event
-        self.key_press_value = key_press_value
-        self.key_down_values = key_down_values
-
-        self.screen = list()
-        for i in range(SCREEN_WIDTH):
-            column = list()
-            for n in range(SCREEN_WIDTH):
-                column.append(False)
-            self.screen.append(column)
-
-    def load_program(self, program_bytes):
-        self.memory[
-        PROGRAM_START:PROGRAM_START + len(program_bytes)] = program_bytes
+        self.keypad = keypad
+        # Without delay keys are received at most 60 times a second
+        self.next_keys_time = 0
+
+        # Records every executed instruction, see tracer.TraceRecorder
+        self.trace_recorder = None
+
+        # The state of every frame is kept for rewind_seconds, while
+        # rewind_event is set frames are stepped back instead of run
+        self.rewind_event = rewind_event
+        self.rewind_buffer = None
+        if rewind_seconds is not None:
+            self.rewind_buffer = rewind.RewindBuffer(rewind_seconds)
+
+    def start_timer_processes(self):
+        if self.real_time_timers and self.delay_timer is None:
+            self.delay_timer = timer.TimerProcess(1 / 60,
+                                                  self.delay_timer_value)
+            self.delay_timer.start()
+        if self.real_time_timers and self.sound_timer is None:
+            self.sound_timer = threading.Thread(target=self._count_sound_timer,
+                                                daemon=True)
+            self.sound_timer.start()
+
+    # Renders a frame of beeps per tick, so that they last as long however
+    # fast instructions run
+    def _count_sound_timer(self):
+        frame_time = 1 / scheduler.FRAME_RATE
+        deadline = time.perf_counter()
+        while True:
+            deadline += frame_time
+            now = time.perf_counter()
+            if now - deadline >= frame_time * scheduler.MAX_CATCH_UP_FRAMES:
+                deadline = now
+            if self.sound_timer_stopped.wait(max(0, deadline - now)):
+                return
+            with self.sound_timer_lock:
+                if self.sound_timer_value > 0:
+                    self.sound_timer_value -= 1
+                beeping = self.sound_timer_value > 0
+            # This thread runs in the background already
+            if self.use_sound and self.beeper is None:
+                self._open_beeper()
+            if self.beeper is not None:
+                self.beeper.frame(beeping)
+
+    def _open_beeper(self):
+        try:
+            if self.beep_path is not None:
+                sink = audio.WavSink(self.beep_path)
+            else:
+                sink = audio.DeviceSink()
+        except Exception as e:
+            print("Unexpected error during beeps init: \n\t"+str(e))
+            print("Beeps has been disabled.")
+            self.use_sound = False
+            return
+        self.beeper = audio.Beeper(sink)
+
+    def load_state(self, state):
+        super().load_state(state)
+        self._publish_screen()
+
+    def _publish_screen(self):
+        self.pixels_state.publish_rows(range(self.screen_height),
+                                       self.planes, self.screen_width)
+
+    def _timer_values(self):
+        if not self.real_time_timers:
+            return super()._timer_values()
+        return self.delay_timer_value.value, self.sound_timer_value
+
+    def _set_timer_values(self, delay_timer_value, sound_timer_value):
+        if not self.real_time_timers:
+            return super()._set_timer_values(delay_timer_value,
+                                             sound_timer_value)
+        self.delay_timer_value.value = delay_timer_value
+        with self.sound_timer_lock:
+            self.sound_timer_value = sound_timer_value
 
     def execute(self):
+        if not self.use_delay:
+            super().execute()
         self.program_counter = PROGRAM_START
-        while True:
-            program_code = (self.memory[self.program_counter] << 8) | \
-                           self.memory[self.program_counter + 1]
-            try:
-                self.execute_program(program_code)
-            except OpCodeNotFoundError:
-                readable_code = hex(program_code)[2:].zfill(4).upper()
-                error_message = ("Error at memory position {0} "
-                                 "({1} bytes from program start): "
-                                 "Not found program matching " +
-                                 readable_code).format(
-                    hex_and_dec(self.program_counter),
-                    hex_and_dec(self.program_counter - PROGRAM_START))
-                self.close_event.set()
-                raise OpCodeNotFoundError(error_message)
-            if self.use_delay:
-                time.sleep(0.001)
-
-    def execute_program(self, program_code, first_hex=None):
-        if first_hex is None:
-            first_hex = (program_code >> 12) & 0xf
-
-        if not self.programs_by_first_digit[first_hex](self, program_code):
-            raise OpCodeNotFoundError(
-                'Not found program matching ' + hex(program_code)[2:].upper())
-        self.program_counter = (self.program_counter + 2) & 0xFFF
+        scheduler.FrameScheduler(self, self.target_ips,
+                                 self.frame_policy).run()
+
+    def run(self, instructions):
+        if self.rewind_buffer is not None and self.rewind_event is not None \
+                and self.rewind_event.is_set():
+            state = self.rewind_buffer.pop()
+            if state is not None:
+                self.load_state(state)
+            return
+        super().run(instructions)
+
+    def _program_not_found_error(self, program_code):
+        self.close_event.set()
+        return super()._program_not_found_error(program_code)
+
+    def _stack_error(self, problem):
+        self.close_event.set()
+        return super()._stack_error(problem)
+
+    def on_idle(self):
+        # Paced frames sleep anyway, and frame-counted timers only change
+        # by running. Real time ones tick in another process, so without
+        # delay the process sleeps until a tick or a key event.
+        if self.real_time_timers and not self.use_delay:
+            self.keypad.wait(1 / scheduler.FRAME_RATE)
+
+    def tick_timers(self):
+        # Real time timers are counted down by the timer process and thread
+        if not self.real_time_timers:
+            # Opened in the background so that it never delays startup
+            if self.use_sound and self.beeper_loader is None:
+                self.beeper_loader = threading.Thread(
+                    target=self._open_beeper, daemon=True)
+                self.beeper_loader.start()
+            super().tick_timers()
+            if self.beeper is not None:
+                self.beeper.frame(self.sound_timer_value > 0)
+        if self.rewind_buffer is not None:
+            self.rewind_buffer.push(self.save_state())
+        if not self.use_delay and self.input_recorder is None:
+            # Unpaced frames are a few instructions long, polling the
+            # keypad on each of them would slow everything down. Recorded
+            # keys are still received on frames, as replay.replay does.
+            now = time.perf_counter()
+            if now < self.next_keys_time:
+                return
+            self.next_keys_time = now + 1 / scheduler.FRAME_RATE
+        self._receive_keys()
+
+    def _receive_keys(self, timeout=0):
+        """Presses and releases the keys of the events sent by the screen,
+        returns whether there were any."""
+        events = self.keypad.events(timeout)
+        for key, pressed in events:
+            if pressed:
+                self.press_key(key)
+            else:
+                self.release_key(key)
+        return bool(events)
 
     # 00E0
     def clear_screen(self):
-        for x in range(SCREEN_WIDTH):
-            for y in range(SCREEN_HEIGHT):
-                if self.screen[x][y]:
-                    self._switch_pixel(x, y)
-
-    def _switch_pixel(self, x, y):
-        while x < 0:
-            x += SCREEN_WIDTH
-        while x >= SCREEN_WIDTH:
-            x -= SCREEN_WIDTH
-        while y < 0:
-            y += SCREEN_HEIGHT
-        while y >= SCREEN_HEIGHT:
-            y -= SCREEN_HEIGHT
-
-        old_val = self.screen[x][y]
-        self.pixels_state[x + SCREEN_WIDTH * y] = \
-            self.screen[x][y] = not old_val
-        return old_val
-
-    # 00EE
-    def return_back(self):
-        self.stack_pointer -= 1
-        self.program_counter = self.stack[self.stack_pointer]
-
-    programs_0 = {0x00E0: clear_screen, 0x00EE: return_back}
-
-    def execute_program_0(self, program_code):
-        if program_code in self.programs_0:
-            self.programs_0[program_code](self)
-            return True
-        return False
-
-    # 1nnn
-    def jump(self, location):
-        self.program_counter = location - 2
-
-    def execute_program_1(self, program_code):
-        self.jump(program_code & 0xFFF)
-        return True
-
-    # 2nnn
-    def call(self, location):
-        self.stack[self.stack_pointer] = self.program_counter
-        self.stack_pointer += 1
-        self.program_counter = location - 2
-
-    def execute_program_2(self, program_code):
-        self.call(program_code & 0xFFF)
-        return True
-
-    # 3xkk
-    def skip_if_eq(self, reg_num, comparing_value):
-        if self.v_reg[reg_num] == comparing_value:
-            self.program_counter += 2
+        super().clear_screen()
+        self._publish_screen()
 
-    def execute_program_3(self, program_code):
-        self.skip_if_eq((program_code & 0xF00) >> 8, program_code & 0xFF)
-        return True
-
-    # 4xkk
-    def skip_if_not_eq(self, reg_num, comparing_value):
-        if self.v_reg[reg_num] != comparing_value:
-            self.program_counter += 2
-
-    def execute_program_4(self, program_code):
-        self.skip_if_not_eq((program_code & 0xF00) >> 8, program_code & 0xFF)
-        return True
-
-    # 5xy0
-    def skip_if_regs_eq(self, reg_num_1, reg_num_2):
-        if self.v_reg[reg_num_1] == self.v_reg[reg_num_2]:
-            self.program_counter += 2
-
-    def execute_program_5(self, program_code):
-        if program_code & 0xF != 0:
-            return False
-        self.skip_if_regs_eq((program_code & 0xF00) >> 8,
-                             (program_code & 0x0F0) >> 4)
-        return True
-
-    # 6xkk
-    def set(self, reg_num, value):
-        self.v_reg[reg_num] = value
-
-    def execute_program_6(self, program_code):
-        self.set((program_code & 0xF00) >> 8, program_code & 0xFF)
-        return True
-
-    # 7xkk
-    def increment(self, reg_num, value):
-        self.v_reg[reg_num] = (self.v_reg[reg_num] + value) & V_MAX
-
-    def execute_program_7(self, program_code):
-        self.increment((program_code & 0xF00) >> 8, program_code & 0xFF)
-        return True
-
-    # 8xy0
-    def set_reg(self, reg_num_1, reg_num_2):
-        self.v_reg[reg_num_1] = self.v_reg[reg_num_2]
-
-    # 8xy1
-    def set_reg_or(self, reg_num_1, reg_num_2):
-        self.v_reg[reg_num_1] = self.v_reg[reg_num_1] | self.v_reg[reg_num_2]
-
-    # 8xy2
-    def set_reg_and(self, reg_num_1, reg_num_2):
-        self.v_reg[reg_num_1] = self.v_reg[reg_num_1] & self.v_reg[reg_num_2]
-
-    # 8xy3
-    def set_reg_xor(self, reg_num_1, reg_num_2):
-        self.v_reg[reg_num_1] = self.v_reg[reg_num_1] ^ self.v_reg[reg_num_2]
-
-    # 8xy4
-    def sum_regs(self, reg_num_1, reg_num_2):
-        result = self.v_reg[reg_num_1] + self.v_reg[reg_num_2]
-        self.v_reg[0xF] = int(result & (V_MAX + 1) > 0)
-        self.v_reg[reg_num_1] = result & V_MAX
-
-    # 8xy5
-    def sub_regs(self, reg_num_1, reg_num_2):
-        result = self.v_reg[reg_num_1] - self.v_reg[reg_num_2]
-        self.v_reg[0xF] = int(result >= 0)
-        if result < 0:
-            result += V_MAX + 1
-        self.v_reg[reg_num_1] = result
-
-    # 8xy6
-    def rshift_reg(self, reg_num_1, reg_num_2):
-        self.v_reg[0xF] = self.v_reg[reg_num_1] & 1
-        self.v_reg[reg_num_1] = self.v_reg[reg_num_1] >> 1
-
-    # 8xy7
-    def subn_regs(self, reg_num_1, reg_num_2):
-        result = self.v_reg[reg_num_2] - self.v_reg[reg_num_1]
-        self.v_reg[0xF] = int(result >= 0)
-        if result < 0:
-            result += V_MAX + 1
-        self.v_reg[reg_num_1] = result
-
-    # 8xyE
-    def lshift_reg(self, reg_num_1, reg_num_2):
-        self.v_reg[0xF] = int((self.v_reg[reg_num_1] & 0b10000000) != 0)
-        self.v_reg[reg_num_1] = (self.v_reg[reg_num_1] << 1) & V_MAX
-
-    programs_8 = {0: set_reg, 1: set_reg_or, 2: set_reg_and, 3: set_reg_xor,
-                  4: sum_regs, 5: sub_regs, 6: rshift_reg, 7: subn_regs,
-                  0xE: lshift_reg}
-
-    def execute_program_8(self, program_code):
-        last_digit = program_code & 0xF
-        if last_digit in self.programs_8:
-            reg_num_1 = (program_code & 0xF00) >> 8
-            reg_num_2 = (program_code & 0x0F0) >> 4
-            self.programs_8[last_digit](self, reg_num_1, reg_num_2)
-            return True
-        return False
-
-    # 9xy0
-    def skip_if_regs_not_eq(self, reg_num_1, reg_num_2):
-        if self.v_reg[reg_num_1] != self.v_reg[reg_num_2]:
-            self.program_counter += 2
-
-    def execute_program_9(self, program_code):
-        if program_code & 0xF != 0:
-            return False
-        self.skip_if_regs_not_eq((program_code & 0xF00) >> 8,
-                                 (program_code & 0x0F0) >> 4)
-        return True
-
-    # Annn
-    def set_i(self, value):
-        self.i_reg = value
-
-    def execute_program_a(self, program_code):
-        self.set_i(program_code & 0xFFF)
-        return True
-
-    # Bnnn
-    def jump_to_v0_sum(self, value):
-        self.program_counter = value + self.v_reg[0] - 2
-
-    def execute_program_b(self, program_code):
-        self.jump_to_v0_sum(program_code & 0xFFF)
-        return True
-
-    # Cxkk
-    def set_rand_and(self, reg_num, value):
-        self.v_reg[reg_num] = random.randint(0, 255) & value
-
-    def execute_program_c(self, program_code):
-        self.set_rand_and((program_code & 0xF00) >> 8,
-                          program_code & 0x0FF)
-        return True
+    def set_pixel(self, x, y, value):
+        super().set_pixel(x, y, value)
+        self.pixels_state.publish_rows((y,), self.planes, self.screen_width)
 
     # Dxyn
     def draw_sprite(self, vx, vy, sprite_height):
-        x = self.v_reg[vx]
         y = self.v_reg[vy]
-        collision = False
-        for i in range(sprite_height):
-            line = self.memory[(self.i_reg + i) & 0xFFF]
-            dx = 7
-            while dx >= 0:
-                if line & 1:
-                    collision = self._switch_pixel(x + dx, y + i) or collision
-                line = line >> 1
-                dx -= 1
-        self.v_reg[0xf] = int(collision)
-
-    def execute_program_d(self, program_code):
-        self.draw_sprite((program_code & 0xF00) >> 8,
-                         (program_code & 0x0F0) >> 4,
-                         program_code & 0x00F)
-        return True
-
+        super().draw_sprite(vx, vy, sprite_height)
+        self.pixels_state.publish_rows(
+            [(y + i) % SCREEN_HEIGHT
+             for i in range(min(sprite_height, SCREEN_HEIGHT))],
+            self.planes)
+
+    # 00Cn
+    def scroll_down(self, rows):
+        super().scroll_down(rows)
+        self._publish_screen()
+
+    # 00Dn
+    def scroll_up(self, rows):
+        super().scroll_up(rows)
+        self._publish_screen()
+
+    # 00FB
+    def scroll_right(self):
+        super().scroll_right()
+        self._publish_screen()
+
+    # 00FC
+    def scroll_left(self):
+        super().scroll_left()
+        self._publish_screen()
+
+    def _set_resolution(self, hires):
+        super()._set_resolution(hires)
+        self._publish_screen()
+
+    # Dxyn of SUPER-CHIP and XO-CHIP
+    def draw_extended_sprite(self, vx, vy, sprite_height):
+        height = self.screen_height
+        y = self.v_reg[vy] % height
+        super().draw_extended_sprite(vx, vy, sprite_height)
+        self.pixels_state.publish_rows(
+            [(y + i) % height
+             for i in range(min(sprite_height or 16, height))],
+            self.planes, self.screen_width)
+
+    # Ex9E and ExA1 test the shared key state, but recorded keys have to
+    # be tested as they are replayed
     # Ex9E
     def skip_if_pressed(self, reg_num):
-        key = self.v_reg[reg_num]
-        if self.key_down_values[key].value:
+        if self.input_recorder is not None:
+            return super().skip_if_pressed(reg_num)
+        if self.keypad.state.value >> self.v_reg[reg_num] & 1:
             self.program_counter += 2
 
     # ExA1
     def skip_if_not_pressed(self, reg_num):
-        key = self.v_reg[reg_num]
-        if not self.key_down_values[key].value:
+        if self.input_recorder is not None:
+            return super().skip_if_not_pressed(reg_num)
+        if not self.keypad.state.value >> self.v_reg[reg_num] & 1:
             self.program_counter += 2
 
-    programs_e = {0x9E: skip_if_pressed, 0xA1: skip_if_not_pressed}
-
-    def execute_program_e(self, program_code):
-        last_two_digits = program_code & 0xFF
-        if last_two_digits in self.programs_e:
-            self.programs_e[last_two_digits](self, (program_code & 0xF00) >> 8)
-            return True
-        return False
-
     # Fx07
     def set_delay_timer_value_to_v(self, reg_num):
+        if not self.real_time_timers:
+            return super().set_delay_timer_value_to_v(reg_num)
         with self.delay_timer_value.get_lock():
             self.v_reg[reg_num] = self.delay_timer_value.value & V_MAX
 
     # Fx0A
     def wait_and_set_pressed_key(self, reg_num):
-        self.key_press_event.clear()
-        self.key_press_event.wait()
-        self.v_reg[reg_num] = self.key_press_value.value & V_MAX
+        if self.input_recorder is None:
+            if not self.waiting_for_key:
+                # Only keys pressed from now on are waited for
+                self._receive_keys()
+                self.waiting_for_key = True
+                self.pressed_key = None
+            # Without frames to count there is nothing to do but block
+            timeout = None if self.real_time_timers else 0
+            while self.pressed_key is None and self._receive_keys(timeout):
+                pass
+        return super().wait_and_set_pressed_key(reg_num)
 
     # Fx15
     def set_delay_timer(self, reg_num):
+        if not self.real_time_timers:
+            return super().set_delay_timer(reg_num)
         with self.delay_timer_value.get_lock():
             self.delay_timer_value.value = self.v_reg[reg_num]
 
     # Fx18
     def set_sound_timer(self, reg_num):
-        if self.v_reg[reg_num] != 1:
-            with self.sound_timer_value.get_lock():
-                self.sound_timer_value.value = self.v_reg[reg_num]
-
-    # Fx1E
-    def add_vx_to_i(self, reg_num):
-        new_i = self.i_reg + self.v_reg[reg_num]
-        self.i_reg = new_i & I_MAX
-        self.v_reg[0xf] = int((new_i & (I_MAX + 1)) > 0)
-
-    # Fx29
-    def set_i_to_digit_sprite(self, reg_num):
-        self.i_reg = self.v_reg[reg_num] * 5
-
-    # Fx33
-    def store_in_i_as_bcd(self, reg_num):
-        value = self.v_reg[reg_num]
-        hundreds = value % 1000 // 100
-        tens = value % 100 // 10
-        ones = value % 10
-        self.memory[self.i_reg] = hundreds
-        self.memory[self.i_reg + 1] = tens
-        self.memory[self.i_reg + 2] = ones
-
-    # Fx55
-    def write_v_to_i(self, reg_end_num):
-        for i in range(reg_end_num + 1):
-            self.memory[(self.i_reg + i) & 0xFFF] = self.v_reg[i]
-
-    # Fx65
-    def read_v_from_i(self, reg_end_num):
-        for i in range(reg_end_num + 1):
-            self.v_reg[i] = self.memory[(self.i_reg + i) & 0xFFF]
-
-    programs_f = {0x07: set_delay_timer_value_to_v,
-                  0x0A: wait_and_set_pressed_key,
-                  0x15: set_delay_timer,
-                  0x18: set_sound_timer,
-                  0x1E: add_vx_to_i,
-                  0x29: set_i_to_digit_sprite,
-                  0x33: store_in_i_as_bcd,
-                  0x55: write_v_to_i,
-                  0x65: read_v_from_i}
-
-    def execute_program_f(self, program_code):
-        last_two_digits = program_code & 0xFF
-        if last_two_digits in self.programs_f:
-            self.programs_f[last_two_digits](self, (program_code & 0xF00) >> 8)
-            return True
-        return False
-
-    programs_by_first_digit = [execute_program_0,
-                               execute_program_1,
-                               execute_program_2,
-                               execute_program_3,
-                               execute_program_4,
-                               execute_program_5,
-                               execute_program_6,
-                               execute_program_7,
-                               execute_program_8,
-                               execute_program_9,
-                               execute_program_a,
-                               execute_program_b,
-                               execute_program_c,
-                               execute_program_d,
-                               execute_program_e,
-                               execute_program_f]
+        if not self.real_time_timers:
+            return super().set_sound_timer(reg_num)
+        with self.sound_timer_lock:
+            super().set_sound_timer(reg_num)
 
     def on_terminate(self):
-        self.delay_timer.terminate()
-        if self.use_sound:
-            self.sound_timer.terminate()
-
-
-class EmulatorError(Exception):
-    pass
-
-
-class OpCodeNotFoundError(EmulatorError):
-    pass
+        if self.delay_timer is not None:
+            self.delay_timer.terminate()
+        if self.sound_timer is not None:
+            self.sound_timer_stopped.set()
+            if self.sound_timer is not threading.current_thread():
+                self.sound_timer.join()
+        if self.beeper is not None:
+            self.beeper.close()
+            self.beeper = None
@@ -0,0 +1,227 @@
+# !/usr/bin/env python3
+import os
+from multiprocessing import Pipe, Process
+from multiprocessing.sharedctypes import RawArray
+
+import numpy as np
+
+from core import CHIP8Core, EmulatorError, SCREEN_HEIGHT, \
+    INSTRUCTIONS_PER_FRAME
+from shared_framebuffer import ROW_BYTES
+
+KEYS = 16
+# The action that presses no key, actions below it press that key
+NO_KEY = KEYS
+ACTIONS = KEYS + 1
+OBSERVATION_SIZE = ROW_BYTES * SCREEN_HEIGHT
+
+
+def ram_score(address, length=1):
+    """Returns a score hook reading a big-endian number from the memory."""
+    def score(core):
+        return int.from_bytes(core.memory[address:address + length], 'big')
+    return score
+
+
+def bcd_score(address, digits=3):
+    """Returns a score hook reading decimal digits stored one per byte,
+    as Fx33 stores them."""
+    def score(core):
+        value = 0
+        for digit in core.memory[address:address + digits]:
+            value = value * 10 + digit
+        return value
+    return score
+
+
+def ram_equals(address, value):
+    """Returns a done hook checking a byte of the memory."""
+    def done(core):
+        return core.memory[address] == value
+    return done
+
+
+class CHIP8Env:
+    """Gym-style environment running a program on CHIP8Core.
+
+    An action holds one key, or no key for NO_KEY, for frame_skip frames.
+    The reward of a step is the change of score(core), the episode is done
+    when done(core) is true, after max_frames frames or on an emulator
+    error. Observations are packed framebuffer rows, (32, 8) uint8 with
+    the leftmost pixel in the highest bit, or (32, 64) pixels if unpacked.
+    """
+
+    def __init__(self, program, frame_skip=4, score=None, done=None,
+                 max_frames=None,
+                 instructions_per_frame=INSTRUCTIONS_PER_FRAME,
+                 use_block_cache=False, seed=None, unpacked=False):
+        self.program = program
+        self.frame_skip = frame_skip
+        self.score = score
+        self.done = done
+        self.max_frames = max_frames
+        self.instructions_per_frame = instructions_per_frame
+        self.use_block_cache = use_block_cache
+        self.seed = seed
+        self.unpacked = unpacked
+        self.core = None
+        self.last_score = 0
+        self.key = None
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.seed = seed
+        self._reset()
+        return self.observation()
+
+    def step(self, action):
+        reward, done, info = self._advance(action)
+        return self.observation(), reward, done, info
+
+    def observation(self):
+        pixels = np.frombuffer(self.core.framebuffer_bytes(), np.uint8) \
+            .reshape(SCREEN_HEIGHT, ROW_BYTES)
+        return np.unpackbits(pixels, axis=1) if self.unpacked else pixels
+
+    def _reset(self):
+        self.core = CHIP8Core(self.instructions_per_frame,
+                              self.use_block_cache, self.seed)
+        self.core.load_program(self.program)
+        self.last_score = 0 if self.score is None else self.score(self.core)
+        self.key = None
+
+    def _advance(self, action):
+        core = self.core
+        key = None if action == NO_KEY else action
+        if key != self.key:
+            if self.key is not None:
+                core.release_key(self.key)
+            if key is not None:
+                core.press_key(key)
+            self.key = key
+
+        info = {'frame': core.frame_count}
+        try:
+            core.run_frames(self.frame_skip)
+        except EmulatorError as e:
+            info['error'] = str(e)
+        info['frame'] = core.frame_count
+
+        reward = 0
+        if self.score is not None:
+            score = self.score(core)
+            reward = score - self.last_score
+            self.last_score = score
+        done = 'error' in info or \
+            (self.done is not None and bool(self.done(core))) or \
+            (self.max_frames is not None and
+             core.frame_count >= self.max_frames)
+        return reward, done, info
+
+
+class VectorEnv:
+    """Steps many CHIP8Env instances in worker processes.
+
+    Actions, observations, rewards and done flags live in shared memory;
+    observations, rewards and dones are NumPy views of it, so stepping
+    copies nothing between processes. Every worker owns a slice of the
+    environments and only receives a command per step through a pipe.
+    Environments are reset as soon as they are done, the returned
+    observation is then the first one of the new episode.
+    Keyword arguments are passed to every CHIP8Env, so hooks have to be
+    picklable where worker processes are spawned instead of forked.
+    """
+
+    def __init__(self, program, instances, workers=None, **env_kwargs):
+        self.instances = instances
+        workers = min(instances, workers or os.cpu_count() or 1)
+
+        self.shared_actions = RawArray('i', instances)
+        self.shared_observations = RawArray('B', OBSERVATION_SIZE * instances)
+        self.shared_rewards = RawArray('d', instances)
+        self.shared_dones = RawArray('b', instances)
+        self.actions = np.frombuffer(self.shared_actions, np.int32)
+        self.observations = np.frombuffer(
+            self.shared_observations, np.uint8).reshape(
+            instances, SCREEN_HEIGHT, ROW_BYTES)
+        self.rewards = np.frombuffer(self.shared_rewards, np.float64)
+        self.dones = np.frombuffer(self.shared_dones, np.int8).view(bool)
+
+        self.connections = []
+        self.processes = []
+        bounds = np.linspace(0, instances, workers + 1).astype(int)
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            connection, worker_connection = Pipe()
+            process = Process(target=_run_worker, daemon=True,
+                              args=(worker_connection, program,
+                                    int(start), int(end), env_kwargs,
+                                    self.shared_actions,
+                                    self.shared_observations,
+                                    self.shared_rewards,
+                                    self.shared_dones))
+            process.start()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def reset(self):
+        self._command('reset')
+        return self.observations
+
+    def step(self, actions):
+        self.actions[:] = actions
+        self._command('step')
+        return self.observations, self.rewards, self.dones
+
+    def close(self):
+        for connection in self.connections:
+            connection.send('close')
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+    def _command(self, command):
+        for connection in self.connections:
+            connection.send(command)
+        for connection in self.connections:
+            error = connection.recv()
+            if error is not None:
+                raise EmulatorError(error)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _run_worker(connection, program, start, end, env_kwargs, actions,
+                observations, rewards, dones):
+    envs = [CHIP8Env(program, **env_kwargs) for _ in range(start, end)]
+
+    def publish(index, env):
+        observations[OBSERVATION_SIZE * index:
+                     OBSERVATION_SIZE * (index + 1)] = \
+            env.core.framebuffer_bytes()
+
+    while True:
+        command = connection.recv()
+        if command == 'close':
+            break
+        try:
+            for index, env in enumerate(envs, start):
+                if command == 'reset':
+                    env._reset()
+                    rewards[index] = 0
+                    dones[index] = False
+                else:
+                    reward, done, _ = env._advance(actions[index])
+                    rewards[index] = reward
+                    dones[index] = done
+                    if done:
+                        env._reset()
+                publish(index, env)
+        except Exception as e:
+            connection.send('{}: {}'.format(type(e).__name__, e))
+        else:
+            connection.send(None)
@@ -114,3 +114,199 @@ FONT = [
         0b10000000,
     ]
 ]
+
+# 8x10 digits of SUPER-CHIP and XO-CHIP, pointed to by Fx30
+BIG_FONT = [
+    [  # 0
+        0b11111111,
+        0b11111111,
+        0b11000011,
+        0b11000011,
+        0b11000011,
+        0b11000011,
+        0b11000011,
+        0b11000011,
+        0b11111111,
+        0b11111111,
+    ],
+    [  # 1
+        0b00011000,
+        0b01111000,
+        0b01111000,
+        0b00011000,
+        0b00011000,
+        0b00011000,
+        0b00011000,
+        0b00011000,
+        0b11111111,
+        0b11111111,
+    ],
+    [  # 2
+        0b11111111,
+        0b11111111,
+        0b00000011,
+        0b00000011,
+        0b11111111,
+        0b11111111,
+        0b11000000,
+        0b11000000,
+        0b11111111,
+        0b11111111,
+    ],
+    [  # 3
+        0b11111111,
+        0b11111111,
+        0b00000011,
+        0b00000011,
+        0b11111111,
+        0b11111111,
+        0b00000011,
+        0b00000011,
+        0b11111111,
+        0b11111111,
+    ],
+    [  # 4
+        0b11000011,
+        0b11000011,
+        0b11000011,
+        0b11000011,
+        0b11111111,
+        0b11111111,
+        0b00000011,
+        0b00000011,
+        0b00000011,
+        0b00000011,
+    ],
+    [  # 5
+        0b11111111,
+        0b11111111,
+        0b11000000,
+        0b11000000,
+        0b11111111,
+        0b11111111,
+        0b00000011,
+        0b00000011,
+        0b11111111,
+        0b11111111,
+    ],
+    [  # 6
+        0b11111111,
+        0b11111111,
+        0b11000000,
+        0b11000000,
+        0b11111111,
+        0b11111111,
+        0b11000011,
+        0b11000011,
+        0b11111111,
+        0b11111111,
+    ],
+    [  # 7
+        0b11111111,
+        0b11111111,
+        0b00000011,
+        0b00000011,
+        0b00000110,
+        0b00001100,
+        0b00011000,
+        0b00011000,
+        0b00011000,
+        0b00011000,
+    ],
+    [  # 8
+        0b11111111,
+        0b11111111,
+        0b11000011,
+        0b11000011,
+        0b11111111,
+        0b11111111,
+        0b11000011,
+        0b11000011,
+        0b11111111,
+        0b11111111,
+    ],
+    [  # 9
+        0b11111111,
+        0b11111111,
+        0b11000011,
+        0b11000011,
+        0b11111111,
+        0b11111111,
+        0b00000011,
+        0b00000011,
+        0b11111111,
+        0b11111111,
+    ],
+    [  # A
+        0b01111110,
+        0b11111111,
+        0b11000011,
+        0b11000011,
+        0b11000011,
+        0b11111111,
+        0b11111111,
+        0b11000011,
+        0b11000011,
+        0b11000011,
+    ],
+    [  # B
+        0b11111100,
+        0b11111100,
+        0b11000011,
+        0b11000011,
+        0b11111100,
+        0b11111100,
+        0b11000011,
+        0b11000011,
+        0b11111100,
+        0b11111100,
+    ],
+    [  # C
+        0b00111100,
+        0b11111111,
+        0b11000011,
+        0b11000000,
+        0b11000000,
+        0b11000000,
+        0b11000000,
+        0b11000011,
+        0b11111111,
+        0b00111100,
+    ],
+    [  # D
+        0b11111100,
+        0b11111110,
+        0b11000011,
+        0b11000011,
+        0b11000011,
+        0b11000011,
+        0b11000011,
+        0b11000011,
+        0b11111110,
+        0b11111100,
+    ],
+    [  # E
+        0b11111111,
+        0b11111111,
+        0b11000000,
+        0b11000000,
+        0b11111111,
+        0b11111111,
+        0b11000000,
+        0b11000000,
+        0b11111111,
+        0b11111111,
+    ],
+    [  # F
+        0b11111111,
+        0b11111111,
+        0b11000000,
+        0b11000000,
+        0b11111111,
+        0b11111111,
+        0b11000000,
+        0b11000000,
+        0b11000000,
+        0b11000000,
+    ]
+]
@@ -0,0 +1,106 @@
+# !/usr/bin/env python3
+from core import EmulatorError
+
+MAX_LOOP_LENGTH = 8
+
+# Programs that only read timers, keys and registers, or write a register
+# from the delay timer. A loop of them closed by a jump back to its start
+# does the same every iteration until a timer ticks or a key changes.
+IDLE_PROGRAMS = {'set_delay_timer_value_to_v', 'skip_if_eq',
+                 'skip_if_not_eq', 'skip_if_regs_eq', 'skip_if_regs_not_eq',
+                 'skip_if_pressed', 'skip_if_not_pressed', 'long_skip_if_eq',
+                 'long_skip_if_not_eq', 'long_skip_if_regs_eq',
+                 'long_skip_if_regs_not_eq', 'long_skip_if_pressed',
+                 'long_skip_if_not_pressed'}
+
+
+class IdleLoopSkipper:
+    """Fast-forwards loops that spin until a timer tick or a key event.
+
+    An idle loop is a run of IDLE_PROGRAMS ending with a jump back to its
+    first opcode, as polling the delay timer with Fx07, 3xkk and 1nnn, or
+    a single jump to itself. Timers and keys only change between the
+    batches of instructions the core runs, so once an iteration has gone
+    through the whole loop without skipping out of it, every further one
+    within the batch leaves the machine exactly as it is. Those are
+    counted as executed without running them, and the core is told it is
+    idle through on_idle. Anything else runs on the wrapped engine.
+    """
+
+    def __init__(self, emulator, engine):
+        self.emulator = emulator
+        self.engine = engine
+        # Address to the (start, length) of the idle loop holding it,
+        # or None if it is in none
+        self.loops = {}
+        self.skipped = 0
+        emulator.memory_write_hooks.append(self.invalidate)
+
+    def execute(self, count, limit=None):
+        emulator = self.emulator
+        address = emulator.program_counter
+        loop = self.loops.get(address, False)
+        if loop is False:
+            loop = self.loops[address] = self.find_loop(address)
+        if loop is None:
+            return self.engine(count, limit)
+
+        start, length = loop
+        # Get to the start of the loop, then go through it once more to
+        # be sure it does not leave at the current timers and keys
+        warm_up = (start + 2 * length - address) // 2
+        if address != start:
+            warm_up += length
+        last = start + 2 * (length - 1)
+        executed = 0
+        try:
+            while executed < min(warm_up, count):
+                expected = start if address == last else address + 2
+                executed += emulator.interpret(1)
+                address = emulator.program_counter
+                if address != expected:
+                    return executed
+        except EmulatorError:
+            emulator.instruction_count += executed
+            raise
+        skipped = (count - executed) // length * length
+        if skipped:
+            self.skipped += skipped
+            emulator.on_idle()
+        return executed + skipped
+
+    def find_loop(self, address):
+        """Returns the (start, length) of the idle loop the given address
+        is in, None if it is in none."""
+        current = address
+        for _ in range(MAX_LOOP_LENGTH):
+            name, operands = self._decode(current)
+            if name == 'jump':
+                start = operands[0]
+                length = (current - start) // 2 + 1
+                if start > address or (address - start) % 2 or \
+                        length > MAX_LOOP_LENGTH:
+                    return None
+                if all(self._decode(body)[0] in IDLE_PROGRAMS
+                       for body in range(start, address, 2)):
+                    return start, length
+                return None
+            if name not in IDLE_PROGRAMS:
+                return None
+            current += 2
+        return None
+
+    def _decode(self, address):
+        """Returns the name and the operands of the program at the
+        address."""
+        memory = self.emulator.memory
+        if address + 1 >= len(memory):
+            return None, ()
+        program = self.emulator.opcode_table[(memory[address] << 8) |
+                                             memory[address + 1]]
+        if program is None:
+            return None, ()
+        return program[0].__name__, program[1]
+
+    def invalidate(self, address, length):
+        self.loops.clear()
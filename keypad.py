@@ -0,0 +1,60 @@
+# !/usr/bin/env python3
+import os
+from multiprocessing import Pipe
+from multiprocessing.sharedctypes import RawValue
+
+# Set in an event for a press, the low bits hold the key
+PRESSED = 0x10
+
+
+class SharedKeypad:
+    """Keys shared between the screen and the emulator.
+
+    The screen is the single writer of state, a 16-bit word with a bit per
+    pressed key, so no locks are used and testing a key is a single read.
+    Every press and release is also sent through a pipe, in order, for the
+    emulator to wait on and to record. The screen never blocks on the pipe:
+    events the emulator has not drained for too long are dropped, while
+    state stays right.
+    """
+
+    def __init__(self):
+        self.state = RawValue('H', 0)
+        self.receiver, self.sender = Pipe(duplex=False)
+        if os.name == 'posix':
+            # Events are a few bytes, so they are written whole or not at all
+            os.set_blocking(self.sender.fileno(), False)
+
+    def press(self, key):
+        self.state.value |= 1 << key
+        self._send(key | PRESSED)
+
+    def release(self, key):
+        self.state.value &= ~(1 << key)
+        self._send(key)
+
+    def is_pressed(self, key):
+        return bool(self.state.value >> key & 1)
+
+    def wait(self, timeout=None):
+        """Waits up to timeout seconds for an event without receiving it,
+        returns whether there is one."""
+        return self.receiver.poll(timeout)
+
+    def events(self, timeout=0):
+        """Returns the (key, pressed) events sent since the last call,
+        waiting up to timeout seconds, forever for None, for the first."""
+        events = []
+        if self.receiver.poll(timeout):
+            while True:
+                event = self.receiver.recv_bytes()[0]
+                events.append((event & (PRESSED - 1), bool(event & PRESSED)))
+                if not self.receiver.poll():
+                    break
+        return events
+
+    def _send(self, event):
+        try:
+            self.sender.send_bytes(bytes((event,)))
+        except BlockingIOError:
+            pass
@@ -1,27 +1,101 @@
 # !/usr/bin/env python3
+import time
+
+# Startup is timed from here, Qt and audio are imported only when needed
+STARTUP_START = time.perf_counter()
+
 import importlib.util
 import sys
 from argparse import ArgumentParser
 
 import os
-from PyQt5.QtWidgets import QApplication
+import random
 
 import emulator
-from screen import CHIP8QScreen
+import scheduler
 
 PIXEL_DEFAULT_SIDE_SIZE = 15
 
 
+class StartupProfile:
+    """Durations of startup phases, printed with --startup-profile."""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.last_time = STARTUP_START
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last_time))
+        self.last_time = now
+
+    def report(self):
+        if not self.enabled:
+            return
+        for phase, duration in self.phases:
+            print("{:<24} {:8.1f} ms".format(phase, duration * 1000))
+        print("{:<24} {:8.1f} ms".format(
+            "total", (self.last_time - STARTUP_START) * 1000))
+
+
 def main():
-    kivy_installed = is_kivy_installed()
     parsed_args = parse_args()
+    startup_profile = StartupProfile(parsed_args.startup_profile)
+    startup_profile.mark("parse arguments")
 
     use_delay = not parsed_args.no_delay
     use_sound = not parsed_args.no_sound
-    if not kivy_installed and use_sound:
-        print("Warning: kivy not found, switching to no-sound mode")
+    if use_sound and parsed_args.beep_wav is None and \
+            not is_installed("sounddevice"):
+        print("Warning: sounddevice not found, switching to no-sound mode")
         use_sound = False
 
+    instructions_per_frame = parsed_args.instructions_per_frame
+    if instructions_per_frame is not None and instructions_per_frame <= 0:
+        print("Instructions per frame must be positive, got {:d}"
+              .format(instructions_per_frame))
+        return
+
+    if parsed_args.ips is not None and parsed_args.ips <= 0:
+        print("Instructions per second must be positive, got {:d}"
+              .format(parsed_args.ips))
+        return
+
+    if parsed_args.ips is not None and instructions_per_frame is not None:
+        frame_length = scheduler.frame_instructions(parsed_args.ips)
+        if instructions_per_frame != frame_length:
+            print("{:d} instructions per second are {:d} per frame, "
+                  "-f {:d} does not match them"
+                  .format(parsed_args.ips, frame_length,
+                          instructions_per_frame))
+            return
+
+    if parsed_args.rewind is not None:
+        if parsed_args.rewind <= 0:
+            print("Rewind length must be positive, got {:d}"
+                  .format(parsed_args.rewind))
+            return
+        if not use_delay:
+            print("Rewinding needs frames paced 60 times a second, "
+                  "it cannot be used with -d")
+            return
+
+    seed = parsed_args.seed
+    if parsed_args.record is not None:
+        if instructions_per_frame is None:
+            print("Recording needs timers counted by instructions, "
+                  "set them with -f")
+            return
+        if parsed_args.rewind is not None:
+            print("Rewinding while recording cannot be replayed")
+            return
+        if parsed_args.variant != emulator.CHIP8:
+            print("Only CHIP-8 programs can be recorded")
+            return
+        if seed is None:
+            seed = random.getrandbits(32)
+
     pixel_side_size = parsed_args.pixel_size
     if pixel_side_size <= 0:
         print("Pixel size must be positive, got {:d}"
@@ -32,53 +106,84 @@ def main():
         print('Program file "{}" not found.'.format(parsed_args.program_path))
         return
 
-    bg_music = None
     bg_music_path = parsed_args.background_music
-
-    sys.argv = sys.argv[:1]
-
-    with open(parsed_args.program_path, 'rb') as f:
-        program = f.read()
-
     if bg_music_path is not None:
-        if not kivy_installed:
+        if not is_installed("kivy"):
             print("kivy not found, cannot play bg music.")
             return
         if not os.path.isfile(bg_music_path):
             print('File "{}" not found.'.format(bg_music_path))
             return
 
-        try:
-            from kivy.core.audio import SoundLoader
-            bg_music = SoundLoader.load(bg_music_path)
-        except Exception as e:
-            print(str(e))
-            bg_music = None
+    sys.argv = sys.argv[:1]
 
-        if bg_music:
-            bg_music.loop = True
-            bg_music.play()
-        else:
-            print("Unexpected error during music loading.")
-            print("Background music has been disabled.")
+    with open(parsed_args.program_path, 'rb') as f:
+        program = f.read()
+    startup_profile.mark("read program")
+
+    from PyQt5.QtCore import QTimer
+    from PyQt5.QtWidgets import QApplication
+    from screen import CHIP8QScreen
+    startup_profile.mark("import Qt")
 
     app = QApplication(sys.argv[0:1])
     ex = CHIP8QScreen(pixel_side_size)
+    startup_profile.mark("create window")
+
+    def on_first_frame():
+        startup_profile.mark("first frame")
+        startup_profile.report()
+
+    ex.on_first_frame = on_first_frame
     p = emulator.EmulatorProcess(ex.pixels_state,
-                                 ex.pressed_event,
-                                 ex.pressed_key,
-                                 ex.pressed,
+                                 ex.keypad,
                                  ex.close_event,
                                  use_delay,
                                  use_sound,
-                                 program)
+                                 program,
+                                 parsed_args.translate_blocks,
+                                 parsed_args.instructions_per_frame,
+                                 parsed_args.ips,
+                                 parsed_args.frame_policy,
+                                 ex.rewind_event,
+                                 parsed_args.rewind,
+                                 seed,
+                                 parsed_args.record,
+                                 parsed_args.beep_wav,
+                                 parsed_args.skip_idle,
+                                 parsed_args.trace,
+                                 parsed_args.variant)
+    # Music is loaded once the event loop runs, after the window is shown
+    bg_music = []
+    if bg_music_path is not None:
+        QTimer.singleShot(0, lambda: bg_music.extend(
+            play_music(bg_music_path)))
     try:
         p.start()
+        startup_profile.mark("start emulator")
         app.exec_()
     finally:
         p.terminate()
-        if bg_music:
-            bg_music.stop()
+        for music in bg_music:
+            music.stop()
+
+
+def play_music(path):
+    """Returns the list of the looped music started, empty on errors."""
+    try:
+        from kivy.core.audio import SoundLoader
+        music = SoundLoader.load(path)
+    except Exception as e:
+        print(str(e))
+        music = None
+
+    if not music:
+        print("Unexpected error during music loading.")
+        print("Background music has been disabled.")
+        return []
+    music.loop = True
+    music.play()
+    return [music]
 
 
 def parse_args():
@@ -89,10 +194,53 @@ def parse_args():
 
     parser.add_argument("-d", "--no-delay",
                         action="store_true",
-                        help="Disable delay between opcodes execution")
+                        help="Run opcodes as fast as possible instead of "
+                             "pacing them by frames")
     parser.add_argument("-s", "--no-sound",
                         action="store_true",
                         help="Disable beeps sound (starts a bit faster)")
+    parser.add_argument("-t", "--translate-blocks",
+                        action="store_true",
+                        help="Execute the program through a cache of "
+                             "translated basic blocks (runs faster)")
+    parser.add_argument("-f", "--instructions-per-frame",
+                        type=int, default=None,
+                        help="Count timers down every given number of "
+                             "executed opcodes instead of in real time")
+    parser.add_argument("-i", "--ips",
+                        type=int, default=None,
+                        help="Target number of opcodes executed per second")
+    parser.add_argument("--frame-policy",
+                        choices=scheduler.FRAME_POLICIES,
+                        default=scheduler.CATCH_UP,
+                        help="Whether to catch up or drop frames the "
+                             "emulator is late for")
+    parser.add_argument("-r", "--rewind",
+                        type=int, default=None,
+                        help="Keep the given number of seconds of play "
+                             "to step back through with Backspace")
+    parser.add_argument("--seed",
+                        type=int, default=None,
+                        help="Seed of the random numbers of Cxkk opcodes")
+    parser.add_argument("--record", type=str, default=None,
+                        help="Record keys to the given file to replay them "
+                             "with python -m chip8 replay (needs -f)")
+    parser.add_argument("--beep-wav", type=str, default=None,
+                        help="Write beeps to the given WAV file instead "
+                             "of playing them")
+    parser.add_argument("--skip-idle", action="store_true",
+                        help="Fast-forward loops waiting for a timer tick "
+                             "or a key, sleeping in them without delay")
+    parser.add_argument("--trace", type=str, default=None,
+                        help="Write every executed instruction with the "
+                             "registers after it to the given file")
+    parser.add_argument("--variant", choices=emulator.VARIANTS,
+                        default=emulator.CHIP8,
+                        help="Machine to emulate: CHIP-8, SUPER-CHIP with "
+                             "its 128x64 mode or XO-CHIP with two planes")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="Print how long every startup phase took "
+                             "until the first frame")
     parser.add_argument("-p", "--pixel-size",
                         type=int, default=PIXEL_DEFAULT_SIDE_SIZE,
                         help="Define a screen pixel size (must be positive)")
@@ -102,8 +250,8 @@ def parse_args():
     return parser.parse_args()
 
 
-def is_kivy_installed():
-    spam_spec = importlib.util.find_spec("kivy")
+def is_installed(module_name):
+    spam_spec = importlib.util.find_spec(module_name)
     return spam_spec is not None
 
 
@@ -0,0 +1,125 @@
+# !/usr/bin/env python3
+import time
+from collections import Counter
+
+from core import EmulatorError
+
+# Opcode patterns of the families distinguished by the last digits
+SUB_OPCODE_DIGITS = {0x0: 4, 0x5: 1, 0x8: 1, 0xE: 2, 0xF: 2}
+FAMILY_PATTERNS = {0x1: '1nnn', 0x2: '2nnn', 0x3: '3xkk', 0x4: '4xkk',
+                   0x6: '6xkk', 0x7: '7xkk', 0x9: '9xy0',
+                   0xA: 'Annn', 0xB: 'Bnnn', 0xC: 'Cxkk', 0xD: 'Dxyn'}
+
+
+def opcode_family(program_code):
+    """Returns the pattern of the opcode family, e.g. 8xy4 or Fx55."""
+    first_digit = program_code >> 12
+    if first_digit in FAMILY_PATTERNS:
+        return FAMILY_PATTERNS[first_digit]
+    digits = SUB_OPCODE_DIGITS[first_digit]
+    code = '{:04X}'.format(program_code)
+    if digits == 1:
+        return code[0] + 'xy' + code[3]
+    if digits == 2:
+        return code[0] + 'x' + code[2:]
+    return code
+
+
+class Profiler:
+    """Counts and times every executed opcode of an emulator.
+
+    While enabled, the emulator engine is replaced by an instrumented
+    interpreter, so a disabled profiler costs nothing. Translated blocks
+    are not used while profiling, as they hide single opcodes.
+    """
+
+    def __init__(self, emulator):
+        self.emulator = emulator
+        self.engine = None
+        # (address, opcode) pairs mapped to executions and nanoseconds
+        self.counts = Counter()
+        self.times = Counter()
+
+    @property
+    def enabled(self):
+        return self.engine is not None
+
+    def enable(self):
+        if not self.enabled:
+            self.engine = self.emulator.engine
+            self.emulator.engine = self.interpret
+
+    def disable(self):
+        if self.enabled:
+            self.emulator.engine = self.engine
+            self.engine = None
+
+    def reset(self):
+        self.counts.clear()
+        self.times.clear()
+
+    def interpret(self, count, limit=None):
+        emulator = self.emulator
+        memory = emulator.memory
+        opcode_table = emulator.opcode_table
+        counts = self.counts
+        times = self.times
+        clock = time.perf_counter_ns
+        executed = 0
+        try:
+            for executed in range(count):
+                address = emulator.program_counter
+                program_code = (memory[address] << 8) | memory[address + 1]
+                program = opcode_table[program_code]
+                if program is None:
+                    raise emulator._program_not_found_error(program_code)
+                start = clock()
+                program[0](emulator, *program[1])
+                key = (address, program_code)
+                times[key] += clock() - start
+                counts[key] += 1
+                emulator.program_counter = \
+                    (emulator.program_counter + 2) & emulator.address_mask
+        except EmulatorError:
+            emulator.instruction_count += executed
+            raise
+        return count
+
+    def families(self):
+        """Returns executions and seconds spent per opcode family."""
+        families = {}
+        for (address, program_code), count in self.counts.items():
+            family = families.setdefault(opcode_family(program_code), {
+                'handler': self.emulator.opcode_table[
+                    program_code][0].__name__,
+                'count': 0, 'seconds': 0.0})
+            family['count'] += count
+            family['seconds'] += self.times[address, program_code] / 1e9
+        return families
+
+    def hot_addresses(self, limit=None):
+        """Returns (address, executions) pairs, the most executed first."""
+        by_address = Counter()
+        for (address, _), count in self.counts.items():
+            by_address[address] += count
+        return by_address.most_common(limit)
+
+    def report(self, hot_address_limit=32):
+        return {'instructions': sum(self.counts.values()),
+                'families': self.families(),
+                'hot_addresses': [
+                    {'address': address, 'count': count}
+                    for address, count
+                    in self.hot_addresses(hot_address_limit)]}
+
+    def collapsed_stacks(self):
+        """Returns lines of family;address frames followed by nanoseconds,
+        the collapsed stack format read by flamegraph tools."""
+        lines = []
+        for (address, program_code), nanoseconds in sorted(
+                self.times.items()):
+            lines.append('{};{};{:#05x} {}'.format(
+                opcode_family(program_code),
+                self.emulator.opcode_table[program_code][0].__name__,
+                address, nanoseconds))
+        return lines
@@ -0,0 +1,84 @@
+# !/usr/bin/env python3
+import struct
+
+from core import CHIP8Core
+
+RECORDING_MAGIC = b'C8IN'
+RECORDING_VERSION = 1
+# Magic, version, seed, instructions per frame and program length,
+# followed by the program and the events
+HEADER_FORMAT = struct.Struct('>4sBQIH')
+# Instruction count, key and whether it was pressed or released
+EVENT_FORMAT = struct.Struct('>QB?')
+
+
+class InputRecorder:
+    """Writes key presses and releases of an emulator to a binary file.
+
+    Events are written as they come, so a recording survives the emulator
+    process being terminated. A run is reproduced by replay if keys are
+    only pressed and released between runs of the emulator, when its
+    instruction count is exact, and its random numbers come from the seed.
+    """
+
+    def __init__(self, path, program, seed, instructions_per_frame):
+        self.file = open(path, 'wb', buffering=0)
+        self.file.write(HEADER_FORMAT.pack(
+            RECORDING_MAGIC, RECORDING_VERSION, seed,
+            instructions_per_frame, len(program)) + bytes(program))
+
+    def record(self, instruction, key, pressed):
+        self.file.write(EVENT_FORMAT.pack(instruction, key, pressed))
+
+    def close(self):
+        self.file.close()
+
+
+class Recording:
+    def __init__(self, program, seed, instructions_per_frame, events):
+        self.program = program
+        self.seed = seed
+        self.instructions_per_frame = instructions_per_frame
+        # (instruction count, key, pressed) tuples in recorded order
+        self.events = events
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < HEADER_FORMAT.size:
+            raise ValueError('Not a CHIP-8 input recording')
+        magic, version, seed, instructions_per_frame, program_length = \
+            HEADER_FORMAT.unpack_from(data)
+        if magic != RECORDING_MAGIC:
+            raise ValueError('Not a CHIP-8 input recording')
+        if version != RECORDING_VERSION:
+            raise ValueError('Unsupported recording version: ' +
+                             str(version))
+        start = HEADER_FORMAT.size + program_length
+        program = data[HEADER_FORMAT.size:start]
+        # A terminated recorder may have left a partly written event
+        end = start + (len(data) - start) // EVENT_FORMAT.size * \
+            EVENT_FORMAT.size
+        events = list(EVENT_FORMAT.iter_unpack(data[start:end]))
+        return cls(program, seed, instructions_per_frame, events)
+
+
+def replay(recording, instructions=None, use_block_cache=False):
+    """Runs the recorded program headlessly as fast as possible, feeding
+    it the recorded keys, up to the last event or the given instruction
+    count, and returns the core."""
+    core = CHIP8Core(recording.instructions_per_frame, use_block_cache,
+                     recording.seed)
+    core.load_program(recording.program)
+    for instruction, key, pressed in recording.events:
+        if instructions is not None and instruction > instructions:
+            break
+        core.run(instruction - core.instruction_count)
+        if pressed:
+            core.press_key(key)
+        else:
+            core.release_key(key)
+    if instructions is not None:
+        core.run(instructions - core.instruction_count)
+    return core
@@ -0,0 +1,66 @@
+# !/usr/bin/env python3
+import zlib
+from collections import deque
+
+from scheduler import FRAME_RATE
+
+DEFAULT_SECONDS = 60
+KEYFRAME_INTERVAL = FRAME_RATE
+
+
+def xor_bytes(a, b):
+    return (int.from_bytes(a, 'big') ^
+            int.from_bytes(b, 'big')).to_bytes(len(a), 'big')
+
+
+class RewindBuffer:
+    """Keeps states of the last frames for stepping back in time.
+
+    Every keyframe_interval-th state is kept whole as a keyframe, the ones
+    between are kept as compressed XOR deltas against their keyframe, which
+    are tiny as a frame changes a few bytes of the state. Keyframes with
+    their deltas are dropped oldest first once more than capacity states
+    are kept.
+    """
+
+    def __init__(self, seconds=DEFAULT_SECONDS, frame_rate=FRAME_RATE,
+                 keyframe_interval=KEYFRAME_INTERVAL):
+        self.capacity = max(1, round(seconds * frame_rate))
+        self.keyframe_interval = keyframe_interval
+        # Keyframes, each with the list of deltas that follow it
+        self.segments = deque()
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def push(self, state):
+        if not self.segments or \
+                len(self.segments[-1][1]) + 1 >= self.keyframe_interval:
+            self.segments.append((state, []))
+        else:
+            keyframe, deltas = self.segments[-1]
+            deltas.append(zlib.compress(xor_bytes(keyframe, state), 1))
+        self.length += 1
+        while self.length > self.capacity and len(self.segments) > 1:
+            self.length -= 1 + len(self.segments.popleft()[1])
+
+    def pop(self):
+        """Removes and returns the latest state, None if there are none."""
+        if not self.segments:
+            return None
+        self.length -= 1
+        keyframe, deltas = self.segments[-1]
+        if not deltas:
+            self.segments.pop()
+            return keyframe
+        return xor_bytes(keyframe, zlib.decompress(deltas.pop()))
+
+    def clear(self):
+        self.segments.clear()
+        self.length = 0
+
+    def size(self):
+        """Returns the number of bytes taken by the kept states."""
+        return sum(len(keyframe) + sum(map(len, deltas))
+                   for keyframe, deltas in self.segments)
@@ -0,0 +1,64 @@
+# !/usr/bin/env python3
+import time
+
+FRAME_RATE = 60
+
+# Policies for frames the scheduler is late for
+CATCH_UP = 'catch-up'
+DROP = 'drop'
+FRAME_POLICIES = (CATCH_UP, DROP)
+
+MAX_CATCH_UP_FRAMES = 5
+
+
+def frame_instructions(target_ips, frame_rate=FRAME_RATE):
+    """Returns the number of instructions per frame closest to running
+    target_ips instructions per second."""
+    return max(1, round(target_ips / frame_rate))
+
+
+class FrameScheduler:
+    """Runs an emulator in batches of instructions, one batch per frame,
+    sleeping until the deadline of the next frame after each of them.
+
+    When the emulator falls behind, CATCH_UP runs late frames back to back
+    unless it is MAX_CATCH_UP_FRAMES frames late, while DROP gives up on a
+    frame as soon as it is late for a whole one. Given up frames are
+    counted in dropped_frames and deadlines are counted anew from then.
+    """
+
+    def __init__(self, emulator, target_ips=None, policy=CATCH_UP,
+                 frame_rate=FRAME_RATE, clock=time.perf_counter,
+                 sleep=time.sleep):
+        if policy not in FRAME_POLICIES:
+            raise ValueError('Unknown frame policy: ' + str(policy))
+        self.emulator = emulator
+        self.policy = policy
+        self.frame_rate = frame_rate
+        self.clock = clock
+        self.sleep = sleep
+        if target_ips is None:
+            self.instructions_per_frame = emulator.instructions_per_frame
+        else:
+            self.instructions_per_frame = frame_instructions(target_ips,
+                                                             frame_rate)
+        self.frames = 0
+        self.dropped_frames = 0
+
+    def run(self, frames=None):
+        frame_time = 1 / self.frame_rate
+        max_lateness = frame_time * (MAX_CATCH_UP_FRAMES
+                                     if self.policy == CATCH_UP else 1)
+        deadline = self.clock()
+        end = None if frames is None else self.frames + frames
+        while end is None or self.frames < end:
+            self.emulator.run(self.instructions_per_frame)
+            self.frames += 1
+            deadline += frame_time
+
+            now = self.clock()
+            if deadline > now:
+                self.sleep(deadline - now)
+            elif now - deadline >= max_lateness:
+                self.dropped_frames += int((now - deadline) / frame_time)
+                deadline = now
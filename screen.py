@@ -1,22 +1,41 @@
 # !/usr/bin/env python3
 import sys
-from multiprocessing import Array, Value, Event
+from multiprocessing import Event
 
-from PyQt5.QtCore import Qt, QBasicTimer
-from PyQt5.QtGui import QPainter, QColor
+from PyQt5.QtCore import Qt, QBasicTimer, QRect
+from PyQt5.QtGui import QPainter, QColor, QImage
 from PyQt5.QtWidgets import QWidget, QApplication
 
-from emulator import SCREEN_HEIGHT, SCREEN_WIDTH
+from core import SCREEN_HEIGHT, SCREEN_WIDTH
+from keypad import SharedKeypad
+from shared_framebuffer import SharedFramebuffer
 
 KEY_BINDINGS = {Qt.Key_1: 0x1, Qt.Key_2: 0x2, Qt.Key_3: 0x3, Qt.Key_4: 0xc,
                 Qt.Key_Q: 0x4, Qt.Key_W: 0x5, Qt.Key_E: 0x6, Qt.Key_R: 0xd,
                 Qt.Key_A: 0x7, Qt.Key_S: 0x8, Qt.Key_D: 0x9, Qt.Key_F: 0xe,
                 Qt.Key_Z: 0xa, Qt.Key_X: 0x0, Qt.Key_C: 0xb, Qt.Key_V: 0xf, }
 
+# Held to step the emulator back in time, one frame per frame
+REWIND_KEY = Qt.Key_Backspace
+
+# Repaints are not checked for more often than the display refreshes
+REDRAW_INTERVAL_MS = 1000 // 60
+
 
 class CHIP8QScreen(QWidget):
+    """Window of the emulator. Its size stays that of 64x32 pixels, a
+    128x64 screen is drawn with pixels half as big. The packed rows of a
+    plane are painted as a monochrome image scaled by QPainter, so the
+    cost of a repaint does not grow with the resolution. The planes of
+    XO-CHIP are split into three masks with big int operations, each
+    painted in its color over the background."""
+
     color_inactive = QColor(0, 0, 0)
     color_active = QColor(255, 255, 255)
+    # Pixels set in the second XO-CHIP plane only, and in both
+    color_second_plane = QColor(255, 102, 0)
+    color_both_planes = QColor(255, 204, 0)
+    color_transparent = QColor(0, 0, 0, 0)
 
     def __init__(self, pixel_side_size):
         super().__init__()
@@ -26,18 +45,19 @@ class CHIP8QScreen(QWidget):
         self.init_ui()
 
         self.timer_redraw = QBasicTimer()
-        self.timer_redraw.start(1, self)
+        self.timer_redraw.start(REDRAW_INTERVAL_MS, self)
 
-        self.pixels_state = Array('b',
-                                  [False] * (SCREEN_WIDTH * SCREEN_HEIGHT))
-        self.pressed_event = Event()
-        self.pressed_key = Value('i', 0)
+        self.pixels_state = SharedFramebuffer()
+        self.painted_sequence = 0
+        self.pixels = bytes(SCREEN_WIDTH // 8 * SCREEN_HEIGHT)
+        self.shape = (SCREEN_WIDTH, SCREEN_HEIGHT, 1)
+        self.keypad = SharedKeypad()
 
         self.close_event = Event()
+        self.rewind_event = Event()
 
-        self.pressed = []
-        for i in range(0x10):
-            self.pressed.append(Value('b', False))
+        # Called once the emulator has published its first frame
+        self.on_first_frame = None
 
     def init_ui(self):
         self.setFixedSize(self.pixel_side_size * SCREEN_WIDTH,
@@ -49,42 +69,86 @@ class CHIP8QScreen(QWidget):
         qp = QPainter()
         qp.begin(self)
 
-        index = 0
-        for y in range(SCREEN_HEIGHT):
-            for x in range(SCREEN_WIDTH):
-                self.draw_pixel(qp,
-                                x * self.pixel_side_size,
-                                y * self.pixel_side_size,
-                                self.pixels_state[index])
-                index += 1
+        width, height, planes = self.shape
+        row_bytes = width // 8
+        plane_bytes = row_bytes * height
+        first_row, last_row = 0, height - 1
+        if e is not None:
+            first_row = max(e.rect().top() * height // self.height(), 0)
+            last_row = min(e.rect().bottom() * height // self.height(),
+                           height - 1)
+        top = first_row * self.height() // height
+        target = QRect(0, top, self.width(),
+                       (last_row + 1) * self.height() // height - top)
+        source = QRect(0, first_row, width, last_row - first_row + 1)
+        qp.setRenderHint(QPainter.SmoothPixmapTransform, False)
+
+        first = self.pixels[:plane_bytes]
+        second = self.pixels[plane_bytes:2 * plane_bytes]
+        if planes == 1 or not any(second):
+            # Packed rows are exactly the layout of a monochrome QImage
+            layers = [(first, self.color_inactive, self.color_active)]
+        else:
+            first = int.from_bytes(first, 'big')
+            second = int.from_bytes(second, 'big')
+            qp.fillRect(target, self.color_inactive)
+            layers = [(mask.to_bytes(plane_bytes, 'big'),
+                       self.color_transparent, color)
+                      for mask, color in (
+                          (first & ~second, self.color_active),
+                          (second & ~first, self.color_second_plane),
+                          (first & second, self.color_both_planes))]
+        for pixels, color_inactive, color_active in layers:
+            image = QImage(pixels, width, height, row_bytes,
+                           QImage.Format_Mono)
+            image.setColorTable([color_inactive.rgba(), color_active.rgba()])
+            qp.drawImage(target, image, source)
         qp.end()
 
     def keyPressEvent(self, e):
         if e.isAutoRepeat():
             return
-        if e.key() in KEY_BINDINGS:
-            key = KEY_BINDINGS[e.key()]
-            self.pressed[key].value = True
-            if not self.pressed_event.is_set():
-                self.pressed_key.value = key
-                self.pressed_event.set()
+        if e.key() == REWIND_KEY:
+            self.rewind_event.set()
+        elif e.key() in KEY_BINDINGS:
+            self.keypad.press(KEY_BINDINGS[e.key()])
 
     def keyReleaseEvent(self, e):
         if e.isAutoRepeat():
             return
-        if e.key() in KEY_BINDINGS:
-            self.pressed[KEY_BINDINGS[e.key()]].value = False
-
-    def draw_pixel(self, qp, x, y, state):
-        color = self.color_active if state else self.color_inactive
-        qp.setBrush(color)
-        qp.setPen(color)
-        qp.drawRect(x, y, self.pixel_side_size, self.pixel_side_size)
+        if e.key() == REWIND_KEY:
+            self.rewind_event.clear()
+        elif e.key() in KEY_BINDINGS:
+            self.keypad.release(KEY_BINDINGS[e.key()])
 
     def timerEvent(self, event):
         if self.close_event.is_set():
             QApplication.quit()
         if event.timerId() == self.timer_redraw.timerId():
-            self.update()
+            self.update_dirty_rows()
         else:
             super().timerEvent(event)
+
+    def update_dirty_rows(self):
+        if self.pixels_state.generation == self.painted_sequence // 2:
+            return
+        sequence, self.pixels, row_sequences, shape = \
+            self.pixels_state.read()
+        if self.on_first_frame is not None:
+            self.on_first_frame()
+            self.on_first_frame = None
+        if shape != self.shape:
+            self.shape = shape
+            self.painted_sequence = sequence
+            self.update()
+            return
+        height = shape[1]
+        dirty_rows = [y for y in range(height)
+                      if row_sequences[y] > self.painted_sequence]
+        self.painted_sequence = sequence
+        if not dirty_rows:
+            return
+        first_row, last_row = dirty_rows[0], dirty_rows[-1]
+        top = first_row * self.height() // height
+        self.update(0, top, self.width(),
+                    (last_row + 1) * self.height() // height - top)
@@ -0,0 +1,64 @@
+# !/usr/bin/env python3
+from multiprocessing.sharedctypes import RawArray, RawValue
+
+from core import SCREEN_WIDTH, SCREEN_HEIGHT, HIRES_WIDTH, HIRES_HEIGHT, \
+    PLANES
+
+ROW_BYTES = SCREEN_WIDTH // 8
+
+
+class SharedFramebuffer:
+    """Packed framebuffer rows shared between the emulator and the screen.
+
+    There is a single writer, so no locks are used: sequence is odd while
+    rows are being written and the reader retries a copy during which it
+    has changed. Every published row remembers the sequence it was written
+    at, so the reader can tell which rows changed since its last copy.
+
+    Room is kept for two planes of 128x64 pixels. Rows are laid out one
+    after another at the current width, the planes one after another, so
+    a 64x32 screen of one plane is 256 bytes as it always was.
+    """
+
+    def __init__(self):
+        # Rows of 8 pixels per byte, leftmost pixel in the highest bit
+        self.pixels = RawArray('B', PLANES * HIRES_HEIGHT * HIRES_WIDTH // 8)
+        self.row_sequences = RawArray('Q', HIRES_HEIGHT)
+        self.sequence = RawValue('Q', 0)
+        # Width, height and number of planes of the published rows
+        self.shape = RawArray('H', (SCREEN_WIDTH, SCREEN_HEIGHT, 1))
+
+    @property
+    def generation(self):
+        return self.sequence.value // 2
+
+    def publish_rows(self, rows, planes, width=SCREEN_WIDTH):
+        """Publishes the given rows of every plane, a list of framebuffers
+        width pixels wide."""
+        sequence = self.sequence.value + 1
+        self.sequence.value = sequence
+        height = len(planes[0])
+        self.shape[:] = (width, height, len(planes))
+        row_bytes = width // 8
+        for y in rows:
+            for i, plane in enumerate(planes):
+                offset = row_bytes * (height * i + y)
+                self.pixels[offset:offset + row_bytes] = \
+                    plane[y].to_bytes(row_bytes, 'big')
+            self.row_sequences[y] = sequence + 1
+        self.sequence.value = sequence + 1
+
+    def read(self):
+        """Returns the sequence, the pixels, the row sequences and the
+        (width, height, planes) shape of a consistent frame."""
+        while True:
+            sequence = self.sequence.value
+            if sequence % 2:
+                continue
+            width, height, planes = self.shape[:]
+            pixels = bytes(memoryview(self.pixels)[
+                           :width // 8 * height * planes])
+            row_sequences = self.row_sequences[:height]
+            if self.sequence.value == sequence:
+                return sequence, pixels, row_sequences, \
+                    (width, height, planes)
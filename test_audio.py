@@ -0,0 +1,57 @@
+# !/usr/bin/env python3
+import os
+import tempfile
+import unittest
+import wave
+from array import array
+
+from audio import Beeper, NullSink, WavSink, square_wave
+
+
+class AudioTests(unittest.TestCase):
+    def test_square_wave(self):
+        samples = array('h', square_wave(sample_rate=800, frequency=4,
+                                         volume=0.5))
+        self.assertEqual(len(samples), 800)
+        # Four periods of 100 low and 100 high samples
+        self.assertEqual(samples[:100].tolist(), [-0x3FFF] * 100)
+        self.assertEqual(samples[100:200].tolist(), [0x3FFF] * 100)
+        self.assertEqual(samples[200:400], samples[:200])
+
+    def test_beeper_frames(self):
+        sink = NullSink()
+        beeper = Beeper(sink, sample_rate=1000, frequency=10, frame_rate=60)
+        for frame in range(60):
+            beeper.frame(frame < 6)
+        # Frames of 16 and 17 samples add up to a second
+        self.assertEqual(sink.samples, 1000)
+        self.assertEqual(sink.sounding_samples, 6 * 1000 // 60)
+
+    def test_beeper_keeps_phase(self):
+        sink = NullSink()
+        sink.write = lambda data: written.append(data)
+        written = []
+        beeper = Beeper(sink, sample_rate=1000, frequency=10, frame_rate=50)
+        beeper.frame(True)
+        beeper.frame(False)
+        beeper.frame(True)
+        wave_samples = square_wave(1000, 10)
+        self.assertEqual(written[0], wave_samples[:40])
+        self.assertEqual(written[1], bytes(40))
+        self.assertEqual(written[2], wave_samples[80:120])
+
+    def test_wav_sink(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'beeps.wav')
+            beeper = Beeper(WavSink(path, 8000), sample_rate=8000)
+            for frame in range(30):
+                beeper.frame(frame % 2 == 0)
+            beeper.close()
+            with wave.open(path) as beeps:
+                self.assertEqual(beeps.getframerate(), 8000)
+                self.assertEqual(beeps.getsampwidth(), 2)
+                self.assertEqual(beeps.getnframes(), 4000)
+
+
+if __name__ == '__main__':
+    unittest.main()
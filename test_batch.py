@@ -0,0 +1,69 @@
+# !/usr/bin/env python3
+import os
+import tempfile
+import unittest
+
+from batch import find_roms, run_rom, run_batch
+
+# Counts v1 from 0x50 down by 0x1F + 0x11 per loop, then jumps back
+LOOP_ROM = bytes([0x61, 0x50, 0x62, 0x1F, 0x72, 0x11, 0x81, 0x24,
+                  0x12, 0x08])
+BAD_ROM = bytes([0x00, 0x00])
+
+
+class BatchTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.loop_path = self.write_rom('loop.ch8', LOOP_ROM)
+        self.bad_path = self.write_rom('bad.ch8', BAD_ROM)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_rom(self, name, program):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as f:
+            f.write(program)
+        return path
+
+    def test_find_roms(self):
+        pattern = os.path.join(self.directory.name, '*.ch8')
+        self.assertEqual(find_roms([pattern, self.loop_path]),
+                         [self.bad_path, self.loop_path])
+        self.assertEqual(find_roms([pattern + '.missing']), [])
+
+    def test_run_rom(self):
+        report = run_rom(self.loop_path, instructions=100,
+                         instructions_per_frame=10)
+        self.assertIsNone(report['error'])
+        self.assertEqual(report['instructions'], 100)
+        self.assertEqual(report['frames'], 10)
+        self.assertEqual(report['state']['pc'], 0x208)
+
+    def test_run_rom_frames(self):
+        report = run_rom(self.loop_path, frames=3, instructions_per_frame=7)
+        self.assertEqual(report['instructions'], 21)
+        self.assertEqual(report['frames'], 3)
+
+    def test_block_cache_matches(self):
+        interpreted = run_rom(self.loop_path, instructions=1001)
+        translated = run_rom(self.loop_path, instructions=1001,
+                             use_block_cache=True)
+        self.assertEqual(interpreted['state'], translated['state'])
+
+    def test_run_rom_error(self):
+        report = run_rom(self.bad_path, instructions=10)
+        self.assertIn('OpCodeNotFoundError', report['error'])
+        self.assertEqual(report['instructions'], 0)
+
+    def test_run_batch(self):
+        reports = run_batch([self.loop_path, self.bad_path],
+                            instructions=50, workers=2)
+        self.assertEqual([report['rom'] for report in reports],
+                         [self.loop_path, self.bad_path])
+        self.assertIsNone(reports[0]['error'])
+        self.assertIsNotNone(reports[1]['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
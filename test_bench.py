@@ -0,0 +1,43 @@
+# !/usr/bin/env python3
+import unittest
+
+from bench import WORKLOADS, run_benchmarks, compare
+from core import CHIP8Core
+
+
+class BenchTests(unittest.TestCase):
+    def test_workloads_run_endlessly(self):
+        for name, program in WORKLOADS.items():
+            with self.subTest(name):
+                states = []
+                for use_block_cache in (False, True):
+                    core = CHIP8Core(use_block_cache=use_block_cache)
+                    core.load_program(program)
+                    core.run(5000)
+                    states.append((core.v_reg, core.i_reg,
+                                   core.program_counter,
+                                   core.framebuffer))
+                self.assertEqual(states[0], states[1])
+
+    def test_run_benchmarks(self):
+        report = run_benchmarks(['alu', 'call'], instructions=1000,
+                                repeats=1)
+        self.assertEqual(sorted(report['results']), ['alu', 'call'])
+        result = report['results']['alu']
+        self.assertGreater(result['ips'], 0)
+        self.assertAlmostEqual(result['ns_per_op'],
+                               1e9 / result['ips'])
+
+    def test_compare(self):
+        baseline = {'results': {'alu': {'ips': 1000},
+                                'draw': {'ips': 1000}}}
+        report = {'results': {'alu': {'ips': 850},
+                              'draw': {'ips': 700},
+                              'call': {'ips': 10}}}
+        regressions = compare(report, baseline, tolerance=0.2)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith('draw'))
+
+
+if __name__ == '__main__':
+    unittest.main()
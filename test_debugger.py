@@ -0,0 +1,95 @@
+# !/usr/bin/env python3
+import io
+import unittest
+
+from core import CHIP8Core
+from debugger import Debugger, DebuggerShell, compile_condition, \
+    format_state
+
+# 0x200 A300 - I = 0x300
+# 0x202 7001 - add 1 to v[0]          <- loop
+# 0x204 F033 - store v[0] as BCD at I
+# 0x206 220C - call 0x20C
+# 0x208 1202 - jump to loop
+# 0x20A 0000
+# 0x20C 7101 - add 1 to v[1]          <- subroutine
+# 0x20E 00EE - return
+PROGRAM = bytes.fromhex('A3007001F033220C120200007101' '00EE')
+
+
+class DebuggerTests(unittest.TestCase):
+    def setUp(self):
+        self.core = CHIP8Core(instructions_per_frame=4)
+        self.core.load_program(PROGRAM)
+        self.debugger = Debugger(self.core)
+
+    def test_engine_is_swapped_only_with_breakpoints(self):
+        engine = self.core.engine
+        self.debugger.add_breakpoint(0x208)
+        self.assertNotEqual(self.core.engine, engine)
+        self.debugger.remove_breakpoint(0x208)
+        self.assertEqual(self.core.engine, engine)
+        self.debugger.step(3)
+        self.assertEqual(self.core.engine, engine)
+        self.assertEqual(self.core.memory_write_hooks, [])
+
+    def test_breakpoint(self):
+        self.debugger.add_breakpoint(0x208)
+        self.assertEqual(self.debugger.run(), 'Breakpoint at 208')
+        self.assertEqual(self.core.program_counter, 0x208)
+        self.assertEqual(self.core.instruction_count, 6)
+        self.assertEqual(self.core.frame_count, 1)
+        # Running on goes past the breakpoint stopped at
+        self.assertEqual(self.debugger.run(), 'Breakpoint at 208')
+        self.assertEqual(self.core.instruction_count, 12)
+        self.assertEqual(self.core.v_reg[0], 2)
+
+    def test_conditional_breakpoint(self):
+        self.debugger.add_breakpoint(0x202, compile_condition('V0 == 3'))
+        self.debugger.run()
+        self.assertEqual(self.core.v_reg[0], 3)
+        self.assertEqual(self.core.program_counter, 0x202)
+        self.assertRaises(ValueError, compile_condition, 'open("x")')
+
+    def test_watchpoint(self):
+        self.debugger.add_watchpoint(0x302)
+        self.assertEqual(self.debugger.run(),
+                         'Watchpoint: 300 written by 204')
+        self.assertEqual(self.core.program_counter, 0x206)
+        self.assertEqual(self.core.memory[0x302], 1)
+        self.debugger.remove_watchpoint(0x302)
+        self.assertIsNone(self.debugger.run(20))
+
+    def test_step_over_and_run_to_return(self):
+        self.debugger.step(3)
+        self.assertEqual(self.core.program_counter, 0x206)
+        self.debugger.step_over()
+        self.assertEqual(self.core.program_counter, 0x208)
+        self.assertEqual(self.core.v_reg[1], 1)
+        self.debugger.step(4)
+        self.assertEqual(self.core.program_counter, 0x20C)
+        self.debugger.run_to_return()
+        self.assertEqual(self.core.program_counter, 0x208)
+        self.assertEqual(self.core.stack_pointer, 0)
+        self.assertEqual(self.core.v_reg[1], 2)
+
+    def test_format_state(self):
+        self.debugger.step(1)
+        lines = format_state(self.core)
+        self.assertIn('I=300 PC=202', lines[2])
+        self.assertIn('> 202  7001  ADD V0, 0x01', lines)
+
+    def test_shell(self):
+        output = io.StringIO()
+        shell = DebuggerShell(self.debugger, io.StringIO(
+            'break 20c if V1 == 0\nc\nfinish\ninfo\nmem 300 3\n'), output)
+        shell.cmdloop()
+        output = output.getvalue()
+        self.assertIn('Breakpoint at 20C', output)
+        self.assertIn('> 208  1202  JP 0x202', output)
+        self.assertIn('break 20C if V1 == 0', output)
+        self.assertIn('300  00 00 01', output)
+
+
+if __name__ == '__main__':
+    unittest.main()
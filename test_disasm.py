@@ -0,0 +1,70 @@
+# !/usr/bin/env python3
+import unittest
+
+from core import CHIP8Core
+from disasm import Disassembly, mnemonic, CALL, FALL_THROUGH, JUMP, SKIP
+
+# 0x200 A20E - I = 0x20E
+# 0x202 D015 - draw 5 lines at v[0], v[1]
+# 0x204 220A - call 0x20A
+# 0x206 3000 - skip next if v[0] == 0
+# 0x208 1200 - jump to start
+# 0x20A 7001 - add 1 to v[0]         <- subroutine
+# 0x20C 00EE - return
+# 0x20E F0 90 F0 90 F0 - sprite of 8
+PROGRAM = bytes.fromhex('A20ED015220A3000120070' '0100EE' 'F090F090F0')
+
+
+class DisassemblyTests(unittest.TestCase):
+    def setUp(self):
+        self.disassembly = Disassembly(PROGRAM)
+
+    def test_mnemonic(self):
+        self.assertEqual(mnemonic(0x00E0), 'CLS')
+        self.assertEqual(mnemonic(0x8124), 'ADD V1, V2')
+        self.assertEqual(mnemonic(0xD125), 'DRW V1, V2, 5')
+        self.assertEqual(mnemonic(0xF355), 'LD [I], V3')
+        self.assertIsNone(mnemonic(0x0000))
+
+    def test_mnemonics_cover_opcode_table(self):
+        for program_code, program in enumerate(CHIP8Core.opcode_table):
+            self.assertEqual(program is None,
+                             mnemonic(program_code) is None)
+
+    def test_blocks(self):
+        blocks = self.disassembly.blocks
+        self.assertEqual(sorted(blocks), [0x200, 0x206, 0x208, 0x20A])
+        self.assertEqual(blocks[0x200].end, 0x206)
+        self.assertEqual(blocks[0x200].successors,
+                         [(0x20A, CALL), (0x206, FALL_THROUGH)])
+        self.assertEqual(blocks[0x206].successors,
+                         [(0x208, FALL_THROUGH), (0x20A, SKIP)])
+        self.assertEqual(blocks[0x208].successors, [(0x200, JUMP)])
+        self.assertEqual(blocks[0x20A].end, 0x20E)
+        self.assertEqual(blocks[0x20A].successors, [])
+
+    def test_subroutines(self):
+        self.assertEqual(self.disassembly.subroutines,
+                         {0x200: ([0x200, 0x206, 0x208, 0x20A], [0x20A]),
+                          0x20A: ([0x20A], [])})
+
+    def test_data(self):
+        report = self.disassembly.report()
+        self.assertEqual(report['data'], [{'start': 0x20E, 'end': 0x213,
+                                           'kind': 'sprite'}])
+        self.assertEqual(len(report['instructions']), 7)
+        listing = self.disassembly.listing()
+        self.assertIn('0x20E  F0    DB 0xF0  ; ####....', listing)
+        self.assertIn('0x204  220A  CALL 0x20A', listing)
+
+    def test_invalid_and_unreached(self):
+        # 1204 - jump to 0x204, 0000 - not an opcode, 0000 - 0x204
+        disassembly = Disassembly(bytes.fromhex('120400000000'))
+        self.assertEqual(disassembly.invalid, {0x204})
+        listing = disassembly.listing()
+        self.assertIn('0x202  00    DB 0x00  ; unreached', listing)
+        self.assertIn('0x204  00    DB 0x00  ; invalid opcode', listing)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,35 +1,40 @@
 # !/usr/bin/env python3
+import os
 import random
+import tempfile
+import threading
 import unittest
+import wave
 
-from multiprocessing import Array, Event, Value
+from multiprocessing import Event
 
 import time
 
+import audio
 import font
+from core import CHIP8Core, StackError
 from emulator import CHIP8Emulator, SCREEN_WIDTH, SCREEN_HEIGHT, \
     OpCodeNotFoundError, EmulatorError
+from keypad import SharedKeypad
+from shared_framebuffer import SharedFramebuffer
 
 
 class EmulatorTests(unittest.TestCase):
     def setUp(self):
-        self.pixels_state = Array('b',
-                                  [False] * (SCREEN_WIDTH * SCREEN_HEIGHT))
-        self.key_press_event = Event()
-        self.key_press_value = Value('i', 0)
-        self.key_down_values = []
-        for i in range(0x10):
-            self.key_down_values.append(Value('b', False))
+        self.pixels_state = SharedFramebuffer()
+        self.keypad = SharedKeypad()
 
         self.emulator = CHIP8Emulator(self.pixels_state,
-                                      self.key_press_event,
-                                      self.key_press_value,
-                                      self.key_down_values,
+                                      self.keypad,
                                       Event(),
                                       False, False)
 
     def tearDown(self):
-        self.emulator.delay_timer.terminate()
+        self.emulator.on_terminate()
+
+    def shared_pixel(self, x, y):
+        byte = self.pixels_state.read()[1][(SCREEN_WIDTH * y + x) // 8]
+        return bool(byte & (0x80 >> (x % 8)))
 
     def test_jump(self):
         e = self.emulator
@@ -357,18 +362,18 @@ class EmulatorTests(unittest.TestCase):
         e = self.emulator
         for x in range(SCREEN_WIDTH):
             for y in range(SCREEN_HEIGHT):
-                e.screen[x][y] = random.choice([True, False])
+                e.set_pixel(x, y, random.choice([True, False]))
         e.execute_program(0x00E0)
 
         for x in range(SCREEN_WIDTH):
             for y in range(SCREEN_HEIGHT):
-                self.assertEqual(e.screen[x][y], False)
+                self.assertEqual(e.get_pixel(x, y), False)
+                self.assertEqual(self.shared_pixel(x, y), False)
 
     def test_skip_if_pressed(self):
         e = self.emulator
         e.v_reg[5] = 8
-        with e.key_down_values[8].get_lock():
-            e.key_down_values[8].value = True
+        self.keypad.press(8)
         e.program_counter = 0x205
         e.execute_program(0xE59E)
         self.assertEqual(e.program_counter, 0x209)
@@ -376,8 +381,7 @@ class EmulatorTests(unittest.TestCase):
     def test_not_skip_if_not_pressed(self):
         e = self.emulator
         e.v_reg[5] = 8
-        with e.key_down_values[8].get_lock():
-            e.key_down_values[8].value = False
+        self.keypad.release(8)
         e.program_counter = 0x205
         e.execute_program(0xE59E)
         self.assertEqual(e.program_counter, 0x207)
@@ -385,8 +389,7 @@ class EmulatorTests(unittest.TestCase):
     def test_skip_if_not_pressed(self):
         e = self.emulator
         e.v_reg[5] = 8
-        with e.key_down_values[8].get_lock():
-            e.key_down_values[8].value = False
+        self.keypad.release(8)
         e.program_counter = 0x205
         e.execute_program(0xE5A1)
         self.assertEqual(e.program_counter, 0x209)
@@ -394,8 +397,7 @@ class EmulatorTests(unittest.TestCase):
     def test_not_skip_if_pressed(self):
         e = self.emulator
         e.v_reg[5] = 8
-        with e.key_down_values[8].get_lock():
-            e.key_down_values[8].value = True
+        self.keypad.press(8)
         e.program_counter = 0x205
         e.execute_program(0xE5A1)
         self.assertEqual(e.program_counter, 0x207)
@@ -417,7 +419,7 @@ class EmulatorTests(unittest.TestCase):
 
         for x in range(3):
             for y in range(3):
-                self.assertEqual(e.screen[start_x + x][start_y + y], True)
+                self.assertEqual(e.get_pixel(start_x + x, start_y + y), True)
         self.assertEqual(e.v_reg[0xF], 0)
 
     def test_draw_sprite_collision(self):
@@ -433,13 +435,13 @@ class EmulatorTests(unittest.TestCase):
         e.v_reg[0] = start_x
         e.v_reg[1] = start_y
 
-        e.screen[1][1] = True
+        e.set_pixel(1, 1, True)
 
         e.execute_program(0xD013)
 
         for x in range(3):
             for y in range(3):
-                self.assertEqual(e.screen[start_x + x][start_y + y],
+                self.assertEqual(e.get_pixel(start_x + x, start_y + y),
                                  x != 1 or y != 1)
         self.assertEqual(e.v_reg[0xF], 1)
 
@@ -461,8 +463,9 @@ class EmulatorTests(unittest.TestCase):
         for x in range(3):
             for y in range(3):
                 self.assertEqual(
-                    e.screen[(start_x + x + SCREEN_WIDTH) % SCREEN_WIDTH][
-                        (start_y + y + SCREEN_HEIGHT) % SCREEN_HEIGHT], True)
+                    e.get_pixel((start_x + x + SCREEN_WIDTH) % SCREEN_WIDTH,
+                                (start_y + y + SCREEN_HEIGHT) % SCREEN_HEIGHT),
+                    True)
         self.assertEqual(e.v_reg[0xF], 0)
 
     def test_draw_sprite_out_of_bounds_plus(self):
@@ -483,10 +486,27 @@ class EmulatorTests(unittest.TestCase):
         for x in range(3):
             for y in range(3):
                 self.assertEqual(
-                    e.screen[(start_x + x + SCREEN_WIDTH) % SCREEN_WIDTH][
-                        (start_y + y + SCREEN_HEIGHT) % SCREEN_HEIGHT], True)
+                    e.get_pixel((start_x + x + SCREEN_WIDTH) % SCREEN_WIDTH,
+                                (start_y + y + SCREEN_HEIGHT) % SCREEN_HEIGHT),
+                    True)
         self.assertEqual(e.v_reg[0xF], 0)
 
+    def test_draw_sprite_wraps_row(self):
+        e = self.emulator
+        e.memory[0x200] = 0b10110001
+        e.i_reg = 0x200
+        e.v_reg[0] = SCREEN_WIDTH - 3
+        e.v_reg[1] = 5
+        e.execute_program(0xD011)
+
+        for x, expected in zip([SCREEN_WIDTH - 3, SCREEN_WIDTH - 2,
+                                SCREEN_WIDTH - 1, 0, 1, 2, 3, 4],
+                               [1, 0, 1, 1, 0, 0, 0, 1]):
+            self.assertEqual(e.get_pixel(x, 5), bool(expected))
+        for x in range(SCREEN_WIDTH):
+            for y in range(SCREEN_HEIGHT):
+                self.assertEqual(self.shared_pixel(x, y), e.get_pixel(x, y))
+
     # 6150 - v[1] = 0x50
     # 621F - v[2] = 0x1F
     # 7211 - add 0x11 to v[2], v[2] == 0x30
@@ -530,6 +550,374 @@ class EmulatorTests(unittest.TestCase):
         self.emulator.execute_program(0xF807)
         self.assertTrue(self.emulator.v_reg[8] >= timer_time / 2)
 
+    def test_keys_received_sixty_times_a_second_without_delay(self):
+        e = self.emulator
+        # 1200 - jump to 0x200
+        e.load_program(b'\x12\x00')
+        polls = []
+        events = self.keypad.events
+
+        def counted_events(timeout=0):
+            polls.append(timeout)
+            return events(timeout)
+
+        self.keypad.events = counted_events
+        e.run(30 * e.instructions_per_frame)
+        self.assertEqual(polls, [0])
+        self.keypad.press(5)
+        time.sleep(1 / 60)
+        e.run(e.instructions_per_frame)
+        self.assertEqual(polls, [0, 0])
+        self.assertTrue(e.keys[5])
+
+    def test_shared_framebuffer_row_sequences(self):
+        e = self.emulator
+        e.memory[0x300:0x303] = b'\xFF\xFF\xFF'
+        e.i_reg = 0x300
+        e.v_reg[0] = 10
+        e.v_reg[1] = SCREEN_HEIGHT - 1
+        e.execute_program(0xD013)
+        sequence, pixels, row_sequences, shape = self.pixels_state.read()
+        self.assertEqual(self.pixels_state.generation, 1)
+        self.assertEqual([y for y in range(SCREEN_HEIGHT)
+                          if row_sequences[y] == sequence],
+                         [0, 1, SCREEN_HEIGHT - 1])
+        self.assertEqual(pixels[1:3], b'\x3F\xC0')
+        e.execute_program(0x00E0)
+        sequence, pixels, row_sequences, shape = self.pixels_state.read()
+        self.assertEqual(self.pixels_state.generation, 2)
+        self.assertEqual(set(row_sequences), {sequence})
+        self.assertEqual(sum(pixels), 0)
+
+    def test_frame_counted_timers(self):
+        e = CHIP8Emulator(self.pixels_state,
+                          self.keypad,
+                          Event(),
+                          False, False,
+                          instructions_per_frame=5)
+        self.assertIsNone(e.delay_timer)
+        e.v_reg[5] = 3
+        e.execute_program(0xF515)
+        # 1200 - jump to itself
+        e.load_program(b'\x12\x00')
+        e.program_counter = 0x200
+        e.run(5 * 2)
+        e.execute_program(0xF807)
+        self.assertEqual(e.v_reg[8], 1)
+        e.program_counter = 0x200
+        e.run(5 * 2)
+        e.execute_program(0xF807)
+        self.assertEqual(e.v_reg[8], 0)
+
+    def test_frame_counted_wait_and_set_pressed_key(self):
+        e = CHIP8Emulator(self.pixels_state,
+                          self.keypad,
+                          Event(),
+                          False, False,
+                          instructions_per_frame=5)
+        # F50A - wait for a key and set it to v[5]
+        e.load_program(b'\xF5\x0A')
+        e.run(3)
+        self.assertEqual(e.program_counter, 0x200)
+        self.keypad.press(0xB)
+        e.run(1)
+        self.assertEqual(e.program_counter, 0x202)
+        self.assertEqual(e.v_reg[5], 0xB)
+
+    def test_wait_and_set_pressed_key(self):
+        e = self.emulator
+        self.keypad.press(0x3)
+        self.keypad.release(0x3)
+        # F50A - wait for a key and set it to v[5]
+        e.load_program(b'\xF5\x0A')
+        e.program_counter = 0x200
+        # Waits block, so the press is sent before it starts
+        threading.Timer(0.05, self.keypad.press, (0xC,)).start()
+        e.step()
+        self.assertEqual(e.program_counter, 0x202)
+        self.assertEqual(e.v_reg[5], 0xC)
+
+    def test_load_state(self):
+        e = self.emulator
+        e.delay_timer_value.value = 7
+        e.set_pixel(3, 4, True)
+        state = e.save_state()
+        e.clear_screen()
+        e.delay_timer_value.value = 0
+        e.load_state(state)
+        self.assertTrue(self.shared_pixel(3, 4))
+        self.assertEqual(e.delay_timer_value.value, 7)
+
+    def test_beeps_follow_frames(self):
+        with tempfile.TemporaryDirectory() as directory:
+            beep_path = os.path.join(directory, 'beeps.wav')
+            e = CHIP8Emulator(self.pixels_state,
+                              self.keypad,
+                              Event(),
+                              False, True,
+                              instructions_per_frame=2,
+                              beep_path=beep_path)
+            self.assertIsNone(e.beeper_loader)
+            # 6503 - v[5] = 3
+            # 6000 - v[0] = 0
+            # F518 - set sound timer to v[5]
+            # 1206 - jump to 0x206
+            e.load_program(b'\x65\x03\x60\x00\xF5\x18\x12\x06')
+            e.run(2)
+            e.beeper_loader.join()
+            e.run(20)
+            e.on_terminate()
+
+            with wave.open(beep_path) as beeps:
+                samples = beeps.readframes(beeps.getnframes())
+        frame_bytes = 2 * audio.SAMPLE_RATE // 60
+        # The first frame opens the output, it may be ready for that frame
+        self.assertIn(len(samples) // frame_bytes, (10, 11))
+        samples = samples[-10 * frame_bytes:]
+        self.assertTrue(all(samples[:2 * frame_bytes]))
+        self.assertFalse(any(samples[2 * frame_bytes:]))
+
+    def test_real_time_beeps_last_as_long_without_delay(self):
+        with tempfile.TemporaryDirectory() as directory:
+            beep_path = os.path.join(directory, 'beeps.wav')
+            e = CHIP8Emulator(self.pixels_state,
+                              self.keypad,
+                              Event(),
+                              False, True,
+                              beep_path=beep_path)
+            # 651E - v[5] = 30
+            # F518 - set sound timer to v[5]
+            # 1204 - jump to 0x204
+            e.load_program(b'\x65\x1E\xF5\x18\x12\x04')
+            start = time.perf_counter()
+            while time.perf_counter() - start < 1:
+                e.run(1000)
+            e.on_terminate()
+            elapsed = time.perf_counter() - start
+
+            with wave.open(beep_path) as beeps:
+                seconds = beeps.getnframes() / beeps.getframerate()
+                samples = beeps.readframes(beeps.getnframes())
+        sounding = sum(1 for i in range(0, len(samples), 2)
+                       if samples[i:i + 2] != b'\0\0')
+        # Thousands of instructions ran per beeper frame, still the 30
+        # frames of the sound timer beep for half a second of samples
+        self.assertGreater(e.instruction_count, 1000 * 60)
+        self.assertAlmostEqual(sounding / audio.SAMPLE_RATE, 29 / 60,
+                               delta=1 / 60)
+        self.assertLess(seconds, elapsed + 0.1)
+
+    def test_rewind(self):
+        rewind_event = Event()
+        e = CHIP8Emulator(self.pixels_state,
+                          self.keypad,
+                          Event(),
+                          False, False,
+                          instructions_per_frame=2,
+                          rewind_event=rewind_event,
+                          rewind_seconds=1)
+        # 7001 - add 1 to v[0], 1200 - jump to 0x200
+        e.load_program(b'\x70\x01\x12\x00')
+        for _ in range(5):
+            e.run(2)
+        self.assertEqual(e.v_reg[0], 5)
+        rewind_event.set()
+        e.run(2)
+        e.run(2)
+        self.assertEqual(e.v_reg[0], 4)
+        self.assertEqual(e.frame_count, 4)
+        rewind_event.clear()
+        e.run(2)
+        self.assertEqual(e.v_reg[0], 5)
+
+
+class CoreTests(unittest.TestCase):
+    # 6150 - v[1] = 0x50
+    # 621F - v[2] = 0x1F
+    # 7211 - add 0x11 to v[2], v[2] == 0x30
+    # 8124 - add v[2] to v[1], v[1] == 0x80, v[2] == 0x30
+    program = b'\x61\x50\x62\x1F\x72\x11\x81\x24'
+
+    # 6000 - v[0] = 0
+    # 6100 - v[1] = 0
+    # 7003 - add 3 to v[0]     <- loop
+    # 8104 - add v[0] to v[1]
+    # 40F0 - skip next if v[0] != 0xF0
+    # 0000 - halt
+    # 1204 - jump to loop
+    loop_program = b'\x60\x00\x61\x00\x70\x03\x81\x04\x40\xF0' \
+                   b'\x00\x00\x12\x04'
+
+    def test_execute(self):
+        for use_block_cache in (False, True):
+            e = CHIP8Core(use_block_cache=use_block_cache)
+            e.load_program(self.program)
+            self.assertRaises(OpCodeNotFoundError, e.execute)
+            self.assertEqual(e.v_reg[1], 0x80)
+            self.assertEqual(e.v_reg[2], 0x30)
+            self.assertEqual(e.v_reg[0xf], 0)
+
+    def test_stack_errors(self):
+        # 6001 - v[0] = 1, 00EE - return with an empty stack
+        # 2200 - call 0x200 until the stack is full
+        for program, count in ((b'\x60\x01\x00\xEE', 1),
+                               (b'\x22\x00', 16)):
+            for use_block_cache in (False, True):
+                e = CHIP8Core(use_block_cache=use_block_cache)
+                e.load_program(program)
+                self.assertRaises(StackError, e.run, 20)
+                self.assertEqual(e.instruction_count, count)
+                self.assertEqual(e.program_counter, 0x200 + 2 * (count % 2))
+                state = e.save_state()
+                other = CHIP8Core()
+                other.load_state(state)
+                self.assertEqual(other.save_state(), state)
+
+    def test_run(self):
+        e = CHIP8Core()
+        e.load_program(self.program)
+        e.run(3)
+        self.assertEqual(e.program_counter, 0x206)
+        self.assertEqual(e.instruction_count, 3)
+        self.assertEqual(e.v_reg[2], 0x30)
+        self.assertEqual(e.v_reg[1], 0x50)
+
+    def test_block_cache_loop(self):
+        results = []
+        for use_block_cache in (False, True):
+            e = CHIP8Core(use_block_cache=use_block_cache)
+            e.load_program(self.loop_program)
+            self.assertRaises(OpCodeNotFoundError, e.execute)
+            results.append((list(e.v_reg), e.program_counter))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[1][0][1], sum(range(3, 0xF1, 3)) & 0xFF)
+
+    def test_block_cache_run_is_exact(self):
+        e = CHIP8Core(use_block_cache=True)
+        e.load_program(self.loop_program)
+        for count in (1, 2, 3, 5, 7, 11, 13):
+            e.run(count)
+        self.assertEqual(e.instruction_count, 42)
+        self.assertEqual(e.frame_count, 4)
+        expected = CHIP8Core()
+        expected.load_program(self.loop_program)
+        expected.run(42)
+        self.assertEqual(e.v_reg, expected.v_reg)
+        self.assertEqual(e.program_counter, expected.program_counter)
+
+    def test_block_cache_self_modifying_code(self):
+        # 6A00 - v[A] = 0          <- patched block
+        # 7A01 - add 1 to v[A], patched to add 0x10
+        # 3B01 - skip next if v[B] == 1
+        # 1210 - jump to 0x210
+        # 0000 - halt
+        # ...
+        # 6B01 - v[B] = 1
+        # 6010 - v[0] = 0x10
+        # A203 - I = 0x203
+        # F055 - write v[0] to I
+        # 1200 - jump to 0x200
+        e = CHIP8Core(use_block_cache=True)
+        e.load_program(b'\x6A\x00\x7A\x01\x3B\x01\x12\x10\x00\x00'
+                       b'\x00\x00\x00\x00\x00\x00'
+                       b'\x6B\x01\x60\x10\xA2\x03\xF0\x55\x12\x00')
+        self.assertRaises(OpCodeNotFoundError, e.execute)
+        self.assertEqual(e.v_reg[0xA], 0x10)
+        self.assertEqual(e.program_counter, 0x208)
+
+    def test_framebuffer_bytes(self):
+        e = CHIP8Core()
+        e.set_pixel(0, 0, True)
+        e.set_pixel(9, 0, True)
+        e.set_pixel(SCREEN_WIDTH - 1, SCREEN_HEIGHT - 1, True)
+        packed = e.framebuffer_bytes()
+        self.assertEqual(len(packed), SCREEN_WIDTH * SCREEN_HEIGHT // 8)
+        self.assertEqual(packed[:2], b'\x80\x40')
+        self.assertEqual(packed[-1], 0x01)
+        self.assertEqual(sum(packed[2:-1]), 0)
+
+    def test_timers_count_frames(self):
+        e = CHIP8Core(instructions_per_frame=4)
+        e.v_reg[0] = 3
+        e.execute_program(0xF015)
+        e.execute_program(0xF018)
+        # 1200 - jump to itself
+        e.load_program(b'\x12\x00')
+        e.program_counter = 0x200
+        e.run(4 * 2)
+        self.assertEqual(e.delay_timer_value, 1)
+        self.assertEqual(e.sound_timer_value, 1)
+        e.run(4 * 2)
+        self.assertEqual(e.delay_timer_value, 0)
+        self.assertEqual(e.sound_timer_value, 0)
+        self.assertEqual(e.frame_count, 4)
+
+    def test_wait_and_set_pressed_key(self):
+        e = CHIP8Core()
+        e.press_key(3)
+        # F50A - wait for a key and set it to v[5]
+        e.load_program(b'\xF5\x0A')
+        e.run(5)
+        self.assertEqual(e.program_counter, 0x200)
+        e.press_key(0xC)
+        e.run(1)
+        self.assertEqual(e.program_counter, 0x202)
+        self.assertEqual(e.v_reg[5], 0xC)
+
+    def test_skip_if_pressed(self):
+        e = CHIP8Core()
+        e.v_reg[5] = 8
+        e.press_key(8)
+        e.execute_program(0xE59E)
+        self.assertEqual(e.program_counter, 0x204)
+        e.release_key(8)
+        e.execute_program(0xE59E)
+        self.assertEqual(e.program_counter, 0x206)
+
+    def test_save_and_load_state(self):
+        e = CHIP8Core(instructions_per_frame=7)
+        # 6530 - v[5] = 0x30
+        # F515 - set delay timer to v[5]
+        # 2206 - call 0x206
+        # 7003 - add 3 to v[0]     <- loop
+        # 1206 - jump to loop
+        e.load_program(b'\x65\x30\xF5\x15\x22\x06\x70\x03\x12\x06')
+        e.run(23)
+        state = e.save_state()
+        e.run(40)
+        expected = e.save_state()
+
+        e.load_state(state)
+        self.assertEqual(e.save_state(), state)
+        e.run(40)
+        self.assertEqual(e.save_state(), expected)
+
+        forked = CHIP8Core(instructions_per_frame=7)
+        forked.load_state(state)
+        forked.run(40)
+        self.assertEqual(forked.save_state(), expected)
+        self.assertEqual(forked.stack_pointer, 1)
+        self.assertGreater(forked.delay_timer_value, 0)
+
+    def test_load_state_invalidates_blocks(self):
+        e = CHIP8Core(use_block_cache=True)
+        e.load_program(b'\x70\x01\x12\x00')
+        state = e.save_state()
+        e.run(10)
+        # 7002 - add 2 to v[0] in place of 7001
+        e.load_program(b'\x70\x02\x12\x00')
+        e.run(10)
+        e.load_state(state)
+        e.run(10)
+        self.assertEqual(e.v_reg[0], 5)
+
+    def test_load_state_rejects_other_data(self):
+        e = CHIP8Core()
+        state = bytearray(e.save_state())
+        self.assertRaises(ValueError, e.load_state, state[:-1])
+        state[4] += 1
+        self.assertRaises(ValueError, e.load_state, bytes(state))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,99 @@
+# !/usr/bin/env python3
+import unittest
+
+try:
+    import env
+except ImportError:  # NumPy is not installed
+    env = None
+
+# 6000 - v[0] = 0
+# A300 - I = 0x300
+# E09E - skip next if key v[0] is pressed     <- loop
+# 120E - jump to draw
+# 7101 - add 1 to v[1]
+# F133 - store v[1] as BCD at I
+# 1204 - jump to loop
+# A000 - I = 0 (font sprite of 0)             <- draw
+# D015 - draw it at v[0], v[0]
+# A300 - I = 0x300
+# 1204 - jump to loop
+SCORE_ROM = bytes([0x60, 0x00, 0xA3, 0x00,
+                   0xE0, 0x9E, 0x12, 0x0E, 0x71, 0x01, 0xF1, 0x33,
+                   0x12, 0x04,
+                   0xA0, 0x00, 0xD0, 0x05, 0xA3, 0x00, 0x12, 0x04])
+
+
+@unittest.skipIf(env is None, "NumPy is not installed")
+class EnvTests(unittest.TestCase):
+    def test_reset_and_step(self):
+        chip8_env = env.CHIP8Env(SCORE_ROM, frame_skip=2,
+                                 score=env.bcd_score(0x300),
+                                 max_frames=6, instructions_per_frame=10)
+        observation = chip8_env.reset()
+        self.assertEqual(observation.shape, (32, 8))
+        self.assertFalse(observation.any())
+
+        observation, reward, done, info = chip8_env.step(env.NO_KEY)
+        self.assertEqual(observation[0, 0], 0xF0)
+        self.assertEqual(reward, 0)
+        self.assertFalse(done)
+        self.assertEqual(info['frame'], 2)
+
+        observation, reward, done, info = chip8_env.step(0)
+        self.assertGreater(reward, 0)
+        self.assertEqual(chip8_env.core.keys[0], True)
+        _, _, done, _ = chip8_env.step(env.NO_KEY)
+        self.assertFalse(chip8_env.core.keys[0])
+        self.assertTrue(done)
+
+    def test_unpacked_observation(self):
+        chip8_env = env.CHIP8Env(SCORE_ROM, frame_skip=2, unpacked=True)
+        chip8_env.reset()
+        observation, _, _, _ = chip8_env.step(env.NO_KEY)
+        self.assertEqual(observation.shape, (32, 64))
+        self.assertEqual(observation[0, :5].tolist(), [1, 1, 1, 1, 0])
+
+    def test_error_ends_episode(self):
+        chip8_env = env.CHIP8Env(b'\x00\x00')
+        chip8_env.reset()
+        _, _, done, info = chip8_env.step(env.NO_KEY)
+        self.assertTrue(done)
+        self.assertIn('error', info)
+
+    def test_ram_hooks(self):
+        chip8_env = env.CHIP8Env(SCORE_ROM)
+        chip8_env.reset()
+        chip8_env.core.memory[0x300:0x302] = b'\x01\x02'
+        self.assertEqual(env.ram_score(0x300, 2)(chip8_env.core), 0x102)
+        self.assertEqual(env.bcd_score(0x300, 2)(chip8_env.core), 12)
+        self.assertTrue(env.ram_equals(0x301, 2)(chip8_env.core))
+
+    def test_vector_env_matches_env(self):
+        kwargs = dict(frame_skip=3, score=env.bcd_score(0x300),
+                      max_frames=12)
+        actions = [[0, env.NO_KEY, 5]] * 3 + [[env.NO_KEY, 0, 0]] * 3
+        with env.VectorEnv(SCORE_ROM, 3, workers=2, **kwargs) as vector_env:
+            observations = vector_env.reset()
+            self.assertEqual(observations.shape, (3, 32, 8))
+            results = []
+            for step_actions in actions:
+                observations, rewards, dones = vector_env.step(step_actions)
+                results.append((observations.copy(), rewards.tolist(),
+                                dones.tolist()))
+
+        for index in range(3):
+            chip8_env = env.CHIP8Env(SCORE_ROM, **kwargs)
+            chip8_env.reset()
+            for step_actions, (observations, rewards, dones) in zip(
+                    actions, results):
+                observation, reward, done, _ = chip8_env.step(
+                    step_actions[index])
+                self.assertEqual(dones[index], done)
+                self.assertEqual(rewards[index], reward)
+                if done:
+                    observation = chip8_env.reset()
+                self.assertTrue((observations[index] == observation).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+# !/usr/bin/env python3
+import unittest
+
+from core import CHIP8Core
+from idle import IdleLoopSkipper
+
+# 6005 - v[0] = 5
+# F015 - set delay timer to v[0]
+# F107 - v[1] = delay timer              <- loop
+# 3100 - skip next if v[1] == 0
+# 1204 - jump to loop
+# 7201 - add 1 to v[2]
+# 1200 - jump to start
+TIMER_ROM = bytes.fromhex('6005F015F107310012047201' '1200')
+
+# E09E - skip next if key v[0] is pressed     <- loop
+# 1200 - jump to loop
+# 7101 - add 1 to v[1]
+# 1206 - jump to itself
+KEYS_ROM = bytes.fromhex('E09E12007101' '1206')
+
+
+class IdleLoopSkipperTests(unittest.TestCase):
+    def run_cores(self, program, steps, between=None):
+        """Runs the program with and without skipping idle loops in the
+        given batches of instructions and checks their states match."""
+        cores = []
+        for use_block_cache in (False, True):
+            cores.append(CHIP8Core(7, use_block_cache))
+            cores.append(CHIP8Core(7, use_block_cache,
+                                   skip_idle_loops=True))
+        for core in cores:
+            core.load_program(program)
+        for i, instructions in enumerate(steps):
+            for core in cores:
+                if between is not None:
+                    between(i, core)
+                core.run(instructions)
+            states = [core.save_state() for core in cores]
+            self.assertEqual(states[1:], states[:-1])
+        return cores
+
+    def test_timer_polling(self):
+        cores = self.run_cores(TIMER_ROM, [1, 2, 3, 5, 13, 100, 7, 1000])
+        self.assertGreater(cores[1].v_reg[2], 0)
+        self.assertGreater(cores[1].idle_loop_skipper.skipped, 0)
+
+    def test_key_polling(self):
+        def between(i, core):
+            if i == 3:
+                core.press_key(0)
+
+        cores = self.run_cores(KEYS_ROM, [3, 50, 11, 1, 9, 100], between)
+        self.assertEqual(cores[1].v_reg[1], 1)
+        self.assertEqual(cores[1].program_counter, 0x206)
+        self.assertGreater(cores[1].idle_loop_skipper.skipped, 100)
+
+    def test_find_loop(self):
+        core = CHIP8Core()
+        core.load_program(TIMER_ROM)
+        skipper = IdleLoopSkipper(core, core.interpret)
+        self.assertIsNone(skipper.find_loop(0x200))
+        for address in (0x204, 0x206, 0x208):
+            self.assertEqual(skipper.find_loop(address), (0x204, 3))
+        self.assertIsNone(skipper.find_loop(0x20A))
+        self.assertIsNone(skipper.find_loop(0x20C))
+
+    def test_memory_writes_invalidate_loops(self):
+        core = CHIP8Core(skip_idle_loops=True)
+        # 1200 - jump to itself
+        core.load_program(b'\x12\x00')
+        core.run(20)
+        self.assertEqual(core.idle_loop_skipper.skipped, 18)
+        # 7001 - add 1 to v[0], 1200 - jump to 0x200
+        core.load_program(b'\x70\x01\x12\x00')
+        core.run(20)
+        self.assertEqual(core.v_reg[0], 10)
+        self.assertEqual(core.idle_loop_skipper.skipped, 18)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+# !/usr/bin/env python3
+import os
+import unittest
+
+from keypad import SharedKeypad
+
+
+class SharedKeypadTests(unittest.TestCase):
+    def setUp(self):
+        self.keypad = SharedKeypad()
+
+    def test_state(self):
+        self.keypad.press(0x0)
+        self.keypad.press(0xF)
+        self.keypad.release(0x0)
+        self.assertEqual(self.keypad.state.value, 0x8000)
+        self.assertTrue(self.keypad.is_pressed(0xF))
+        self.assertFalse(self.keypad.is_pressed(0x0))
+
+    def test_events_in_order(self):
+        self.assertEqual(self.keypad.events(), [])
+        self.keypad.press(0xA)
+        self.keypad.release(0xA)
+        self.keypad.press(0x1)
+        self.assertEqual(self.keypad.events(),
+                         [(0xA, True), (0xA, False), (0x1, True)])
+        self.assertEqual(self.keypad.events(), [])
+
+    @unittest.skipUnless(os.name == 'posix', 'needs a non-blocking pipe')
+    def test_undrained_events_are_dropped(self):
+        # Far more events than a pipe buffers
+        for _ in range(100000):
+            self.keypad.press(0x2)
+            self.keypad.release(0x2)
+        self.keypad.press(0x5)
+        self.assertEqual(self.keypad.state.value, 1 << 0x5)
+        events = self.keypad.events()
+        self.assertLess(len(events), 200000)
+        self.assertEqual(events[:2], [(0x2, True), (0x2, False)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+# !/usr/bin/env python3
+import subprocess
+import sys
+import unittest
+
+
+class StartupTests(unittest.TestCase):
+    def imported_modules(self, code):
+        return subprocess.run(
+            [sys.executable, '-c',
+             code + '; import sys; print(" ".join(sys.modules))'],
+            capture_output=True, text=True, check=True).stdout.split()
+
+    def test_main_imports_no_gui_or_audio(self):
+        modules = self.imported_modules('import main; main.parse_args')
+        self.assertNotIn('PyQt5', modules)
+        self.assertNotIn('screen', modules)
+        self.assertNotIn('kivy', modules)
+        self.assertNotIn('sound_timer', modules)
+
+    def test_headless_tools_import_no_gui(self):
+        modules = self.imported_modules('import chip8')
+        self.assertNotIn('PyQt5', modules)
+        self.assertNotIn('emulator', modules)
+        self.assertNotIn('block_cache', modules)
+
+    def test_rewind_needs_paced_frames(self):
+        output = subprocess.run(
+            [sys.executable, 'main.py', 'missing.ch8', '-d', '-r', '5'],
+            capture_output=True, text=True, check=True).stdout
+        self.assertIn('cannot be used with -d', output)
+
+    def test_startup_profile(self):
+        import main
+        startup_profile = main.StartupProfile(enabled=True)
+        startup_profile.mark('first')
+        startup_profile.mark('second')
+        self.assertEqual([phase for phase, _ in startup_profile.phases],
+                         ['first', 'second'])
+        self.assertTrue(all(duration >= 0
+                            for _, duration in startup_profile.phases))
+
+
+if __name__ == '__main__':
+    unittest.main()
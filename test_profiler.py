@@ -0,0 +1,67 @@
+# !/usr/bin/env python3
+import unittest
+
+from core import CHIP8Core, OpCodeNotFoundError
+from profiler import Profiler, opcode_family
+
+# v1 += 1 and a draw, looped forever
+LOOP_ROM = bytes([0x71, 0x01, 0xD0, 0x15, 0x12, 0x00])
+
+
+class ProfilerTests(unittest.TestCase):
+    def setUp(self):
+        self.core = CHIP8Core(instructions_per_frame=10,
+                              use_block_cache=True)
+        self.core.load_program(LOOP_ROM)
+        self.profiler = Profiler(self.core)
+
+    def test_opcode_family(self):
+        self.assertEqual(opcode_family(0x8124), '8xy4')
+        self.assertEqual(opcode_family(0xF355), 'Fx55')
+        self.assertEqual(opcode_family(0xE19E), 'Ex9E')
+        self.assertEqual(opcode_family(0x00E0), '00E0')
+        self.assertEqual(opcode_family(0xD125), 'Dxyn')
+
+    def test_engine_is_swapped_only_while_enabled(self):
+        engine = self.core.engine
+        self.profiler.enable()
+        self.assertNotEqual(self.core.engine, engine)
+        self.profiler.disable()
+        self.assertEqual(self.core.engine, engine)
+
+    def test_counts(self):
+        self.profiler.enable()
+        self.core.run(30)
+        self.profiler.disable()
+        self.core.run(30)
+
+        report = self.profiler.report()
+        self.assertEqual(report['instructions'], 30)
+        self.assertEqual(report['families']['7xkk']['count'], 10)
+        self.assertEqual(report['families']['Dxyn']['handler'],
+                         'draw_sprite')
+        self.assertEqual(sorted(entry['address'] for entry
+                                in report['hot_addresses']),
+                         [0x200, 0x202, 0x204])
+        self.assertEqual(self.core.instruction_count, 60)
+        self.assertEqual(self.core.v_reg[1], 20)
+
+    def test_collapsed_stacks(self):
+        self.profiler.enable()
+        self.core.run(3)
+        lines = self.profiler.collapsed_stacks()
+        self.assertEqual([line.rsplit(' ', 1)[0] for line in lines],
+                         ['7xkk;increment;0x200',
+                          'Dxyn;draw_sprite;0x202',
+                          '1nnn;jump;0x204'])
+
+    def test_error_keeps_instruction_count(self):
+        self.core.load_program(bytes([0x71, 0x01, 0x00, 0x00]))
+        self.profiler.enable()
+        with self.assertRaises(OpCodeNotFoundError):
+            self.core.run(5)
+        self.assertEqual(self.core.instruction_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
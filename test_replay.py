@@ -0,0 +1,105 @@
+# !/usr/bin/env python3
+import os
+import tempfile
+import unittest
+from multiprocessing import Event
+
+from core import CHIP8Core
+from emulator import CHIP8Emulator
+from keypad import SharedKeypad
+from replay import InputRecorder, Recording, replay
+from shared_framebuffer import SharedFramebuffer
+
+# C07F - v[0] = random & 0x7F     <- loop
+# E19E - skip next if key v[1] is pressed
+# 1208 - jump to 0x208
+# 7201 - add 1 to v[2]
+# 8304 - add v[0] to v[3]
+# 1200 - jump to loop
+KEYS_ROM = bytes([0xC0, 0x7F, 0xE1, 0x9E, 0x12, 0x08,
+                  0x72, 0x01, 0x83, 0x04, 0x12, 0x00])
+
+
+class ReplayTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'keys.c8in')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_seeded_random(self):
+        results = []
+        for _ in range(2):
+            e = CHIP8Core(seed=42)
+            e.load_program(KEYS_ROM)
+            e.run(500)
+            results.append(e.v_reg[3])
+        self.assertEqual(results[0], results[1])
+
+    def test_replay_core(self):
+        e = CHIP8Core(instructions_per_frame=7, seed=5)
+        e.load_program(KEYS_ROM)
+        e.input_recorder = InputRecorder(self.path, KEYS_ROM, 5, 7)
+        e.run(100)
+        e.press_key(0)
+        e.run(31)
+        e.release_key(0)
+        e.run(50)
+        e.press_key(0)
+        e.input_recorder.close()
+
+        recording = Recording.load(self.path)
+        self.assertEqual(recording.program, KEYS_ROM)
+        self.assertEqual(recording.events, [(100, 0, True),
+                                            (131, 0, False),
+                                            (181, 0, True)])
+        for use_block_cache in (False, True):
+            replayed = replay(recording, use_block_cache=use_block_cache)
+            self.assertEqual(replayed.instruction_count, 181)
+            self.assertTrue(replayed.keys[0])
+            e.run(0)
+            self.assertEqual(replayed.save_state(), e.save_state())
+
+    def test_replay_emulator(self):
+        keypad = SharedKeypad()
+        e = CHIP8Emulator(SharedFramebuffer(), keypad, Event(), False, False,
+                          instructions_per_frame=10, seed=7)
+        e.load_program(KEYS_ROM)
+        e.input_recorder = InputRecorder(self.path, KEYS_ROM, 7, 10)
+        e.run(95)
+        keypad.press(0)
+        e.run(95)
+        keypad.release(0)
+        e.run(100)
+        e.input_recorder.close()
+        self.assertGreater(e.v_reg[2], 0)
+
+        recording = Recording.load(self.path)
+        self.assertEqual(recording.events, [(100, 0, True),
+                                            (200, 0, False)])
+        replayed = replay(recording, instructions=290)
+        self.assertEqual(replayed.save_state(), e.save_state())
+
+    def test_taps_within_a_frame_are_recorded(self):
+        keypad = SharedKeypad()
+        e = CHIP8Emulator(SharedFramebuffer(), keypad, Event(), False, False,
+                          instructions_per_frame=10, seed=7)
+        e.load_program(KEYS_ROM)
+        e.input_recorder = InputRecorder(self.path, KEYS_ROM, 7, 10)
+        e.run(5)
+        keypad.press(3)
+        keypad.release(3)
+        e.run(10)
+        e.input_recorder.close()
+        self.assertEqual(Recording.load(self.path).events,
+                         [(10, 3, True), (10, 3, False)])
+
+    def test_load_rejects_other_files(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a recording')
+        self.assertRaises(ValueError, Recording.load, self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# !/usr/bin/env python3
+import unittest
+
+from core import CHIP8Core
+from rewind import RewindBuffer
+
+# A sprite moving over the screen
+DRAW_ROM = bytes([0xA0, 0x00, 0x60, 0x00, 0x61, 0x00,
+                  0xD0, 0x15, 0x70, 0x03, 0x71, 0x01, 0x12, 0x06])
+
+
+class RewindBufferTests(unittest.TestCase):
+    def setUp(self):
+        self.core = CHIP8Core(instructions_per_frame=5)
+        self.core.load_program(DRAW_ROM)
+
+    def record(self, rewind_buffer, frames):
+        states = []
+        for _ in range(frames):
+            self.core.run_frames(1)
+            state = self.core.save_state()
+            states.append(state)
+            rewind_buffer.push(state)
+        return states
+
+    def test_pop_returns_states_backwards(self):
+        rewind_buffer = RewindBuffer(seconds=1, frame_rate=60,
+                                     keyframe_interval=8)
+        states = self.record(rewind_buffer, 20)
+        self.assertEqual(len(rewind_buffer), 20)
+        for state in reversed(states):
+            self.assertEqual(rewind_buffer.pop(), state)
+        self.assertIsNone(rewind_buffer.pop())
+        self.assertEqual(len(rewind_buffer), 0)
+
+    def test_push_after_pop(self):
+        rewind_buffer = RewindBuffer(keyframe_interval=4)
+        states = self.record(rewind_buffer, 6)
+        rewind_buffer.pop()
+        rewind_buffer.pop()
+        self.core.load_state(states[3])
+        new_states = self.record(rewind_buffer, 3)
+        self.assertEqual([rewind_buffer.pop() for _ in range(7)],
+                         new_states[::-1] + states[3::-1])
+
+    def test_capacity_drops_oldest_keyframes(self):
+        rewind_buffer = RewindBuffer(seconds=1, frame_rate=10,
+                                     keyframe_interval=4)
+        states = self.record(rewind_buffer, 25)
+        self.assertLessEqual(len(rewind_buffer), 10)
+        self.assertGreaterEqual(len(rewind_buffer), 10 - 4)
+        kept = [rewind_buffer.pop() for _ in range(len(rewind_buffer))]
+        self.assertEqual(kept, states[:-len(kept) - 1:-1])
+
+    def test_deltas_are_small(self):
+        rewind_buffer = RewindBuffer(keyframe_interval=60)
+        states = self.record(rewind_buffer, 60)
+        self.assertLess(rewind_buffer.size(),
+                        len(states) * len(states[0]) // 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# !/usr/bin/env python3
+import unittest
+from multiprocessing import Event
+
+from core import CHIP8Core
+from emulator import CHIP8Emulator
+from keypad import SharedKeypad
+from scheduler import FrameScheduler, CATCH_UP, DROP
+from shared_framebuffer import SharedFramebuffer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.now += seconds
+
+
+class SlowCore(CHIP8Core):
+    def __init__(self, clock, frame_seconds, slow_frames=None):
+        super().__init__(instructions_per_frame=4)
+        self.clock = clock
+        self.frame_seconds = frame_seconds
+        self.slow_frames = slow_frames or {}
+        # 1200 - jump to itself
+        self.load_program(b'\x12\x00')
+
+    def run(self, instructions):
+        super().run(instructions)
+        self.clock.now += self.slow_frames.get(self.frame_count,
+                                               self.frame_seconds)
+
+
+class SchedulerTests(unittest.TestCase):
+    def test_paces_frames(self):
+        clock = FakeClock()
+        core = SlowCore(clock, 0.004)
+        s = FrameScheduler(core, clock=clock, sleep=clock.sleep)
+        s.run(60)
+        self.assertEqual(core.instruction_count, 60 * 4)
+        self.assertEqual(core.frame_count, 60)
+        self.assertAlmostEqual(clock.now, 1.0)
+        self.assertAlmostEqual(clock.slept, 1.0 - 60 * 0.004)
+        self.assertEqual(s.dropped_frames, 0)
+
+    def test_target_ips(self):
+        clock = FakeClock()
+        core = SlowCore(clock, 0)
+        s = FrameScheduler(core, target_ips=1200, clock=clock,
+                           sleep=clock.sleep)
+        s.run(30)
+        self.assertEqual(core.instruction_count, 600)
+        self.assertAlmostEqual(clock.now, 0.5)
+
+    def test_target_ips_frames_are_core_frames(self):
+        clock = FakeClock()
+        e = CHIP8Emulator(SharedFramebuffer(), SharedKeypad(), Event(),
+                          use_sound=False, target_ips=1200,
+                          start_timers=False)
+        e.load_program(b'\x12\x00')
+        self.assertEqual(e.instructions_per_frame, 20)
+        FrameScheduler(e, e.target_ips, clock=clock,
+                       sleep=clock.sleep).run(60)
+        self.assertEqual(e.instruction_count, 1200)
+        self.assertEqual(e.frame_count, 60)
+
+    def test_target_ips_disagrees_with_frame_length(self):
+        self.assertRaises(ValueError, CHIP8Emulator, SharedFramebuffer(),
+                          SharedKeypad(), Event(), use_sound=False,
+                          instructions_per_frame=10, target_ips=1200)
+        e = CHIP8Emulator(SharedFramebuffer(), SharedKeypad(), Event(),
+                          use_sound=False, instructions_per_frame=20,
+                          target_ips=1200)
+        self.assertEqual(e.instructions_per_frame, 20)
+
+    def test_catch_up(self):
+        clock = FakeClock()
+        core = SlowCore(clock, 0, {2: 3 / 60})
+        s = FrameScheduler(core, policy=CATCH_UP, clock=clock,
+                           sleep=clock.sleep)
+        s.run(10)
+        self.assertAlmostEqual(clock.now, 10 / 60)
+        self.assertEqual(s.dropped_frames, 0)
+
+    def test_drop(self):
+        clock = FakeClock()
+        core = SlowCore(clock, 0, {2: 3 / 60})
+        s = FrameScheduler(core, policy=DROP, clock=clock,
+                           sleep=clock.sleep)
+        s.run(10)
+        self.assertAlmostEqual(clock.now, 12 / 60)
+        self.assertEqual(s.dropped_frames, 2)
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, FrameScheduler, CHIP8Core(),
+                          policy='rewind')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# !/usr/bin/env python3
+import os
+import signal
+import tempfile
+import unittest
+from multiprocessing import Event
+from unittest import mock
+
+import tracer
+from core import CHIP8Core, OpCodeNotFoundError
+from emulator import EmulatorProcess
+from keypad import SharedKeypad
+from shared_framebuffer import SharedFramebuffer
+from tracer import TraceRecorder, read_trace, first_difference
+
+# 6005 - v[0] = 5
+# F015 - set delay timer to v[0]
+# C1FF - v[1] = random byte          <- loop
+# 7201 - add 1 to v[2]
+# A300 - I = 0x300
+# 1204 - jump to loop
+PROGRAM = bytes.fromhex('6005F015C1FF7201A3001204')
+
+
+class TraceRecorderTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def trace(self, name, instructions, seed=1, program=PROGRAM):
+        path = os.path.join(self.directory.name, name)
+        core = CHIP8Core(instructions_per_frame=4, seed=seed)
+        core.load_program(program)
+        with TraceRecorder(core, path):
+            core.run(instructions)
+        return path, core
+
+    def test_records(self):
+        path, core = self.trace('a.c8tr', 10)
+        records = list(read_trace(path))
+        self.assertEqual(len(records), 10)
+        self.assertEqual([record.address for record in records[:6]],
+                         [0x200, 0x202, 0x204, 0x206, 0x208, 0x20A])
+        self.assertEqual(records[0].opcode, 0x6005)
+        self.assertEqual(records[0].changed, 1 << 0)
+        self.assertEqual(records[1].changed, 0)
+        self.assertEqual(records[3].changed, 1 << 2)
+        self.assertEqual(records[4].i_reg, 0x300)
+        self.assertEqual(records[1].delay_timer, 5)
+        self.assertEqual(records[4].delay_timer, 4)
+        self.assertEqual(records[-1].v_reg, bytes(core.v_reg))
+        self.assertEqual(core.engine, core.interpret)
+
+    def test_chunks(self):
+        with mock.patch.object(tracer, 'CHUNK_RECORDS', 7):
+            path, core = self.trace('a.c8tr', 100)
+        records = list(read_trace(path))
+        self.assertEqual(len(records), 100)
+        self.assertEqual(records[-1].v_reg[2], core.v_reg[2])
+
+    def test_error_keeps_records(self):
+        # 6001 - v[0] = 1, 0000 - not an opcode
+        path = os.path.join(self.directory.name, 'a.c8tr')
+        core = CHIP8Core()
+        core.load_program(bytes.fromhex('60010000'))
+        with TraceRecorder(core, path):
+            self.assertRaises(OpCodeNotFoundError, core.run, 10)
+        self.assertEqual([record.opcode for record in read_trace(path)],
+                         [0x6001])
+
+    def test_terminating_the_process_keeps_the_last_records(self):
+        # 7001 - add 1 to v[0], F015 - set delay timer to v[0]
+        # 1200 - jump to 0x200
+        path = os.path.join(self.directory.name, 'a.c8tr')
+        process = EmulatorProcess(SharedFramebuffer(), SharedKeypad(),
+                                  Event(), False, False,
+                                  bytes.fromhex('7001F0151200'),
+                                  instructions_per_frame=10,
+                                  trace_path=path)
+        e = process.emulator
+        timer_values = e._timer_values
+
+        def terminate_at_50():
+            # SIGTERM arrives while the tracer is running
+            if e.v_reg[0] == 50:
+                process._on_sigterm(signal.SIGTERM, None)
+            return timer_values()
+
+        e._timer_values = terminate_at_50
+        handler = signal.getsignal(signal.SIGTERM)
+        try:
+            self.assertRaises(SystemExit, process.run)
+        finally:
+            signal.signal(signal.SIGTERM, handler)
+        records = list(read_trace(path))
+        self.assertEqual(len(records), 3 * 49 + 1)
+        self.assertEqual(records[-1].opcode, 0x7001)
+        self.assertEqual(records[-1].v_reg[0], 50)
+
+    def test_first_difference(self):
+        path_a, _ = self.trace('a.c8tr', 50)
+        path_b, _ = self.trace('b.c8tr', 50)
+        self.assertIsNone(first_difference(path_a, path_b))
+        path_c, _ = self.trace('c.c8tr', 50, seed=2)
+        index, record_a, record_c = first_difference(path_a, path_c)
+        self.assertEqual(index, 2)
+        self.assertEqual(record_a.opcode, 0xC1FF)
+        path_d, _ = self.trace('d.c8tr', 40)
+        self.assertEqual(first_difference(path_a, path_d)[0], 40)
+        self.assertIsNone(first_difference(path_a, path_d)[2])
+
+    def test_read_rejects_other_files(self):
+        path = os.path.join(self.directory.name, 'a.c8tr')
+        with open(path, 'wb') as f:
+            f.write(b'not a trace at all, not at all')
+        self.assertRaises(ValueError, list, read_trace(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
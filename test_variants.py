@@ -0,0 +1,260 @@
+# !/usr/bin/env python3
+import unittest
+from multiprocessing import Event
+
+import disasm
+import font
+from core import CHIP8Core, CHIP8, SUPERCHIP, XOCHIP, HIRES_WIDTH, \
+    HIRES_HEIGHT, SCREEN_WIDTH, SCREEN_HEIGHT, BIG_FONT_START, \
+    OpCodeNotFoundError
+from emulator import CHIP8Emulator
+from keypad import SharedKeypad
+from shared_framebuffer import SharedFramebuffer
+
+
+def program(*opcodes):
+    return b''.join(opcode.to_bytes(2, 'big') for opcode in opcodes)
+
+
+class SuperChipTests(unittest.TestCase):
+    def setUp(self):
+        self.core = CHIP8Core(variant=SUPERCHIP)
+
+    def test_unknown_variant(self):
+        self.assertRaises(ValueError, CHIP8Core, variant='chip48')
+
+    def test_chip8_has_no_superchip_opcodes(self):
+        core = CHIP8Core(variant=CHIP8)
+        self.assertRaises(OpCodeNotFoundError, core.execute_program, 0x00FF)
+        self.assertRaises(OpCodeNotFoundError, core.execute_program, 0xF030)
+
+    def test_switch_resolution(self):
+        c = self.core
+        c.framebuffer[0] = 1
+        c.execute_program(0x00FF)
+        self.assertEqual((c.screen_width, c.screen_height),
+                         (HIRES_WIDTH, HIRES_HEIGHT))
+        self.assertEqual(c.framebuffer, [0] * HIRES_HEIGHT)
+        self.assertEqual(len(c.framebuffer_bytes()),
+                         HIRES_WIDTH * HIRES_HEIGHT // 8)
+        c.execute_program(0x00FE)
+        self.assertEqual((c.screen_width, c.screen_height),
+                         (SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.assertEqual(c.framebuffer, [0] * SCREEN_HEIGHT)
+
+    def test_draw_16x16_sprite(self):
+        c = self.core
+        c.execute_program(0x00FF)
+        c.memory[0x300:0x320] = b'\x80\x01' * 16
+        c.i_reg = 0x300
+        c.v_reg[0] = 120
+        c.v_reg[1] = 60
+        c.execute_program(0xD010)
+        self.assertEqual(c.v_reg[0xF], 0)
+        # Wraps around both edges
+        for y in (60, 63, 0, 11):
+            self.assertTrue(c.get_pixel(120, y))
+            self.assertTrue(c.get_pixel(7, y))
+            self.assertFalse(c.get_pixel(6, y))
+        self.assertFalse(c.get_pixel(120, 12))
+        c.execute_program(0xD010)
+        self.assertEqual(c.v_reg[0xF], 1)
+        self.assertEqual(c.framebuffer, [0] * HIRES_HEIGHT)
+
+    def test_scroll(self):
+        c = self.core
+        c.execute_program(0x00FF)
+        c.framebuffer[0] = 0xF0 << 60
+        c.execute_program(0x00C3)
+        self.assertEqual(c.framebuffer[3], 0xF0 << 60)
+        self.assertEqual(c.framebuffer[:3], [0] * 3)
+        self.assertEqual(len(c.framebuffer), HIRES_HEIGHT)
+        c.execute_program(0x00FB)
+        self.assertEqual(c.framebuffer[3], 0xF0 << 56)
+        c.execute_program(0x00FC)
+        c.execute_program(0x00FC)
+        self.assertEqual(c.framebuffer[3], 0xF0 << 64)
+        c.framebuffer[3] = 0xF << 124
+        c.execute_program(0x00FC)
+        self.assertEqual(c.framebuffer[3], 0)
+
+    def test_big_font(self):
+        c = self.core
+        c.v_reg[3] = 7
+        c.execute_program(0xF330)
+        self.assertEqual(c.i_reg, BIG_FONT_START + 70)
+        self.assertEqual(list(c.memory[c.i_reg:c.i_reg + 10]),
+                         font.BIG_FONT[7])
+
+    def test_flags(self):
+        c = self.core
+        c.v_reg[:4] = [1, 2, 3, 4]
+        c.execute_program(0xF275)
+        c.v_reg[:4] = [0] * 4
+        c.execute_program(0xF385)
+        self.assertEqual(c.v_reg[:4], [1, 2, 3, 0])
+
+    def test_exit_halts(self):
+        c = self.core
+        c.load_program(program(0x00FD))
+        c.run(5)
+        self.assertEqual(c.program_counter, 0x200)
+        self.assertEqual(c.instruction_count, 5)
+
+    def test_save_and_load_state(self):
+        c = self.core
+        c.execute_program(0x00FF)
+        c.framebuffer[63] = 1 << 127
+        c.flags[2] = 9
+        state = c.save_state()
+        other = CHIP8Core(variant=SUPERCHIP)
+        other.load_state(state)
+        self.assertEqual(other.screen_width, HIRES_WIDTH)
+        self.assertEqual(other.framebuffer, c.framebuffer)
+        self.assertEqual(other.flags[2], 9)
+        self.assertEqual(other.save_state(), state)
+        self.assertRaises(ValueError, CHIP8Core().load_state, state)
+
+
+class XOChipTests(unittest.TestCase):
+    def setUp(self):
+        self.core = CHIP8Core(variant=XOCHIP)
+
+    def test_memory(self):
+        c = self.core
+        self.assertEqual(len(c.memory), 0x10000)
+        c.i_reg = 0xFFFE
+        c.v_reg[:3] = [1, 2, 3]
+        c.execute_program(0xF255)
+        self.assertEqual(c.memory[0xFFFE:], b'\x01\x02')
+        self.assertEqual(c.memory[0], 3)
+
+    def test_long_i(self):
+        c = self.core
+        c.load_program(program(0xF000, 0x8123, 0x6001))
+        c.run(2)
+        self.assertEqual(c.i_reg, 0x8123)
+        self.assertEqual(c.v_reg[0], 1)
+
+    def test_skip_over_long_i(self):
+        c = self.core
+        c.load_program(program(0x3000, 0xF000, 0x8123, 0x6101))
+        c.run(2)
+        self.assertEqual(c.i_reg, 0)
+        self.assertEqual(c.v_reg[1], 1)
+
+    def test_register_ranges(self):
+        c = self.core
+        c.i_reg = 0x400
+        c.v_reg[2:5] = [7, 8, 9]
+        c.execute_program(0x5422)
+        self.assertEqual(c.memory[0x400:0x403], b'\x09\x08\x07')
+        c.execute_program(0x5793)
+        self.assertEqual(c.v_reg[7:10], [9, 8, 7])
+        self.assertEqual(c.i_reg, 0x400)
+
+    def test_planes(self):
+        c = self.core
+        c.memory[0x300:0x302] = b'\x80\x40'
+        c.i_reg = 0x300
+        c.execute_program(0xF301)
+        c.execute_program(0xD011)
+        self.assertEqual(c.planes[0][0], 1 << 63)
+        self.assertEqual(c.planes[1][0], 1 << 62)
+        c.execute_program(0xF201)
+        c.execute_program(0x00E0)
+        self.assertEqual(c.planes[0][0], 1 << 63)
+        self.assertEqual(c.planes[1][0], 0)
+        c.execute_program(0xF001)
+        c.execute_program(0xD011)
+        self.assertEqual(c.v_reg[0xF], 0)
+        self.assertEqual(c.planes[0][0], 1 << 63)
+
+    def test_scroll_up(self):
+        c = self.core
+        c.execute_program(0xF301)
+        c.planes[0][5] = c.planes[1][5] = 1
+        c.execute_program(0x00D4)
+        self.assertEqual(c.planes[0][1], 1)
+        self.assertEqual(c.planes[1][1], 1)
+        self.assertEqual(len(c.planes[1]), SCREEN_HEIGHT)
+
+    def test_program_counter_crosses_4k(self):
+        for use_block_cache in (False, True):
+            core = CHIP8Core(use_block_cache=use_block_cache,
+                             variant=XOCHIP)
+            # 6001 - v[0] = 1, 6102 - v[1] = 2, F000 FFFE - I = 0xFFFE
+            core.memory[0xFFE:0x1006] = program(0x6001, 0x6102, 0xF000,
+                                                0xFFFE)
+            core.program_counter = 0xFFE
+            core.run(3)
+            self.assertEqual(core.v_reg[:2], [1, 2])
+            self.assertEqual(core.i_reg, 0xFFFE)
+            self.assertEqual(core.program_counter, 0x1006)
+            # 6203 - v[2] = 3 wraps around to 0x0000
+            core.memory[0xFFFE:] = program(0x6203)
+            core.memory[0:2] = program(0x6304)
+            core.program_counter = 0xFFFE
+            core.run(2)
+            self.assertEqual(core.v_reg[2:4], [3, 4])
+            self.assertEqual(core.program_counter, 2)
+
+    def test_block_cache_runs_the_same(self):
+        rom = program(0x00FF, 0xA300, 0xF301, 0x6000, 0x6100,
+                      0xD010, 0x00C1, 0x00FB, 0x7001, 0x3010,
+                      0xF000, 0x0400, 0x5012, 0x1208)
+        states = []
+        for use_block_cache in (False, True):
+            core = CHIP8Core(use_block_cache=use_block_cache,
+                             variant=XOCHIP)
+            core.load_program(rom)
+            core.memory[0x300:0x340] = bytes(range(0x40))
+            core.run(1000)
+            states.append(core.save_state())
+        self.assertEqual(states[0], states[1])
+
+    def test_disassembly(self):
+        disassembly = disasm.Disassembly(
+            program(0x3000, 0xF000, 0x8123, 0x00FF, 0x00FD),
+            variant=XOCHIP)
+        block = disassembly.blocks[0x200]
+        self.assertEqual(block.successors,
+                         [(0x202, disasm.FALL_THROUGH), (0x206, disasm.SKIP)])
+        listing = '\n'.join(disassembly.listing())
+        self.assertIn('LD I, 0x8123', listing)
+        self.assertIn('HIGH', listing)
+        self.assertIn('EXIT', listing)
+        self.assertEqual(disasm.mnemonic(0xF301, XOCHIP), 'PLANE 3')
+        self.assertIsNone(disasm.mnemonic(0xF301))
+
+
+class SharedScreenTests(unittest.TestCase):
+    def test_publish_hires_planes(self):
+        pixels_state = SharedFramebuffer()
+        e = CHIP8Emulator(pixels_state, SharedKeypad(), Event(), False,
+                          False, instructions_per_frame=10,
+                          variant=XOCHIP)
+        e.execute_program(0x00FF)
+        e.execute_program(0xF301)
+        e.memory[0x300:0x304] = b'\xFF\xFF\x0F\x0F'
+        e.i_reg = 0x300
+        e.v_reg[1] = 63
+        e.execute_program(0xD012)
+        sequence, pixels, row_sequences, shape = pixels_state.read()
+        self.assertEqual(shape, (HIRES_WIDTH, HIRES_HEIGHT, 2))
+        self.assertEqual(len(row_sequences), HIRES_HEIGHT)
+        row_bytes = HIRES_WIDTH // 8
+        plane_bytes = row_bytes * HIRES_HEIGHT
+        self.assertEqual(pixels[63 * row_bytes], 0xFF)
+        self.assertEqual(pixels[0], 0xFF)
+        self.assertEqual(pixels[plane_bytes + 63 * row_bytes], 0x0F)
+        self.assertEqual([y for y in range(HIRES_HEIGHT)
+                          if row_sequences[y] == sequence], [0, 63])
+        e.execute_program(0x00C1)
+        sequence, pixels, row_sequences, shape = pixels_state.read()
+        self.assertEqual(set(row_sequences), {sequence})
+        self.assertEqual(pixels[row_bytes], 0xFF)
+
+
+if __name__ == '__main__':
+    unittest.main()
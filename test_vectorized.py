@@ -0,0 +1,60 @@
+# !/usr/bin/env python3
+import random
+import unittest
+
+from bench import WORKLOADS
+
+try:
+    import vectorized
+except ImportError:  # NumPy is not installed
+    vectorized = None
+
+
+@unittest.skipIf(vectorized is None, "NumPy is not installed")
+class VectorCoreTests(unittest.TestCase):
+    def test_workloads_match_core(self):
+        programs = [program for name, program in sorted(WORKLOADS.items())]
+        self.assertEqual(vectorized.verify(programs, 2000, 7), [])
+
+    def test_random_programs_match_core(self):
+        generator = random.Random(1)
+        programs = []
+        for _ in range(200):
+            program = bytearray(generator.getrandbits(8) for _ in range(64))
+            for i in range(0, len(program), 2):
+                # Cxkk random numbers differ from those of CHIP8Core
+                if program[i] >> 4 == 0xC:
+                    program[i] ^= 0x40
+            programs.append(bytes(program))
+        self.assertEqual(vectorized.verify(programs, 300, 7), [])
+
+    def test_stack_errors_match_core(self):
+        # 00EE on an empty stack, 2200 calls until the stack is full
+        programs = [b'\x70\x01\x00\xEE', b'\x70\x01\x22\x00']
+        self.assertEqual(vectorized.verify(programs, 100, 7), [])
+
+    def test_failing_instances_stop(self):
+        vector_core = vectorized.VectorCore(2)
+        vector_core.load_programs([b'\x70\x01\x00\x00',
+                                   b'\x70\x01\x12\x00'])
+        vector_core.run(10)
+        self.assertEqual(vector_core.failed.tolist(), [True, False])
+        self.assertEqual(vector_core.program_counter.tolist(),
+                         [0x202, 0x200])
+        self.assertEqual(vector_core.instruction_counts.tolist(), [1, 10])
+        self.assertEqual(vector_core.v_reg[:, 0].tolist(), [1, 5])
+
+    def test_wait_for_key(self):
+        vector_core = vectorized.VectorCore(2)
+        # F50A - wait for a key and set it to v[5]
+        vector_core.load_program(b'\xF5\x0A')
+        vector_core.run(3)
+        vector_core.press_key(0xB, instances=[1])
+        vector_core.run(1)
+        self.assertEqual(vector_core.program_counter.tolist(),
+                         [0x200, 0x202])
+        self.assertEqual(vector_core.v_reg[:, 5].tolist(), [0, 0xB])
+
+
+if __name__ == '__main__':
+    unittest.main()
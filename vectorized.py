@@ -0,0 +1,389 @@
+# !/usr/bin/env python3
+import numpy as np
+
+import font
+from core import CHIP8Core, EmulatorError, SCREEN_WIDTH, SCREEN_HEIGHT, \
+    PROGRAM_START, MEMORY_SIZE, INSTRUCTIONS_PER_FRAME, STATE_FORMAT, \
+    STATE_MAGIC, STATE_VERSION
+
+
+class VectorCore:
+    """Many CHIP8Core instances run in lockstep on NumPy arrays.
+
+    Every step fetches one opcode per instance, groups the instances by
+    the first digit of their opcode and executes each group with masked
+    array updates. Opcodes behave as in CHIP8Core, so instance_state
+    matches save_state of a core running the same program, except for
+    Cxkk, whose random numbers come from one NumPy generator. Instances
+    stop at an opcode CHIP8Core would fail at and are marked in failed.
+    """
+
+    def __init__(self, instances,
+                 instructions_per_frame=INSTRUCTIONS_PER_FRAME, seed=None):
+        self.instances = instances
+        self.memory = np.zeros((instances, MEMORY_SIZE), np.uint8)
+        self.memory[:, :5 * len(font.FONT)] = np.array(
+            [byte for digit in font.FONT for byte in digit], np.uint8)
+
+        self.v_reg = np.zeros((instances, 16), np.int32)
+        self.i_reg = np.zeros(instances, np.int32)
+        self.program_counter = np.full(instances, PROGRAM_START, np.int32)
+        self.stack_pointer = np.zeros(instances, np.int32)
+        self.stack = np.zeros((instances, 16), np.int32)
+
+        self.delay_timer_value = np.zeros(instances, np.int32)
+        self.sound_timer_value = np.zeros(instances, np.int32)
+
+        self.instructions_per_frame = instructions_per_frame
+        self.instruction_count = 0
+        self.frame_cycle = 0
+        # Failed instances stop counting instructions
+        self.instruction_counts = np.zeros(instances, np.int64)
+
+        # Packed rows, the leftmost pixel in the highest bit, as in CHIP8Core
+        self.framebuffer = np.zeros((instances, SCREEN_HEIGHT), np.uint64)
+
+        self.keys = np.zeros((instances, 16), bool)
+        # -1 when no key has been pressed
+        self.pressed_key = np.full(instances, -1, np.int32)
+        self.waiting_for_key = np.zeros(instances, bool)
+
+        self.failed = np.zeros(instances, bool)
+        self.random = np.random.default_rng(seed)
+
+        self.programs_by_first_digit = [
+            self._execute_0, self._execute_1, self._execute_2,
+            self._execute_3, self._execute_4, self._execute_5,
+            self._execute_6, self._execute_7, self._execute_8,
+            self._execute_9, self._execute_a, self._execute_b,
+            self._execute_c, self._execute_d, self._execute_e,
+            self._execute_f]
+
+    def load_program(self, program_bytes):
+        """Loads the same program into every instance."""
+        self.memory[:, PROGRAM_START:PROGRAM_START + len(program_bytes)] = \
+            np.frombuffer(bytes(program_bytes), np.uint8)
+
+    def load_programs(self, programs):
+        """Loads a program per instance."""
+        for index, program_bytes in enumerate(programs):
+            self.memory[index,
+                        PROGRAM_START:PROGRAM_START + len(program_bytes)] = \
+                np.frombuffer(bytes(program_bytes), np.uint8)
+
+    def press_key(self, key, instances=slice(None)):
+        self.keys[instances, key] = True
+        self.pressed_key[instances] = key
+
+    def release_key(self, key, instances=slice(None)):
+        self.keys[instances, key] = False
+
+    def run(self, instructions):
+        for _ in range(instructions):
+            self.step()
+
+    def run_frames(self, frames):
+        self.run(frames * self.instructions_per_frame)
+
+    def step(self):
+        rows = np.flatnonzero(~self.failed)
+        if len(rows):
+            pc = self.program_counter[rows]
+            opcodes = (self.memory[rows, pc].astype(np.int32) << 8) | \
+                self.memory[rows, (pc + 1) & 0xFFF]
+            next_pc = pc + 2
+            first_digits = opcodes >> 12
+            for digit in np.unique(first_digits):
+                selected = first_digits == digit
+                next_pc[selected] = self.programs_by_first_digit[digit](
+                    rows[selected], opcodes[selected], pc[selected])
+            active = ~self.failed[rows]
+            self.program_counter[rows[active]] = next_pc[active] & 0xFFF
+            self.instruction_counts[rows[active]] += 1
+
+        self.instruction_count += 1
+        self.frame_cycle += 1
+        if self.frame_cycle == self.instructions_per_frame:
+            self.frame_cycle = 0
+            self.tick_timers()
+
+    def tick_timers(self):
+        active = ~self.failed
+        self.delay_timer_value[active & (self.delay_timer_value > 0)] -= 1
+        self.sound_timer_value[active & (self.sound_timer_value > 0)] -= 1
+
+    def instance_state(self, index):
+        """Returns the state of an instance in the format of save_state."""
+        count = int(self.instruction_counts[index])
+        pressed_key = int(self.pressed_key[index])
+        return STATE_FORMAT.pack(
+            STATE_MAGIC, STATE_VERSION, self.memory[index].tobytes(),
+            self.v_reg[index].astype(np.uint8).tobytes(),
+            *self.stack[index].tolist(), int(self.i_reg[index]),
+            int(self.program_counter[index]),
+            int(self.stack_pointer[index]),
+            int(self.delay_timer_value[index]),
+            int(self.sound_timer_value[index]),
+            bool(self.waiting_for_key[index]), pressed_key + 1,
+            count, count // self.instructions_per_frame,
+            count % self.instructions_per_frame,
+            *self.framebuffer[index].tolist())
+
+    def _fail(self, rows, pc, next_pc, invalid):
+        self.failed[rows[invalid]] = True
+        next_pc[invalid] = pc[invalid]
+        return next_pc
+
+    # 00E0, 00EE
+    def _execute_0(self, rows, opcodes, pc):
+        next_pc = pc + 2
+        clear = opcodes == 0x00E0
+        self.framebuffer[rows[clear]] = 0
+
+        # 00EE on an empty stack fails, as the StackError of CHIP8Core
+        back = (opcodes == 0x00EE) & (self.stack_pointer[rows] > 0)
+        returning = rows[back]
+        stack_pointer = self.stack_pointer[returning] - 1
+        self.stack_pointer[returning] = stack_pointer
+        next_pc[back] = self.stack[returning, stack_pointer] + 2
+        return self._fail(rows, pc, next_pc, ~(clear | back))
+
+    # 1nnn
+    def _execute_1(self, rows, opcodes, pc):
+        return opcodes & 0xFFF
+
+    # 2nnn
+    def _execute_2(self, rows, opcodes, pc):
+        next_pc = opcodes & 0xFFF
+        stack_pointer = self.stack_pointer[rows]
+        # The stack of CHIP8Core is a list of 16 addresses
+        overflow = stack_pointer >= len(self.stack[0])
+        calling = ~overflow
+        self.stack[rows[calling], stack_pointer[calling]] = pc[calling]
+        self.stack_pointer[rows[calling]] += 1
+        return self._fail(rows, pc, next_pc, overflow)
+
+    # 3xkk
+    def _execute_3(self, rows, opcodes, pc):
+        v = self.v_reg[rows, (opcodes >> 8) & 0xF]
+        return pc + 2 + 2 * (v == (opcodes & 0xFF))
+
+    # 4xkk
+    def _execute_4(self, rows, opcodes, pc):
+        v = self.v_reg[rows, (opcodes >> 8) & 0xF]
+        return pc + 2 + 2 * (v != (opcodes & 0xFF))
+
+    # 5xy0
+    def _execute_5(self, rows, opcodes, pc):
+        vx = self.v_reg[rows, (opcodes >> 8) & 0xF]
+        vy = self.v_reg[rows, (opcodes >> 4) & 0xF]
+        return self._fail(rows, pc, pc + 2 + 2 * (vx == vy),
+                          (opcodes & 0xF) != 0)
+
+    # 6xkk
+    def _execute_6(self, rows, opcodes, pc):
+        self.v_reg[rows, (opcodes >> 8) & 0xF] = opcodes & 0xFF
+        return pc + 2
+
+    # 7xkk
+    def _execute_7(self, rows, opcodes, pc):
+        x = (opcodes >> 8) & 0xF
+        self.v_reg[rows, x] = (self.v_reg[rows, x] + (opcodes & 0xFF)) & 0xFF
+        return pc + 2
+
+    # 8xyN
+    def _execute_8(self, rows, opcodes, pc):
+        v = self.v_reg
+        last_digits = opcodes & 0xF
+        for last_digit in np.unique(last_digits):
+            selected = last_digits == last_digit
+            r = rows[selected]
+            x = (opcodes[selected] >> 8) & 0xF
+            y = (opcodes[selected] >> 4) & 0xF
+            # Flags are written before the result, as in CHIP8Core
+            if last_digit == 0x0:
+                v[r, x] = v[r, y]
+            elif last_digit == 0x1:
+                v[r, x] = v[r, x] | v[r, y]
+            elif last_digit == 0x2:
+                v[r, x] = v[r, x] & v[r, y]
+            elif last_digit == 0x3:
+                v[r, x] = v[r, x] ^ v[r, y]
+            elif last_digit == 0x4:
+                result = v[r, x] + v[r, y]
+                v[r, 0xF] = result > 0xFF
+                v[r, x] = result & 0xFF
+            elif last_digit == 0x5:
+                result = v[r, x] - v[r, y]
+                v[r, 0xF] = result >= 0
+                v[r, x] = result & 0xFF
+            elif last_digit == 0x6:
+                v[r, 0xF] = v[r, x] & 1
+                v[r, x] = v[r, x] >> 1
+            elif last_digit == 0x7:
+                result = v[r, y] - v[r, x]
+                v[r, 0xF] = result >= 0
+                v[r, x] = result & 0xFF
+            elif last_digit == 0xE:
+                v[r, 0xF] = (v[r, x] & 0x80) != 0
+                v[r, x] = (v[r, x] << 1) & 0xFF
+        valid = np.isin(last_digits, (0, 1, 2, 3, 4, 5, 6, 7, 0xE))
+        return self._fail(rows, pc, pc + 2, ~valid)
+
+    # 9xy0
+    def _execute_9(self, rows, opcodes, pc):
+        vx = self.v_reg[rows, (opcodes >> 8) & 0xF]
+        vy = self.v_reg[rows, (opcodes >> 4) & 0xF]
+        return self._fail(rows, pc, pc + 2 + 2 * (vx != vy),
+                          (opcodes & 0xF) != 0)
+
+    # Annn
+    def _execute_a(self, rows, opcodes, pc):
+        self.i_reg[rows] = opcodes & 0xFFF
+        return pc + 2
+
+    # Bnnn
+    def _execute_b(self, rows, opcodes, pc):
+        return (opcodes & 0xFFF) + self.v_reg[rows, 0]
+
+    # Cxkk
+    def _execute_c(self, rows, opcodes, pc):
+        self.v_reg[rows, (opcodes >> 8) & 0xF] = \
+            self.random.integers(0, 256, len(rows)) & (opcodes & 0xFF)
+        return pc + 2
+
+    # Dxyn
+    def _execute_d(self, rows, opcodes, pc):
+        x = (self.v_reg[rows, (opcodes >> 8) & 0xF] % SCREEN_WIDTH) \
+            .astype(np.uint64)
+        y = self.v_reg[rows, (opcodes >> 4) & 0xF]
+        heights = opcodes & 0xF
+        i_reg = self.i_reg[rows]
+        collision = np.zeros(len(rows), bool)
+        for i in range(heights.max(initial=0)):
+            drawing = heights > i
+            r = rows[drawing]
+            line = self.memory[r, (i_reg[drawing] + i) & 0xFFF] \
+                .astype(np.uint64) << np.uint64(SCREEN_WIDTH - 8)
+            # Rotate the sprite line right, so it wraps around the screen.
+            # Shifts are taken modulo 64, a rotation by 0 ors line with itself
+            shift = x[drawing]
+            line = (line >> shift) | \
+                (line << ((np.uint64(SCREEN_WIDTH) - shift) %
+                          np.uint64(SCREEN_WIDTH)))
+            row = (y[drawing] + i) % SCREEN_HEIGHT
+            collision[drawing] |= (self.framebuffer[r, row] & line) != 0
+            self.framebuffer[r, row] ^= line
+        self.v_reg[rows, 0xF] = collision
+        return pc + 2
+
+    # Ex9E, ExA1
+    def _execute_e(self, rows, opcodes, pc):
+        keys = self.v_reg[rows, (opcodes >> 8) & 0xF]
+        last_digits = opcodes & 0xFF
+        # Keys past 0xF are out of the keys list of CHIP8Core
+        invalid = ((last_digits != 0x9E) & (last_digits != 0xA1)) | \
+            (keys > 0xF)
+        pressed = self.keys[rows, keys & 0xF]
+        skip = np.where(last_digits == 0x9E, pressed, ~pressed)
+        return self._fail(rows, pc, pc + 2 + 2 * skip, invalid)
+
+    # FxNN
+    def _execute_f(self, rows, opcodes, pc):
+        v = self.v_reg
+        next_pc = pc + 2
+        last_digits = opcodes & 0xFF
+        invalid = np.zeros(len(rows), bool)
+        for last_digit in np.unique(last_digits):
+            selected = last_digits == last_digit
+            r = rows[selected]
+            x = (opcodes[selected] >> 8) & 0xF
+            if last_digit == 0x07:
+                v[r, x] = self.delay_timer_value[r] & 0xFF
+            elif last_digit == 0x0A:
+                self._wait_for_key(r, x, selected, pc, next_pc)
+            elif last_digit == 0x15:
+                self.delay_timer_value[r] = v[r, x]
+            elif last_digit == 0x18:
+                setting = v[r, x] != 1
+                self.sound_timer_value[r[setting]] = v[r[setting],
+                                                       x[setting]]
+            elif last_digit == 0x1E:
+                new_i = self.i_reg[r] + v[r, x]
+                self.i_reg[r] = new_i & 0xFFFF
+                v[r, 0xF] = (new_i & 0x10000) != 0
+            elif last_digit == 0x29:
+                self.i_reg[r] = v[r, x] * 5
+            elif last_digit == 0x33:
+                self._store_bcd(r, x, selected, invalid)
+            elif last_digit == 0x55:
+                for i in range(x.max() + 1):
+                    storing = x >= i
+                    self.memory[r[storing],
+                                (self.i_reg[r[storing]] + i) & 0xFFF] = \
+                        v[r[storing], i]
+            elif last_digit == 0x65:
+                for i in range(x.max() + 1):
+                    loading = x >= i
+                    v[r[loading], i] = self.memory[
+                        r[loading], (self.i_reg[r[loading]] + i) & 0xFFF]
+            else:
+                invalid |= selected
+        return self._fail(rows, pc, next_pc, invalid)
+
+    # Fx0A
+    def _wait_for_key(self, r, x, selected, pc, next_pc):
+        starting = ~self.waiting_for_key[r]
+        self.waiting_for_key[r[starting]] = True
+        self.pressed_key[r[starting]] = -1
+        pressed_key = self.pressed_key[r]
+        waiting = pressed_key < 0
+        # Execute this opcode again until a key is pressed
+        indices = np.flatnonzero(selected)
+        next_pc[indices[waiting]] = pc[indices[waiting]]
+        done = ~waiting
+        self.waiting_for_key[r[done]] = False
+        self.v_reg[r[done], x[done]] = pressed_key[done] & 0xFF
+
+    # Fx33
+    def _store_bcd(self, r, x, selected, invalid):
+        i_reg = self.i_reg[r]
+        # CHIP8Core does not wrap the digits around the memory
+        overflow = i_reg + 2 >= MEMORY_SIZE
+        invalid[np.flatnonzero(selected)[overflow]] = True
+        storing = ~overflow
+        r, i_reg = r[storing], i_reg[storing]
+        value = self.v_reg[r, x[storing]]
+        self.memory[r, i_reg] = value // 100
+        self.memory[r, i_reg + 1] = value % 100 // 10
+        self.memory[r, i_reg + 2] = value % 10
+
+
+def verify(programs, instructions,
+           instructions_per_frame=INSTRUCTIONS_PER_FRAME):
+    """Runs the programs on a VectorCore and on CHIP8Core instances and
+    returns the indices of the programs whose final states differ.
+
+    CHIP8Core raises IndexError past its keys or memory without
+    counting the instructions run before, so for these programs only the
+    failure of the instance is checked.
+    """
+    vector_core = VectorCore(len(programs), instructions_per_frame)
+    vector_core.load_programs(programs)
+    vector_core.run(instructions)
+
+    mismatches = []
+    for index, program in enumerate(programs):
+        core = CHIP8Core(instructions_per_frame)
+        core.load_program(program)
+        try:
+            core.run(instructions)
+        except EmulatorError:
+            pass
+        except IndexError:
+            if not vector_core.failed[index]:
+                mismatches.append(index)
+            continue
+        if core.save_state() != vector_core.instance_state(index):
+            mismatches.append(index)
+    return mismatches